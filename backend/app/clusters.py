@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from sqlalchemy.orm import Session
+
+
+MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "14"))
+# Each tile is split into CELLS_PER_TILE x CELLS_PER_TILE cluster cells (64px cells on 256px tiles).
+CELLS_PER_TILE = 4
+CLUSTER_TTL = float(os.getenv("CLUSTER_TTL", "300"))
+MAX_LATITUDE = 85.05112878
+
+# Loader for one source: returns (kinds, latitudes, longitudes) for every point it owns.
+SourceLoader = Callable[[Session], Tuple[List[str], ArrayLike, ArrayLike]]
+
+
+def to_mercator(lats: ArrayLike, lons: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+    # Web-mercator position in [0, 1) on both axes, y growing southwards like tile rows.
+    lats = np.radians(np.clip(np.asarray(lats, dtype=float), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lons, dtype=float) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lats) + 1.0 / np.cos(lats)) / np.pi) / 2.0
+    return x, y
+
+
+@dataclass
+class Level:
+    # Occupied cells at one zoom, sorted by tile so a tile is one searchsorted slice.
+    tiles: np.ndarray
+    cells: np.ndarray
+    counts: np.ndarray
+    lat_sums: np.ndarray
+    lon_sums: np.ndarray
+
+
+def build_levels(lats: ArrayLike, lons: ArrayLike, max_zoom: int = MAX_ZOOM) -> List[Level]:
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    x, y = to_mercator(lats, lons)
+    per_tile = CELLS_PER_TILE * CELLS_PER_TILE
+    levels = []
+    for zoom in range(max_zoom + 1):
+        scale = (2 ** zoom) * CELLS_PER_TILE
+        cell_x = np.clip(np.floor(x * scale), 0, scale - 1).astype(np.int64)
+        cell_y = np.clip(np.floor(y * scale), 0, scale - 1).astype(np.int64)
+        tile = (cell_y // CELLS_PER_TILE) * (2 ** zoom) + cell_x // CELLS_PER_TILE
+        keys = tile * per_tile + (cell_y % CELLS_PER_TILE) * CELLS_PER_TILE + cell_x % CELLS_PER_TILE
+        unique, inverse = np.unique(keys, return_inverse=True)
+        levels.append(Level(
+            tiles=unique // per_tile,
+            cells=unique % per_tile,
+            counts=np.bincount(inverse, minlength=len(unique)),
+            lat_sums=np.bincount(inverse, weights=lats, minlength=len(unique)),
+            lon_sums=np.bincount(inverse, weights=lons, minlength=len(unique)),
+        ))
+    return levels
+
+
+class ClusterPyramid:
+    def __init__(self, sources: Dict[str, Tuple[SourceLoader, Callable[[], Any]]], max_zoom: int = MAX_ZOOM, ttl: float = CLUSTER_TTL):
+        # source name -> (loader, current version); each source's levels rebuild independently.
+        self.sources = sources
+        self.max_zoom = max_zoom
+        self.ttl = ttl
+        self._levels: Dict[str, Dict[str, List[Level]]] = {}
+        self._built: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def _is_current(self, name: str) -> bool:
+        built = self._built.get(name)
+        return built is not None and built[0] == self.sources[name][1]() and time.monotonic() - built[1] < self.ttl
+
+    def refresh(self, db: Session) -> List[str]:
+        stale = [name for name in self.sources if not self._is_current(name)]
+        if not stale:
+            return []
+        with self._lock:
+            rebuilt = []
+            for name in stale:
+                if self._is_current(name):
+                    continue
+                loader, version = self.sources[name]
+                current = version()
+                kinds, lats, lons = loader(db)
+                kinds, lats, lons = np.asarray(kinds), np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+                self._levels[name] = {
+                    str(kind): build_levels(lats[kinds == kind], lons[kinds == kind], self.max_zoom)
+                    for kind in np.unique(kinds)
+                }
+                self._built[name] = (current, time.monotonic())
+                rebuilt.append(name)
+            return rebuilt
+
+    def tile(self, zoom: int, x: int, y: int, kinds: Optional[Iterable[str]] = None) -> List[Dict]:
+        wanted = set(kinds) if kinds else None
+        tile_key = y * (2 ** zoom) + x
+        cells: Dict[int, Dict] = {}
+        for by_kind in list(self._levels.values()):
+            for kind, levels in by_kind.items():
+                if wanted is not None and kind not in wanted:
+                    continue
+                level = levels[zoom]
+                start, end = np.searchsorted(level.tiles, [tile_key, tile_key + 1])
+                for cell, count, lat_sum, lon_sum in zip(
+                    level.cells[start:end].tolist(), level.counts[start:end].tolist(),
+                    level.lat_sums[start:end].tolist(), level.lon_sums[start:end].tolist(),
+                ):
+                    merged = cells.setdefault(cell, {"count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "types": {}})
+                    merged["count"] += count
+                    merged["lat_sum"] += lat_sum
+                    merged["lon_sum"] += lon_sum
+                    merged["types"][kind] = merged["types"].get(kind, 0) + count
+        return [
+            {
+                "lat": round(merged["lat_sum"] / merged["count"], 6),
+                "lon": round(merged["lon_sum"] / merged["count"], 6),
+                "count": merged["count"],
+                "types": merged["types"],
+            }
+            for _, merged in sorted(cells.items())
+        ]
@@ -0,0 +1,143 @@
+# backend/app/crud/forecast.py
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.forecast import LocalAuthorityEnergyConsumption, RegionEnergyConsumption
+
+UPSERT_COLUMNS = ["consumption", "source", "data_fingerprint"]
+# Each model keeps its own rows, so replicas serving different backends don't overwrite each other.
+REGION_KEY = ("region", "year", "model_version")
+
+Grid = Dict[str, Dict[int, Optional[Dict[str, float | str]]]]
+
+
+def consumption_rows(
+    grid: Dict[str, Dict[int, Optional[Dict[str, float | str]]]],
+    model_version: Optional[str] = None,
+    data_fingerprint: Optional[str] = None,
+) -> List[Dict]:
+    return [
+        {
+            "region": region,
+            "year": year,
+            "consumption": float(item["value"]),
+            "source": item["source"],
+            "model_version": model_version,
+            "data_fingerprint": data_fingerprint,
+        }
+        for region, by_year in grid.items()
+        for year, item in by_year.items()
+        if item is not None
+    ]
+
+
+def cached_consumption(
+    db: Session,
+    years: List[int],
+    model_version: str,
+    data_fingerprint: str,
+) -> Dict[Tuple[str, int], Dict[str, float | str]]:
+    # Rows written by another model or from older data are treated as missing.
+    rows = (
+        db.query(RegionEnergyConsumption.region, RegionEnergyConsumption.year, RegionEnergyConsumption.consumption, RegionEnergyConsumption.source)
+        .filter(
+            RegionEnergyConsumption.year.in_(years),
+            RegionEnergyConsumption.model_version == model_version,
+            RegionEnergyConsumption.data_fingerprint == data_fingerprint,
+        )
+        .all()
+    )
+    return {(region, year): {"value": consumption, "source": source} for region, year, consumption, source in rows}
+
+
+def upsert_statement(dialect: str, table=RegionEnergyConsumption.__table__, index_elements=REGION_KEY, update_columns=UPSERT_COLUMNS):
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+    else:
+        raise ValueError(f"No upsert support for dialect {dialect}")
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+
+
+def upsert_consumption(db: Session, rows: Iterable[Dict]) -> int:
+    # One executemany per call: no per-row lookups, and concurrent writers of the
+    # same (region, year, model) resolve on u_region_year_model instead of raising.
+    rows = list(rows)
+    if rows:
+        db.execute(upsert_statement(db.get_bind().dialect.name), rows)
+    return len(rows)
+
+
+def upsert_authority_consumption(db: Session, rows: Iterable[Dict]) -> int:
+    rows = list(rows)
+    if rows:
+        statement = upsert_statement(
+            db.get_bind().dialect.name,
+            LocalAuthorityEnergyConsumption.__table__,
+            ("code", "year"),
+            ["name", "region", "model_version", *UPSERT_COLUMNS],
+        )
+        db.execute(statement, rows)
+    return len(rows)
+
+
+def read_through(
+    db: Session,
+    forecast_engine,
+    years: List[int],
+    backend: str,
+    regions: List[str],
+    on_region: Optional[Callable[[str, Dict[int, Optional[Dict[str, float | str]]]], None]] = None,
+) -> Grid:
+    # Stored rows are reused while they match the current model and data; only
+    # regions with a missing or stale year are recomputed and written back.
+    model_version, fingerprint = forecast_engine.cache_tag(backend)
+    cached = cached_consumption(db, years, model_version, fingerprint)
+    grid = {region: {year: cached.get((region, year)) for year in years} for region in regions}
+
+    stale = [region for region in regions if any((region, year) not in cached for year in years)]
+    if on_region:
+        for region in regions:
+            if region not in stale:
+                on_region(region, grid[region])
+    if stale:
+        computed = forecast_engine.forecast_years(years, backend, regions=stale, on_region=on_region)
+        upsert_consumption(db, consumption_rows(computed, model_version, fingerprint))
+        db.commit()
+        for region, by_year in computed.items():
+            grid[region].update(by_year)
+    return grid
+
+
+def query_authority_consumption(
+    db: Session,
+    region: Optional[str] = None,
+    authority: Optional[str] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    limit: int = 1000,
+    offset: int = 0,
+) -> List[LocalAuthorityEnergyConsumption]:
+    query = db.query(LocalAuthorityEnergyConsumption)
+    if region:
+        query = query.filter(LocalAuthorityEnergyConsumption.region == region)
+    if authority:
+        query = query.filter(or_(
+            LocalAuthorityEnergyConsumption.code == authority,
+            func.lower(LocalAuthorityEnergyConsumption.name) == authority.lower(),
+        ))
+    if start_year is not None:
+        query = query.filter(LocalAuthorityEnergyConsumption.year >= start_year)
+    if end_year is not None:
+        query = query.filter(LocalAuthorityEnergyConsumption.year <= end_year)
+    return (
+        query.order_by(LocalAuthorityEnergyConsumption.code, LocalAuthorityEnergyConsumption.year)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
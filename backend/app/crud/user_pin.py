@@ -1,13 +1,22 @@
 # backend/app/crud/user_pin.py
+import os
+import time
+from typing import Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from app.models.user_pin import UserPin
 from app.schemas.user_pin import UserPinCreate
 
+# user id -> (mine id -> note, loaded at); writes through these routes drop the user's entry,
+# the TTL covers writes made by other replicas.
+PIN_NOTES_TTL = float(os.getenv("PIN_NOTES_TTL", "60"))
+_pin_notes: Dict[int, Tuple[Dict[int, Optional[str]], float]] = {}
+
 def create_user_pin(db: Session, user_id: int, pin_data: UserPinCreate):
     pin = UserPin(user_id=user_id, mine_id=pin_data.mine_id, note=pin_data.note)
     db.add(pin)
     db.commit()
     db.refresh(pin)
+    forget_pin_notes(user_id)
     return pin
 
 def get_user_pins(db: Session, user_id: int):
@@ -17,4 +26,15 @@ def get_user_pin_by_mine(db: Session, user_id: int, mine_id: int):
     return db.query(UserPin).filter(
         UserPin.user_id == user_id,
         UserPin.mine_id == mine_id
-    ).first()
\ No newline at end of file
+    ).first()
+
+def get_pin_notes(db: Session, user_id: int) -> Dict[int, Optional[str]]:
+    cached = _pin_notes.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < PIN_NOTES_TTL:
+        return cached[0]
+    notes = {mine_id: note for mine_id, note in db.query(UserPin.mine_id, UserPin.note).filter(UserPin.user_id == user_id).all()}
+    _pin_notes[user_id] = (notes, time.monotonic())
+    return notes
+
+def forget_pin_notes(user_id: int) -> None:
+    _pin_notes.pop(user_id, None)
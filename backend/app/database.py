@@ -1,10 +1,13 @@
 # backend/app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import UniqueConstraint, create_engine, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
+import logging
 import os
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 engine = create_engine(DATABASE_URL)
@@ -16,4 +19,89 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def run_with_session(fn):
+    # For startup and CLI jobs that run outside a request.
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+def add_missing_columns(bind, metadata=Base.metadata):
+    # create_all never alters existing tables, so new nullable columns are added here.
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+# Unique constraints replaced by a wider key, dropped from databases created before the change.
+RETIRED_CONSTRAINTS = {"region_energy_consumption": ["u_region_year"]}
+
+def add_missing_constraints(bind, metadata=Base.metadata, retired=RETIRED_CONSTRAINTS):
+    # create_all never alters existing tables either: named unique constraints declared since a
+    # table was created are added as unique indexes, which ON CONFLICT can target, and retired ones dropped.
+    # Deletes duplicate rows, so it runs at startup or from `python -m app.ingest migrate`, never on import.
+    # Returns the number of duplicates removed per table.
+    removed = {}
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            constraints = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+            indexes = {index["name"] for index in inspector.get_indexes(table.name) if index["unique"]}
+            stale = [name for name in retired.get(table.name, ()) if name in constraints | indexes]
+            if stale and bind.dialect.name == "sqlite":
+                # SQLite can't drop a table constraint; the rebuilt table has every declared one.
+                _rebuild_sqlite_table(conn, table, inspector)
+                continue
+            for name in stale:
+                if name in constraints:
+                    conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT IF EXISTS {name}"))
+                else:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            for constraint in table.constraints:
+                if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in constraints | indexes:
+                    columns = ", ".join(column.name for column in constraint.columns)
+                    primary_key = list(table.primary_key.columns)
+                    if len(primary_key) == 1:
+                        # Rows written before the key existed may repeat it; the earliest of each is kept.
+                        key = primary_key[0].name
+                        deleted = conn.execute(text(
+                            f"DELETE FROM {table.name} WHERE {key} NOT IN (SELECT MIN({key}) FROM {table.name} GROUP BY {columns})"
+                        )).rowcount
+                        if deleted:
+                            logger.warning("Removed %d duplicate rows from %s before adding %s", deleted, table.name, constraint.name)
+                            removed[table.name] = removed.get(table.name, 0) + deleted
+                    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {constraint.name} ON {table.name} ({columns})"))
+    return removed
+
+def _rebuild_sqlite_table(conn, table, inspector):
+    old = f"{table.name}_old"
+    columns = [column["name"] for column in inspector.get_columns(table.name) if column["name"] in table.c]
+    for index in inspector.get_indexes(table.name):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+    # Keeps other tables' foreign keys pointing at the table name rather than following the rename.
+    conn.execute(text("PRAGMA legacy_alter_table = ON"))
+    conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old}"))
+    conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+    table.create(conn)
+    shared = ", ".join(columns)
+    conn.execute(text(f"INSERT INTO {table.name} ({shared}) SELECT {shared} FROM {old}"))
+    conn.execute(text(f"DROP TABLE {old}"))
+
+def insert_ignoring_conflicts(dialect: str, table):
+    # Rows that clash with a primary key or unique constraint are skipped, so re-running an ingest is harmless.
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    raise ValueError(f"No conflict-safe insert for dialect {dialect}")
@@ -0,0 +1,153 @@
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import Response
+
+try:
+    import msgpack
+except ImportError:  # optional; without it clients get the packed binary or JSON
+    msgpack = None
+
+from app.spatial import SpatialLayer, Viewport
+
+
+JSON = "application/json"
+COLUMNAR = "application/vnd.egia.columnar"
+MSGPACK = "application/msgpack"
+
+# Column kinds: "f32" for coordinates and other numbers, "str" for text.
+Columns = Dict[str, str]
+
+MAGIC = b"EGC1"
+FLOAT32, STRING_TABLE = 1, 2
+NULL_INDEX = 0xFFFFFFFF
+
+
+def available_media_types() -> List[str]:
+    return [JSON, COLUMNAR] + ([MSGPACK, "application/x-msgpack"] if msgpack is not None else [])
+
+
+def negotiate(accept: Optional[str]) -> str:
+    # Highest q-value wins; ties keep the client's order. Anything unknown falls back to JSON.
+    offers = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type in available_media_types() and quality > 0:
+            offers.append((-quality, position, media_type))
+    if not offers:
+        return JSON
+    media_type = min(offers)[2]
+    return MSGPACK if media_type == "application/x-msgpack" else media_type
+
+
+def _string_table(values: Sequence[Optional[str]]):
+    table: Dict[str, int] = {}
+    indices = np.array(
+        [NULL_INDEX if value is None else table.setdefault(value, len(table)) for value in values],
+        dtype="<u4",
+    )
+    return list(table), indices
+
+
+def _float_column(values: Sequence[Optional[float]]) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype="<f4")
+
+
+def encode_columnar(items: Sequence[Dict[str, Any]], columns: Columns) -> bytes:
+    # Layout, all little-endian:
+    #   b"EGC1", uint32 rows, uint16 columns, then per column:
+    #   uint8 name length, name, uint8 kind,
+    #   kind 1: rows x float32 (NaN for null)
+    #   kind 2: uint32 table size, table entries as uint16 length + UTF-8, rows x uint32 index (0xFFFFFFFF for null)
+    parts = [MAGIC, struct.pack("<IH", len(items), len(columns))]
+    for name, kind in columns.items():
+        encoded_name = name.encode()
+        values = [item.get(name) for item in items]
+        if kind == "f32":
+            parts += [struct.pack("<B", len(encoded_name)), encoded_name, struct.pack("<B", FLOAT32), _float_column(values).tobytes()]
+        else:
+            table, indices = _string_table(values)
+            parts += [struct.pack("<B", len(encoded_name)), encoded_name, struct.pack("<BI", STRING_TABLE, len(table))]
+            for entry in table:
+                encoded = entry.encode()
+                parts += [struct.pack("<H", len(encoded)), encoded]
+            parts.append(indices.tobytes())
+    return b"".join(parts)
+
+
+def decode_columnar(payload: bytes) -> Dict[str, List[Any]]:
+    if payload[:4] != MAGIC:
+        raise ValueError("Not a columnar payload")
+    rows, column_count = struct.unpack_from("<IH", payload, 4)
+    offset, columns = 10, {}
+    for _ in range(column_count):
+        (name_length,) = struct.unpack_from("<B", payload, offset)
+        name = payload[offset + 1:offset + 1 + name_length].decode()
+        offset += 1 + name_length
+        (kind,) = struct.unpack_from("<B", payload, offset)
+        offset += 1
+        if kind == FLOAT32:
+            values = np.frombuffer(payload, dtype="<f4", count=rows, offset=offset)
+            columns[name] = [None if np.isnan(value) else float(value) for value in values]
+            offset += 4 * rows
+        else:
+            (table_size,) = struct.unpack_from("<I", payload, offset)
+            offset += 4
+            table = []
+            for _ in range(table_size):
+                (length,) = struct.unpack_from("<H", payload, offset)
+                table.append(payload[offset + 2:offset + 2 + length].decode())
+                offset += 2 + length
+            indices = np.frombuffer(payload, dtype="<u4", count=rows, offset=offset)
+            columns[name] = [None if index == NULL_INDEX else table[index] for index in indices.tolist()]
+            offset += 4 * rows
+    return columns
+
+
+def encode_msgpack(items: Sequence[Dict[str, Any]], columns: Columns) -> bytes:
+    # Same columns as the packed format: coordinates as raw float32 buffers, text as a string table.
+    encoded = {}
+    for name, kind in columns.items():
+        values = [item.get(name) for item in items]
+        if kind == "f32":
+            encoded[name] = _float_column(values).tobytes()
+        else:
+            table, indices = _string_table(values)
+            encoded[name] = {"table": table, "index": indices.tobytes()}
+    return msgpack.packb({"count": len(items), "columns": encoded})
+
+
+def encode_json(items: Any) -> bytes:
+    # Same settings as FastAPI's JSONResponse, so cached and live responses are byte-identical.
+    return json.dumps(items, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def encode(items: Sequence[Dict[str, Any]], columns: Columns, media_type: str) -> bytes:
+    if media_type == COLUMNAR:
+        return encode_columnar(items, columns)
+    if media_type == MSGPACK:
+        return encode_msgpack(items, columns)
+    return encode_json(items)
+
+
+def encoded_response(items: Sequence[Dict[str, Any]], accept: Optional[str], columns: Columns) -> Response:
+    media_type = negotiate(accept)
+    return Response(content=encode(items, columns, media_type), media_type=media_type, headers={"Vary": "Accept"})
+
+
+def layer_response(layer: SpatialLayer, view: Viewport, accept: Optional[str], columns: Columns) -> Response:
+    if view != Viewport():
+        return encoded_response(layer.select(view), accept, columns)
+    # The full list is serialized once per layer build and then served as bytes.
+    media_type = negotiate(accept)
+    body = layer.payload(media_type, lambda: encode(layer.items, columns, media_type))
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,80 @@
+from typing import Callable, Dict
+
+import numpy as np
+
+
+# Every backend takes the training years (n_years,), the region x year matrix
+# (n_regions, n_years, NaN where a year is missing) and the years to predict,
+# and returns a (n_regions, n_targets) matrix. Regions are fitted together.
+Backend = Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+
+# Bump when any backend's output changes, so stored forecasts are recomputed.
+BACKEND_VERSION = 1
+
+
+def linear_forecast(years: np.ndarray, values: np.ndarray, target_years: np.ndarray) -> np.ndarray:
+    mask = ~np.isnan(values)
+    x = np.where(mask, years, 0.0)
+    y = np.where(mask, values, 0.0)
+    n = mask.sum(axis=1)
+
+    x_mean = x.sum(axis=1) / n
+    y_mean = y.sum(axis=1) / n
+    dx = np.where(mask, years - x_mean[:, None], 0.0)
+    dy = np.where(mask, values - y_mean[:, None], 0.0)
+    slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    intercept = y_mean - slope * x_mean
+    return intercept[:, None] + slope[:, None] * target_years[None, :]
+
+
+def holt_forecast(
+    years: np.ndarray,
+    values: np.ndarray,
+    target_years: np.ndarray,
+    alpha: float = 0.8,
+    beta: float = 0.2,
+) -> np.ndarray:
+    # Each row starts from its own first two observed years; a row observed once has no trend.
+    rows = np.arange(values.shape[0])
+    seen = ~np.isnan(values)
+    first = seen.argmax(axis=1)
+    later = seen.copy()
+    later[rows, first] = False
+    second = np.where(later.any(axis=1), later.argmax(axis=1), first)
+    level = values[rows, first]
+    trend = np.where(second > first, (values[rows, second] - level) / np.maximum(second - first, 1), 0.0)
+    for step in range(1, values.shape[1]):
+        observed = values[:, step]
+        predicted = level + trend
+        # A missing year just follows the current trend.
+        new_level = np.where(np.isnan(observed), predicted, alpha * observed + (1 - alpha) * predicted)
+        started = step > first
+        trend = np.where(started, beta * (new_level - level) + (1 - beta) * trend, trend)
+        level = np.where(started, new_level, level)
+
+    steps = target_years - years[-1]
+    return level[:, None] + trend[:, None] * steps[None, :]
+
+
+def theil_sen_forecast(years: np.ndarray, values: np.ndarray, target_years: np.ndarray) -> np.ndarray:
+    first, second = np.triu_indices(len(years), k=1)
+    slopes = (values[:, second] - values[:, first]) / (years[second] - years[first])
+    slope = np.nanmedian(slopes, axis=1)
+    intercept = np.nanmedian(values - slope[:, None] * years[None, :], axis=1)
+    return intercept[:, None] + slope[:, None] * target_years[None, :]
+
+
+def error_metrics(predicted: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+    errors = predicted - actual
+    return {
+        "mae": round(float(np.nanmean(np.abs(errors))), 2),
+        "mape": round(float(np.nanmean(np.abs(errors) / actual)) * 100, 2),
+        "rmse": round(float(np.sqrt(np.nanmean(errors ** 2))), 2),
+    }
+
+
+BACKENDS: Dict[str, Backend] = {
+    "linear": linear_forecast,
+    "holt": holt_forecast,
+    "theil-sen": theil_sen_forecast,
+}
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.forecast_backends import BACKENDS, error_metrics
+from app.forecast_engine import PROPHET_PARAMS, backend_names
+from app.ingest.consumption import RegionIndex, data_dir, load_table, target_regions
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.normpath(os.path.join(BASE_DIR, "..", "benchmarks", "forecast_baseline.json"))
+MEASURE = "consumption_all_meters"
+
+# Allowed drift against the baseline before a run counts as a regression.
+MAPE_TOLERANCE = 0.5   # percentage points
+SPEED_TOLERANCE = 2.0  # times slower; timings on shared CI boxes are noisy
+
+
+def cutoffs(years: np.ndarray, folds: int, horizon: int) -> List[int]:
+    # Rolling origin: each fold trains up to a cutoff year and is scored on the next `horizon` years.
+    last = len(years) - horizon
+    return [int(years[position - 1]) for position in range(last - folds + 1, last + 1)]
+
+
+def _prophet_fold(index: RegionIndex, cutoff: int, test_years: np.ndarray) -> Dict:
+    import pandas as pd
+    from prophet import Prophet
+
+    predicted = np.full((len(index.regions), len(test_years)), np.nan)
+    fit_ms = predict_ms = 0.0
+    for row, region in enumerate(index.regions):
+        years, values = index.series(region, until=cutoff)
+        # Fitted directly rather than through fit_region, so the model cache never hides fit time.
+        started = time.perf_counter()
+        model = Prophet(**PROPHET_PARAMS)
+        model.fit(pd.DataFrame({"ds": pd.to_datetime(years.astype(str), format="%Y"), "y": values}))
+        fitted = time.perf_counter()
+        forecast = model.predict(pd.DataFrame({"ds": pd.to_datetime(test_years.astype(str), format="%Y")}))
+        predict_ms += (time.perf_counter() - fitted) * 1000
+        fit_ms += (fitted - started) * 1000
+        predicted[row] = forecast["yhat"].to_numpy()
+    return {"predicted": predicted, "fit_ms": fit_ms, "predict_ms": predict_ms}
+
+
+def _batched_fold(backend: str, index: RegionIndex, cutoff: int, test_years: np.ndarray) -> Dict:
+    train = index.years <= cutoff
+    started = time.perf_counter()
+    predicted = BACKENDS[backend](index.years[train].astype(float), index.values[:, train], test_years.astype(float))
+    # The NumPy backends fit and predict in one call, so the whole call counts as fit time.
+    return {"predicted": predicted, "fit_ms": (time.perf_counter() - started) * 1000, "predict_ms": None}
+
+
+def backtest(
+    backends: Optional[List[str]] = None,
+    folds: int = 3,
+    horizon: int = 3,
+    directory: str = data_dir,
+    measure: str = MEASURE,
+) -> Dict:
+    table = load_table(directory)
+    index = RegionIndex.from_table(table, measure, regions=target_regions)
+    folds_at = cutoffs(index.years, folds, horizon)
+
+    report = {
+        "measure": measure,
+        "data_fingerprint": table.fingerprint,
+        "cutoffs": folds_at,
+        "horizon": horizon,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "backends": {},
+    }
+    for backend in backends or backend_names:
+        run = _prophet_fold if backend == "prophet" else lambda *fold: _batched_fold(backend, *fold)
+        predicted, actual = [], []
+        fit_ms, predict_ms = 0.0, 0.0
+        # Untimed warm-up, so imports and first-call setup are not billed to whichever backend runs first.
+        if backend == "prophet":
+            import prophet  # noqa: F401
+        else:
+            run(index, folds_at[0], index.years[-horizon:])
+        tests = [(cutoff, (index.years > cutoff) & (index.years <= cutoff + horizon)) for cutoff in folds_at]
+        for cutoff, test in tests:
+            fold = run(index, cutoff, index.years[test])
+            predicted.append(fold["predicted"])
+            actual.append(index.values[:, test])
+            fit_ms += fold["fit_ms"]
+            predict_ms = None if fold["predict_ms"] is None else predict_ms + fold["predict_ms"]
+        # Peak memory from a second, untimed pass: tracing every allocation slows the run it traces.
+        tracemalloc.start()
+        for cutoff, test in tests:
+            run(index, cutoff, index.years[test])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        predicted, actual = np.hstack(predicted), np.hstack(actual)
+        report["backends"][backend] = {
+            **error_metrics(predicted, actual),
+            "fit_ms": round(fit_ms, 2),
+            "predict_ms": None if predict_ms is None else round(predict_ms, 2),
+            "peak_kib": round(peak / 1024, 1),
+            "regions": {region: error_metrics(predicted[row], actual[row]) for row, region in enumerate(index.regions)},
+        }
+    return report
+
+
+def compare(report: Dict, baseline: Dict, mape_tolerance: float = MAPE_TOLERANCE, speed_tolerance: float = SPEED_TOLERANCE) -> List[str]:
+    regressions = []
+    for backend, current in report["backends"].items():
+        previous = baseline.get("backends", {}).get(backend)
+        if previous is None:
+            continue
+        if current["mape"] > previous["mape"] + mape_tolerance:
+            regressions.append(f"{backend}: MAPE {current['mape']}% vs baseline {previous['mape']}%")
+        for timing in ("fit_ms", "predict_ms"):
+            # Sub-millisecond timings are all noise.
+            if current.get(timing) is not None and previous.get(timing) and previous[timing] >= 1 and current[timing] > previous[timing] * speed_tolerance:
+                regressions.append(f"{backend}: {timing} {current[timing]} vs baseline {previous[timing]}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.forecast_benchmark", description="Backtest every forecasting backend and compare with a baseline.")
+    parser.add_argument("--backend", action="append", choices=backend_names, help="repeat to pick backends; default all")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--horizon", type=int, default=3)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH, help="compare with a baseline report and exit 1 on regressions")
+    parser.add_argument("--update-baseline", action="store_true", help=f"overwrite {BASELINE_PATH} with this run")
+    args = parser.parse_args(argv)
+
+    report = backtest(args.backend, args.folds, args.horizon)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from importlib.metadata import version
+from typing import TYPE_CHECKING, Dict, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from prophet import Prophet
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("FORECAST_CACHE_DIR", os.path.join(BASE_DIR, "..", ".forecast_cache"))
+CACHE_MAX_BYTES = int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def cache_key(years: np.ndarray, values: np.ndarray, params: Dict) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"prophet={version('prophet')};".encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    order = np.argsort(years, kind="stable")
+    digest.update(np.asarray(years, dtype=np.int64)[order].tobytes())
+    digest.update(np.asarray(values, dtype=np.float64)[order].tobytes())
+    return digest.hexdigest()
+
+
+def _entry_path(key: str, directory: str) -> str:
+    return os.path.join(directory, f"{key}.json")
+
+
+def load_model(key: str, directory: Optional[str] = None) -> Optional["Prophet"]:
+    from prophet.serialize import model_from_json
+
+    path = _entry_path(key, directory or CACHE_DIR)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            model = model_from_json(f.read())
+    except (OSError, ValueError):
+        return None
+    # Touch the entry so eviction drops the least recently used models first.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return model
+
+
+def save_model(key: str, model: "Prophet", directory: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+    from prophet.serialize import model_to_json
+
+    directory = directory or CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temp file and rename, so other workers never read a half-written model.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(model_to_json(model))
+        os.replace(tmp_path, _entry_path(key, directory))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict(directory, max_bytes)
+
+
+def _entries(directory: str):
+    entries = []
+    if not os.path.isdir(directory):
+        return entries
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    return sorted(entries)
+
+
+def evict(directory: Optional[str] = None, max_bytes: Optional[int] = None) -> int:
+    entries = _entries(directory or CACHE_DIR)
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(directory or CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear(directory: Optional[str] = None) -> int:
+    return evict(directory, max_bytes=-1)
+
+
+def info(directory: Optional[str] = None) -> Dict[str, int | str]:
+    directory = directory or CACHE_DIR
+    entries = _entries(directory)
+    return {
+        "directory": os.path.abspath(directory),
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": CACHE_MAX_BYTES,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.forecast_cache", description="Manage the on-disk Prophet model cache.")
+    parser.add_argument("command", choices=["warm", "clear", "info"])
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        from app.forecast_engine import ForecastEngine
+
+        ForecastEngine().refresh()
+    elif args.command == "clear":
+        print(f"Removed {clear()} cached models")
+    print(json.dumps(info()))
+
+
+if __name__ == "__main__":
+    main()
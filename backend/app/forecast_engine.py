@@ -0,0 +1,433 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import version
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app import forecast_cache
+from app.forecast_backends import BACKEND_VERSION, BACKENDS, error_metrics
+from app.ingest.consumption import RegionIndex, data_dir, load_table, stat_fingerprint, target_regions
+
+# pandas and prophet take about a second to import, so fit_region only
+# imports them once a Prophet forecast actually runs (or in preload()).
+
+# (years, values) arrays for one region, usually views into RegionIndex.values.
+Series = Tuple[np.ndarray, np.ndarray]
+# Called with (region, predictions or None) as each region's fit finishes.
+RegionCallback = Callable[[str, Optional[Dict[int, float]]], None]
+
+
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "2050"))
+# Requests are validated against this; years past FORECAST_HORIZON are fitted for that call only.
+MAX_FORECAST_YEAR = max(int(os.getenv("FORECAST_MAX_YEAR", "2100")), FORECAST_HORIZON)
+FIT_WORKERS = int(os.getenv("FORECAST_FIT_WORKERS", str(os.cpu_count() or 1)))
+FIT_TIMEOUT = float(os.getenv("FORECAST_FIT_TIMEOUT", "60"))
+# A region whose fit timed out is not tried again for this long, so requests don't keep waiting on it.
+FIT_RETRY_BACKOFF = float(os.getenv("FORECAST_FIT_RETRY_BACKOFF", "600"))
+
+logger = logging.getLogger(__name__)
+
+backend_names = ["prophet", *BACKENDS]
+PROPHET_PARAMS = {"yearly_seasonality": False}
+
+
+def fit_region(series: Series, horizon: int) -> Dict[int, float]:
+    import pandas as pd
+    from prophet import Prophet
+
+    years, values = series
+    key = forecast_cache.cache_key(years, values, PROPHET_PARAMS)
+    model = forecast_cache.load_model(key)
+    if model is None:
+        model = Prophet(**PROPHET_PARAMS)
+        model.fit(pd.DataFrame({"ds": pd.to_datetime(years.astype(str), format="%Y"), "y": values}))
+        try:
+            forecast_cache.save_model(key, model)
+        except OSError:
+            logger.warning("Could not write forecast model cache entry %s", key)
+
+    last_year = int(years[-1])
+    if horizon <= last_year:
+        return {}
+
+    future = model.make_future_dataframe(periods=horizon - last_year, freq="YS")
+    forecast = model.predict(future)
+    forecast = forecast[forecast["ds"].dt.year > last_year]
+    return forecast.groupby(forecast["ds"].dt.year)["yhat"].mean().to_dict()
+
+
+# Workers start from a fresh forkserver (or spawned) process rather than forking the calling
+# process, whose other threads may hold locks (logging's, for one) that the child would inherit held.
+FIT_START_METHOD = os.getenv("FORECAST_FIT_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def _report_pid(pids) -> None:
+    pids.put(os.getpid())
+
+
+class FitPool:
+    # A process pool that knows its workers' pids, so a worker stuck in a Stan fit can be killed,
+    # and how many calls are using it, so it is only killed once none of them still needs it.
+    def __init__(self, workers: int):
+        context = multiprocessing.get_context(FIT_START_METHOD)
+        self.workers = workers
+        self.users = 0
+        self.retired = False
+        self._pids = context.SimpleQueue()
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_report_pid, initargs=(self._pids,))
+
+    def submit(self, fn, *args) -> Future:
+        try:
+            return self.executor.submit(fn, *args)
+        except BrokenProcessPool as error:
+            # A worker died since the last fit; the caller sees it like any broken fit and recycles the pool.
+            failed = Future()
+            failed.set_exception(error)
+            return failed
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        while not self._pids.empty():
+            try:
+                os.kill(self._pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+# One pool for the process, so workers (and their Prophet imports) are reused across fits.
+_pool: Optional[FitPool] = None
+_pool_lock = threading.Lock()
+
+
+def acquire_pool(workers: int) -> FitPool:
+    global _pool
+    replaced = None
+    with _pool_lock:
+        if _pool is None or _pool.workers != workers:
+            if _pool is not None:
+                replaced = _pool
+                _retire(replaced)
+            _pool = FitPool(workers)
+        _pool.users += 1
+        pool = _pool
+        idle = replaced is not None and replaced.users == 0
+    if idle:
+        replaced.close()
+    return pool
+
+
+def release_pool(pool: FitPool, recycle: bool = False) -> None:
+    # With recycle, later calls get a fresh pool; the old one is killed, stuck workers included,
+    # once the last call still waiting on it has finished.
+    with _pool_lock:
+        pool.users -= 1
+        if recycle:
+            _retire(pool)
+        idle = pool.retired and pool.users == 0
+    if idle:
+        pool.close()
+
+
+def _retire(pool: FitPool) -> None:
+    # Caller holds _pool_lock.
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.retired = True
+
+
+def fit_regions(
+    region_series: Dict[str, Series],
+    horizon: int,
+    workers: int = FIT_WORKERS,
+    timeout: float = FIT_TIMEOUT,
+    on_result: Optional[RegionCallback] = None,
+    timed_out: Optional[set] = None,
+) -> Dict[str, Optional[Dict[int, float]]]:
+    # Regions that fail or time out map to None; timed out ones are also added to `timed_out`.
+    results = {}
+    if not region_series:
+        return results
+    if min(workers, len(region_series)) <= 1:
+        for region, series in region_series.items():
+            try:
+                results[region] = fit_region(series, horizon)
+            except Exception:
+                logger.exception("Forecast fit for %s failed", region)
+                results[region] = None
+            if on_result:
+                on_result(region, results[region])
+        return results
+
+    pool = acquire_pool(workers)
+    stalled = False
+    # Regions queue behind each other in waves of the busy workers, so each wave gets its own timeout slot.
+    workers = min(workers, len(region_series))
+    try:
+        started = time.monotonic()
+        futures = {region: pool.submit(fit_region, series, horizon) for region, series in region_series.items()}
+        for position, (region, future) in enumerate(futures.items()):
+            deadline = started + timeout * (position // workers + 1)
+            try:
+                results[region] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                logger.warning("Forecast fit for %s timed out after %.0fs", region, timeout)
+                results[region] = None
+                stalled = True
+                if timed_out is not None:
+                    timed_out.add(region)
+            except BrokenProcessPool:
+                # A crashed worker breaks the whole pool, so it is recycled too.
+                logger.exception("Forecast fit for %s failed", region)
+                results[region] = None
+                stalled = True
+            except Exception:
+                logger.exception("Forecast fit for %s failed", region)
+                results[region] = None
+            if on_result:
+                on_result(region, results[region])
+    finally:
+        release_pool(pool, recycle=stalled)
+    return results
+
+
+class ForecastEngine:
+    def __init__(
+        self,
+        directory: str = data_dir,
+        horizon: int = FORECAST_HORIZON,
+        workers: int = FIT_WORKERS,
+        timeout: float = FIT_TIMEOUT,
+    ):
+        self.directory = directory
+        self.horizon = horizon
+        self.workers = workers
+        self.timeout = timeout
+        # fingerprint identifies the data content; _stat is the cheap per-request check in front of it.
+        self.fingerprint: Optional[str] = None
+        self._stat: Optional[str] = None
+        self._lock = threading.Lock()
+        self._index: Optional[RegionIndex] = None
+        # backend -> region -> year -> value
+        self._predictions: Dict[str, Dict[str, Dict[int, float]]] = {}
+        self._missing: Dict[str, set] = {}
+        # region -> monotonic time before which a timed out Prophet fit is not retried
+        self._retry_after: Dict[str, float] = {}
+        self._report: Optional[List[Dict[str, float | str]]] = None
+
+    def _is_current(self, stat: str, backend: str, regions: List[str]) -> bool:
+        if stat != self._stat or backend not in self._predictions:
+            return False
+        missing = self._missing.get(backend, set())
+        return all(region in self._predictions[backend] and (region not in missing or self._backing_off(region)) for region in regions)
+
+    def _backing_off(self, region: str) -> bool:
+        return time.monotonic() < self._retry_after.get(region, 0.0)
+
+    @property
+    def index(self) -> RegionIndex:
+        self.load()
+        return self._index
+
+    def history_matrix(self) -> Series:
+        return self._index.years.astype(float), self._index.values
+
+    def _fit_prophet(self, regions: List[str], horizon: int, on_result: Optional[RegionCallback] = None) -> Dict[str, Optional[Dict[int, float]]]:
+        series = {region: self._index.series(region) for region in regions if not self._backing_off(region)}
+        timed_out = set()
+        fitted = fit_regions(series, horizon, self.workers, self.timeout, on_result, timed_out)
+        for region in timed_out:
+            self._retry_after[region] = time.monotonic() + FIT_RETRY_BACKOFF
+        for region in regions:
+            if region not in series:
+                fitted[region] = None
+                if on_result:
+                    on_result(region, None)
+        return fitted
+
+    def _fit_batched(self, backend: str, horizon: int) -> Dict[str, Dict[int, float]]:
+        years, values = self.history_matrix()
+        target_years = np.arange(int(years[-1]) + 1, horizon + 1, dtype=float)
+        predicted = BACKENDS[backend](years, values, target_years)
+        return {
+            region: dict(zip(target_years.astype(int).tolist(), predicted[row].tolist()))
+            for row, region in enumerate(target_regions)
+        }
+
+    def _sync(self, stat: str) -> None:
+        # Caller holds self._lock.
+        if stat != self._stat:
+            table = load_table(self.directory)
+            # A touched CSV with unchanged content keeps the fitted models.
+            if table.fingerprint != self.fingerprint:
+                self._index = RegionIndex.from_table(table)
+                self._predictions, self._missing, self._report = {}, {}, None
+                self._retry_after = {}
+                self.fingerprint = table.fingerprint
+            self._stat = stat
+
+    def load(self) -> None:
+        stat = stat_fingerprint(self.directory)
+        if stat == self._stat:
+            return
+        with self._lock:
+            if stat != self._stat:
+                self._sync(stat)
+
+    def model_version(self, backend: str = "prophet") -> str:
+        if backend == "prophet":
+            params = json.dumps(PROPHET_PARAMS, sort_keys=True)
+            return f"prophet-{version('prophet')}-{hashlib.sha1(params.encode()).hexdigest()[:8]}"
+        return f"{backend}-v{BACKEND_VERSION}"
+
+    def cache_tag(self, backend: str = "prophet") -> Tuple[str, str]:
+        # (model version, data fingerprint) that stored results must match to be reused.
+        self.load()
+        return self.model_version(backend), self.fingerprint
+
+    def preload(self) -> None:
+        # Optional startup stage: pay for the data load and the Prophet/cmdstan import before the first request.
+        import prophet  # noqa: F401
+
+        self.load()
+
+    def _fit_batched_notify(self, backend: str, horizon: int, on_result: Optional[RegionCallback]) -> Dict[str, Dict[int, float]]:
+        predictions = self._fit_batched(backend, horizon)
+        if on_result:
+            for region, region_predictions in predictions.items():
+                on_result(region, region_predictions)
+        return predictions
+
+    def refresh(
+        self,
+        backend: str = "prophet",
+        on_result: Optional[RegionCallback] = None,
+        regions: Optional[List[str]] = None,
+    ) -> None:
+        # Fits up to self.horizon, which is fixed for the engine's lifetime.
+        horizon = self.horizon
+        regions = regions or target_regions
+        stat = stat_fingerprint(self.directory)
+        if self._is_current(stat, backend, regions):
+            return
+
+        with self._lock:
+            # Another request may have finished the refit while we waited.
+            if self._is_current(stat, backend, regions):
+                return
+
+            self._sync(stat)
+
+            if backend != "prophet":
+                self._predictions[backend] = self._fit_batched_notify(backend, horizon, on_result)
+                return
+
+            # Only fit the requested regions that were never fitted or whose fit timed out or failed.
+            predictions = dict(self._predictions.get(backend, {}))
+            missing = set(self._missing.get(backend, set()))
+            fitted = self._fit_prophet([region for region in regions if region not in predictions or region in missing], horizon, on_result)
+            for region, region_predictions in fitted.items():
+                predictions[region] = region_predictions or {}
+                if region_predictions is None:
+                    missing.add(region)
+                else:
+                    missing.discard(region)
+
+            self._predictions[backend] = predictions
+            self._missing[backend] = missing
+
+    def predictions(
+        self,
+        horizon: int,
+        backend: str = "prophet",
+        on_result: Optional[RegionCallback] = None,
+        regions: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[int, float]]:
+        if horizon > MAX_FORECAST_YEAR:
+            raise ValueError(f"Forecasts only go up to {MAX_FORECAST_YEAR}")
+        if horizon <= self.horizon:
+            self.refresh(backend, on_result, regions)
+            return self._predictions.get(backend, {})
+        # Past the shared horizon: fitted for this call and not kept, so one distant year
+        # doesn't widen every later fit or throw away the shared predictions.
+        self.load()
+        if backend != "prophet":
+            return self._fit_batched_notify(backend, horizon, on_result)
+        fitted = self._fit_prophet(regions or target_regions, horizon, on_result)
+        return {region: region_predictions or {} for region, region_predictions in fitted.items()}
+
+    def _lookup(self, region: str, year: int, predictions: Dict[str, Dict[int, float]]) -> Optional[Dict[str, float | str]]:
+        actual = self._index.value(region, year)
+        if actual is not None:
+            return {"value": round(actual, 2), "source": "historical"}
+        if year in predictions.get(region, {}):
+            return {"value": round(predictions[region][year], 2), "source": "forecast"}
+        return None
+
+    def forecast_years(
+        self,
+        years: List[int],
+        backend: str = "prophet",
+        regions: Optional[List[str]] = None,
+        on_region: Optional[Callable[[str, Dict[int, Optional[Dict[str, float | str]]]], None]] = None,
+    ) -> Dict[str, Dict[int, Optional[Dict[str, float | str]]]]:
+        on_result = None
+        if on_region:
+            def on_result(region, region_predictions):
+                fitted = {region: region_predictions or {}}
+                on_region(region, {year: self._lookup(region, year, fitted) for year in years})
+
+        self.load()
+        regions = regions or target_regions
+        # Regions with history up to the latest requested year are answered from it without a fit;
+        # the rest share one refresh up to that year, a single fit per region.
+        latest = max(years)
+        unobserved = [region for region in regions if (self._index.last_year(region) or 0) < latest]
+        predictions = self.predictions(latest, backend, on_result, unobserved) if unobserved else {}
+        grid = {region: {year: self._lookup(region, year, predictions) for year in years} for region in regions}
+        if on_region:
+            for region in regions:
+                if region not in unobserved:
+                    on_region(region, grid[region])
+        return grid
+
+    def compare_backends(self, holdout: int = 3) -> List[Dict[str, float | str]]:
+        self.load()
+        if self._report is not None:
+            return self._report
+
+        years, values = self.history_matrix()
+        train_years, test_years = years[:-holdout], years[-holdout:]
+        train, actual = values[:, :-holdout], values[:, -holdout:]
+        last_train_year = int(train_years[-1])
+
+        report = []
+        for backend in backend_names:
+            started = time.perf_counter()
+            if backend == "prophet":
+                series = {region: self._index.series(region, until=last_train_year) for region in target_regions}
+                fitted = fit_regions(series, int(test_years[-1]), self.workers, self.timeout)
+                predicted = np.array([
+                    [(fitted[region] or {}).get(int(year), np.nan) for year in test_years]
+                    for region in target_regions
+                ])
+            else:
+                predicted = BACKENDS[backend](train_years, train, test_years)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            report.append({"backend": backend, **error_metrics(predicted, actual), "fit_ms": round(elapsed_ms, 2)})
+
+        self._report = report
+        return report
+
+
+engine = ForecastEngine()
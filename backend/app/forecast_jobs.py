@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.crud.forecast import read_through
+from app.database import SessionLocal
+from app.forecast_engine import ForecastEngine, engine as default_engine, target_regions
+
+
+JOB_WORKERS = int(os.getenv("FORECAST_JOB_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.getenv("FORECAST_MAX_PENDING_JOBS", "32"))
+MAX_FINISHED_JOBS = int(os.getenv("FORECAST_MAX_FINISHED_JOBS", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class ForecastJob:
+    year: int
+    backend: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued -> running -> done / failed
+    results: Dict[str, Optional[Dict[str, float | str]]] = field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> Dict:
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "year": self.year,
+            "backend": self.backend,
+            "status": self.status,
+            "completed_regions": len(self.results),
+            "total_regions": len(target_regions),
+            "results": dict(self.results),
+            "error": self.error,
+            "timing": {
+                "queued_ms": round(((self.started_at or now) - self.created_at) * 1000, 2),
+                "running_ms": round(((self.finished_at or now) - self.started_at) * 1000, 2) if self.started_at else None,
+            },
+        }
+
+
+class ForecastJobManager:
+    def __init__(
+        self,
+        forecast_engine: Optional[ForecastEngine] = None,
+        workers: int = JOB_WORKERS,
+        max_pending: int = MAX_PENDING_JOBS,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.engine = forecast_engine or default_engine
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="forecast-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ForecastJob]" = OrderedDict()
+        # (year, backend) -> id of the queued or running job for it, so a burst shares one run.
+        # Finished jobs are not reused: a new job for a warm year is answered from the store anyway.
+        self._active: Dict[tuple, str] = {}
+
+    def submit(self, year: int, backend: str = "prophet") -> ForecastJob:
+        key = (year, backend)
+        with self._lock:
+            existing = self._jobs.get(self._active.get(key, ""))
+            if existing and not existing.finished:
+                return existing
+
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} forecast jobs already pending")
+
+            job = ForecastJob(year=year, backend=backend)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ForecastJob]:
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        # Caller holds self._lock; drop the oldest finished jobs beyond the retention limit.
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: ForecastJob) -> None:
+        job.status, job.started_at = "running", time.time()
+
+        def on_region(region, by_year):
+            job.results[region] = by_year[job.year]
+
+        # Same stored rows as /forecast: warm regions come from the database, fitted ones are written back.
+        db = self.session_factory()
+        try:
+            grid = read_through(db, self.engine, [job.year], job.backend, target_regions, on_region)
+            job.results = {region: by_year[job.year] for region, by_year in grid.items()}
+            job.status = "done"
+        except Exception as exc:
+            logger.exception("Forecast job %s failed", job.id)
+            job.error, job.status = str(exc), "failed"
+        finally:
+            db.close()
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get((job.year, job.backend)) == job.id:
+                    del self._active[(job.year, job.backend)]
+
+
+jobs = ForecastJobManager()
@@ -0,0 +1,29 @@
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from pyproj import Transformer
+
+
+BNG = "EPSG:27700"
+WGS84 = "EPSG:4326"
+# The grid's own extent in metres: (min easting, min northing, max easting, max northing).
+BNG_BOUNDS = (0.0, 0.0, 700000.0, 1300000.0)
+
+
+@lru_cache(maxsize=None)
+def transformer(source: str, target: str) -> Transformer:
+    # Building a Transformer loads the PROJ database; do it once per CRS pair.
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+def bng_to_wgs84(eastings: ArrayLike, northings: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+    # Whole arrays go through PROJ in one call; returns (latitudes, longitudes).
+    lons, lats = transformer(BNG, WGS84).transform(np.asarray(eastings, dtype=float), np.asarray(northings, dtype=float))
+    return np.asarray(lats), np.asarray(lons)
+
+
+def wgs84_to_bng(latitudes: ArrayLike, longitudes: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+    eastings, northings = transformer(WGS84, BNG).transform(np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float))
+    return np.asarray(eastings), np.asarray(northings)
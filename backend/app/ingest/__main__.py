@@ -0,0 +1,119 @@
+import argparse
+
+from app.ingest import consumption
+
+
+def backfill_forecasts(start_year: int, end_year: int, backend: str) -> int:
+    from app.crud.forecast import consumption_rows, upsert_consumption
+    from app.database import SessionLocal
+    from app.forecast_engine import engine
+
+    grid = engine.forecast_years(list(range(start_year, end_year + 1)), backend)
+    db = SessionLocal()
+    try:
+        written = upsert_consumption(db, consumption_rows(grid, *engine.cache_tag(backend)))
+        db.commit()
+    finally:
+        db.close()
+    return written
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.ingest", description="Run the data ingest steps.")
+    parser.add_argument("step", choices=["migrate", "consumption", "forecasts", "local-authorities", "sites", "mines", "mine-summaries", "proximity", "floods"])
+    parser.add_argument("--start-year", type=int, default=consumption.all_years.start)
+    parser.add_argument("--end-year", type=int, default=2050)
+    parser.add_argument("--backend")
+    args = parser.parse_args(argv)
+    if args.step in ("forecasts", "local-authorities"):
+        from app.forecast_engine import MAX_FORECAST_YEAR
+
+        if args.end_year > MAX_FORECAST_YEAR:
+            parser.error(f"--end-year must not be after {MAX_FORECAST_YEAR} (FORECAST_MAX_YEAR)")
+
+    if args.step == "migrate":
+        # Importing the app registers every model and adds missing tables and columns.
+        from app.main import add_missing_constraints, engine
+
+        removed = add_missing_constraints(engine)
+        print(f"migrate: unique keys in place, removed {sum(removed.values())} duplicate rows" + "".join(f", {count} from {table}" for table, count in removed.items()))
+    elif args.step == "consumption":
+        fingerprint = consumption.build_table()
+        table = consumption.load_table()
+        print(f"consumption: {len(table)} rows, {len(table.columns)} columns ({fingerprint[:12]})")
+    elif args.step == "forecasts":
+        if args.end_year < args.start_year:
+            parser.error("--end-year must not be before --start-year")
+        backend = args.backend or "prophet"
+        written = backfill_forecasts(args.start_year, args.end_year, backend)
+        print(f"forecasts: upserted {written} rows for {args.start_year}-{args.end_year} ({backend})")
+    elif args.step == "local-authorities":
+        from app.database import SessionLocal
+        from app.ingest import local_authority
+
+        backend = args.backend or local_authority.LA_BACKEND
+        db = SessionLocal()
+        try:
+            written = local_authority.refresh(db, backend=backend, horizon=args.end_year, force=True)
+        finally:
+            db.close()
+        print(f"local-authorities: upserted {written} rows up to {args.end_year} ({backend}) from {local_authority.LA_DATA_DIR}")
+    elif args.step == "sites":
+        from app.database import SessionLocal
+        from app.ingest import energy_sites, site_proximity
+
+        db = SessionLocal()
+        try:
+            written = energy_sites.ingest(db)
+            refreshed = site_proximity.refresh(db)
+        finally:
+            db.close()
+        print(f"sites: loaded {written} operational sites from {energy_sites.CSV_PATH}")
+        print(f"proximity: recomputed {refreshed}")
+    elif args.step == "mine-summaries":
+        from app.database import SessionLocal
+        from app.ingest import mine_sites
+
+        db = SessionLocal()
+        try:
+            written = mine_sites.refresh_summaries(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"mine-summaries: refreshed {written} mines")
+    elif args.step == "proximity":
+        from app.database import SessionLocal
+        from app.ingest import site_proximity
+
+        db = SessionLocal()
+        try:
+            refreshed = site_proximity.refresh(db, force=True)
+        finally:
+            db.close()
+        print(f"proximity: recomputed {refreshed}")
+    elif args.step == "floods":
+        from app.database import SessionLocal
+        from app.ingest import flood_warnings
+
+        db = SessionLocal()
+        try:
+            written = flood_warnings.poll(db, force=True)
+        finally:
+            db.close()
+        print(f"floods: {written['changed']} changed and {written['removed']} removed warnings, {written['matched']} mine matches from {flood_warnings.FEED_SOURCE}")
+    elif args.step == "mines":
+        from app.database import SessionLocal
+        from app.ingest import mine_sites, site_proximity
+
+        db = SessionLocal()
+        try:
+            written = mine_sites.ingest(db)
+            refreshed = site_proximity.refresh(db)
+        finally:
+            db.close()
+        print(f"mines: inserted {written['mines']} mines, {written['flood_events']} flood years, {written['energy_demand']} demand years from {mine_sites.JSON_PATH}")
+        print(f"proximity: recomputed {refreshed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.normpath(os.path.join(BASE_DIR, "..", "..", "..", "app", "src", "main", "assets", "Subnational_electricity_consumption_statistics"))
+CACHE_DIR = os.getenv("CONSUMPTION_CACHE_DIR", os.path.normpath(os.path.join(BASE_DIR, "..", "..", ".consumption_cache")))
+
+# Bump when the normalized layout changes so old caches are rebuilt.
+SCHEMA_VERSION = 1
+
+all_years = range(2005, 2024)
+code_map = {
+    "E12000001": "UKC",
+    "E12000002": "UKD",
+    "E12000003": "UKE",
+    "E12000004": "UKF",
+    "E12000005": "UKG",
+    "E12000006": "UKH",
+    "E12000007": "UKI",
+    "E12000008": "UKJ",
+    "E12000009": "UKK",
+    "W92000004": "UKL",
+    "S92000003": "UKM"
+}
+target_regions = list(code_map.values())
+
+# Header prefix -> measure, e.g. "Total consumption\n(GWh):\nAll meters" -> consumption_all_meters.
+MEASURE_PREFIXES = {
+    "Number of meters (thousands):": "meters",
+    "Total consumption (GWh):": "consumption",
+    "Mean consumption (kWh per meter):": "mean",
+    "Median consumption (kWh per meter):": "median",
+}
+# Up to 2011 the releases had a single "Domestic" split; from 2012 it is
+# broken into Standard and Economy 7 with an "All Domestic" total.
+METER_TYPES = {
+    "Domestic": "all_domestic",
+    "All Domestic": "all_domestic",
+    "Domestic Standard": "domestic_standard",
+    "Domestic E7": "domestic_e7",
+    "Non-Domestic": "all_non_domestic",
+    "All Non-Domestic": "all_non_domestic",
+    "All meters": "all_meters",
+}
+MEASURES = [f"{measure}_{meter}" for measure in MEASURE_PREFIXES.values() for meter in dict.fromkeys(METER_TYPES.values())]
+MEASURES.append("mean_per_household")
+
+TEXT_COLUMNS = {"code": "<U9", "region": "<U9", "name": "<U64", "local_authority": "<U64"}
+
+
+def csv_path(directory: str, year: int) -> str:
+    return os.path.join(directory, f"Subnational_electricity_consumption_statistics_{year}.csv")
+
+
+def normalize_header(header: str) -> Optional[str]:
+    header = re.sub(r"\s+", " ", header).strip()
+    if header == "Mean domestic consumption (kWh per household)":
+        return "mean_per_household"
+    for prefix, measure in MEASURE_PREFIXES.items():
+        if header.startswith(prefix):
+            meter = METER_TYPES.get(header[len(prefix):].strip())
+            return f"{measure}_{meter}" if meter else None
+    return None
+
+
+def stat_fingerprint(directory: str = data_dir) -> str:
+    # Cheap enough to run on every request: only stats the files, never reads them.
+    digest = hashlib.sha1()
+    for year in all_years:
+        stat = os.stat(csv_path(directory, year))
+        digest.update(f"{year}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def content_fingerprint(directory: str = data_dir) -> str:
+    digest = hashlib.sha256(f"schema={SCHEMA_VERSION};".encode())
+    for year in all_years:
+        with open(csv_path(directory, year), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def parse_year(directory: str, year: int) -> List[Dict]:
+    rows = []
+    with open(csv_path(directory, year), "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        measures = [normalize_header(header) for header in headers]
+        for record in reader:
+            if not record or not record[0].strip():
+                continue
+            row = {
+                "code": record[0].strip(),
+                "name": record[1].strip(),
+                "local_authority": record[2].strip(),
+                "year": year,
+            }
+            row["region"] = code_map.get(row["code"], row["code"])
+            for measure, value in zip(measures[3:], record[3:]):
+                if measure is not None:
+                    row[measure] = float(value) if value.strip() else np.nan
+            rows.append(row)
+    return rows
+
+
+def build_columns(directory: str = data_dir) -> Dict[str, np.ndarray]:
+    rows = [row for year in all_years for row in parse_year(directory, year)]
+    columns = {name: np.array([row[name] for row in rows], dtype=dtype) for name, dtype in TEXT_COLUMNS.items()}
+    columns["year"] = np.array([row["year"] for row in rows], dtype=np.int16)
+    for measure in MEASURES:
+        columns[measure] = np.array([row.get(measure, np.nan) for row in rows], dtype=np.float64)
+    return columns
+
+
+class ConsumptionTable:
+    def __init__(self, columns: Dict[str, np.ndarray], fingerprint: str):
+        self.columns = columns
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.columns["year"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+
+class RegionIndex:
+    # Region x year matrix of one measure, built once per table. Lookups are
+    # dict hits and per-region series are row views, so nothing is re-scanned.
+    def __init__(self, regions: List[str], years: np.ndarray, values: np.ndarray):
+        self.regions = regions
+        self.years = years
+        self.values = values
+        self.region_pos = {region: row for row, region in enumerate(regions)}
+        self.year_pos = {int(year): col for col, year in enumerate(years)}
+
+    @classmethod
+    def from_table(cls, table: ConsumptionTable, measure: str = "consumption_all_meters", regions: Optional[List[str]] = None) -> "RegionIndex":
+        regions = list(regions or target_regions)
+        region_codes = np.asarray(table["region"])
+        selected = np.isin(region_codes, regions)
+        row_years = np.asarray(table["year"])[selected]
+        row_values = np.asarray(table[measure])[selected]
+        years, cols = np.unique(row_years, return_inverse=True)
+        region_pos = {region: row for row, region in enumerate(regions)}
+        rows = np.array([region_pos[code] for code in region_codes[selected]], dtype=np.int64)
+
+        # Average duplicate (region, year) rows, matching the old groupby().mean().
+        sums = np.zeros((len(regions), len(years)))
+        counts = np.zeros((len(regions), len(years)))
+        observed = ~np.isnan(row_values)
+        np.add.at(sums, (rows[observed], cols[observed]), row_values[observed])
+        np.add.at(counts, (rows[observed], cols[observed]), 1)
+        with np.errstate(invalid="ignore"):
+            values = np.where(counts > 0, sums / counts, np.nan)
+        return cls(regions, years.astype(np.int64), values)
+
+    def value(self, region: str, year: int) -> Optional[float]:
+        row, col = self.region_pos.get(region), self.year_pos.get(year)
+        if row is None or col is None:
+            return None
+        value = self.values[row, col]
+        return None if np.isnan(value) else float(value)
+
+    def series(self, region: str, until: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        row = self.values[self.region_pos[region]]
+        end = len(self.years) if until is None else int(np.searchsorted(self.years, until, side="right"))
+        years, values = self.years[:end], row[:end]
+        observed = ~np.isnan(values)
+        if observed.all():
+            return years, values
+        return years[observed], values[observed]
+
+    def last_year(self, region: str) -> Optional[int]:
+        years, _ = self.series(region)
+        return int(years[-1]) if len(years) else None
+
+
+def _read_index(cache_dir: str) -> Dict:
+    try:
+        with open(os.path.join(cache_dir, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(cache_dir: str, index: Dict) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(cache_dir, "index.json"))
+
+
+def _load_columns(table_dir: str) -> Dict[str, np.ndarray]:
+    names = list(TEXT_COLUMNS) + ["year"] + MEASURES
+    return {name: np.load(os.path.join(table_dir, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def _cache_root(directory: str, cache_dir: Optional[str]) -> str:
+    # One cache slot per source directory, so test fixtures never evict the real data.
+    source = hashlib.sha1(os.path.abspath(directory).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir or CACHE_DIR, source)
+
+
+def build_table(directory: str = data_dir, cache_dir: Optional[str] = None) -> str:
+    cache_dir = _cache_root(directory, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = content_fingerprint(directory)
+    table_dir = os.path.join(cache_dir, fingerprint)
+
+    if not os.path.isdir(table_dir):
+        # Build next to the final location and rename, so concurrent workers never see half a table.
+        tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix="build-")
+        for name, column in build_columns(directory).items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), column)
+        try:
+            os.rename(tmp_dir, table_dir)
+        except OSError:
+            # Another worker finished the same build first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _write_index(cache_dir, {"schema": SCHEMA_VERSION, "stat": stat_fingerprint(directory), "content": fingerprint})
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path) and name != fingerprint and not name.startswith("build-"):
+            shutil.rmtree(path, ignore_errors=True)
+    return fingerprint
+
+
+def load_table(directory: str = data_dir, cache_dir: Optional[str] = None) -> ConsumptionTable:
+    root = _cache_root(directory, cache_dir)
+    index = _read_index(root)
+    fingerprint = index.get("content")
+    fresh = (
+        fingerprint is not None
+        and index.get("schema") == SCHEMA_VERSION
+        and index.get("stat") == stat_fingerprint(directory)
+        and os.path.isdir(os.path.join(root, fingerprint))
+    )
+    if not fresh:
+        # A touched file with unchanged content only refreshes the index; build_table skips the rebuild.
+        try:
+            fingerprint = build_table(directory, cache_dir)
+        except OSError:
+            # Read-only or full disk: serve from memory rather than fail the request.
+            return ConsumptionTable(build_columns(directory), content_fingerprint(directory))
+    return ConsumptionTable(_load_columns(os.path.join(root, fingerprint)), fingerprint)
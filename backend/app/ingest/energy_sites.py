@@ -0,0 +1,96 @@
+import csv
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.geo import bng_to_wgs84
+from app.models.energy_site import EnergySite
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CSV_PATH = Path(os.getenv("REPD_CSV_PATH", str((BASE_DIR / "../app/src/main/assets/renewable_energy_planning_database.csv").resolve())))
+
+CATEGORIES = {
+    "solar": {"Solar Photovoltaics"},
+    "wind": {"Wind Offshore", "Wind Onshore"},
+    "hydroelectric": {"Large Hydro", "Small Hydro", "Pumped Storage Hydroelectricity"},
+}
+TECHNOLOGY_CATEGORIES = {technology: category for category, technologies in CATEGORIES.items() for technology in technologies}
+
+logger = logging.getLogger(__name__)
+
+_loaded = False
+_load_lock = threading.Lock()
+# Bumped on every ingest so cached spatial layers know to rebuild.
+version = 0
+
+
+def parse_sites(path: Optional[Path] = None) -> List[Dict[str, float | str]]:
+    # One pass over the file for every category; coordinates are projected in a single call.
+    names, categories, xs, ys = [], [], [], []
+    with open(path or CSV_PATH, "r", encoding="latin1", newline="") as f:
+        reader = csv.reader(f)
+        headers = [header.strip() for header in next(reader)]
+        technology_col = headers.index("Technology Type")
+        status_col = headers.index("Development Status (short)")
+        name_col = headers.index("Site Name")
+        x_col, y_col = headers.index("X-coordinate"), headers.index("Y-coordinate")
+
+        for record in reader:
+            if len(record) <= max(technology_col, status_col, name_col, x_col, y_col):
+                continue
+            category = TECHNOLOGY_CATEGORIES.get(record[technology_col].strip())
+            if category is None or record[status_col].strip() != "Operational":
+                continue
+            try:
+                x, y = float(record[x_col]), float(record[y_col])
+            except ValueError:
+                continue
+            names.append(record[name_col].strip())
+            categories.append(category)
+            xs.append(x)
+            ys.append(y)
+
+    if not names:
+        return []
+    lats, lons = bng_to_wgs84(xs, ys)
+    return [
+        {"name": name, "type": category, "latitude": float(lat), "longitude": float(lon)}
+        for name, category, lat, lon in zip(names, categories, lats, lons)
+    ]
+
+
+def ingest(db: Session, path: Optional[Path] = None) -> int:
+    global _loaded, version
+    rows = parse_sites(path)
+    # Replace the whole table in one transaction; executemany batches the insert on Postgres.
+    db.query(EnergySite).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(EnergySite), rows)
+    db.commit()
+    _loaded = True
+    version += 1
+    return len(rows)
+
+
+def ensure_loaded(db: Session) -> None:
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        if db.query(EnergySite.id).first() is None:
+            if not CSV_PATH.exists():
+                # Recorded as loaded so requests don't probe and warn again; `python -m app.ingest sites` loads it later.
+                logger.warning("Renewable energy planning database not found at %s; serving no sites", CSV_PATH)
+                _loaded = True
+                return
+            count = ingest(db)
+            logger.info("Loaded %d energy sites from %s", count, CSV_PATH)
+        _loaded = True
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.orm import Session
+
+from app.crud.forecast import upsert_statement
+from app.database import insert_ignoring_conflicts
+from app.geo import wgs84_to_bng
+from app.ingest import mine_sites
+from app.models.mine_site import FloodWarning, Mine, MineFloodWarning
+from app.spatial import NearestIndex
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+# A path to a saved feed or the URL of the feed (the Environment Agency's, or a local stub server).
+FEED_SOURCE = os.getenv("FLOOD_FEED_URL", str(PROJECT_ROOT / "app/src/main/assets/fake_flood_data.json"))
+# Where flood area centres come from: the EA's area resources (https://environment.data.gov.uk/flood-monitoring/id/floodAreas,
+# or a local stub serving {base}/{area id}), or a saved list of areas. The warnings feed itself has no geometry.
+AREAS_SOURCE = os.getenv("FLOOD_AREAS_URL", str(PROJECT_ROOT / "app/src/main/assets/fake_flood_areas.json"))
+POLL_SECONDS = float(os.getenv("FLOOD_POLL_SECONDS", "900"))
+# Mines within this distance of a flood area's centre are affected; areas run to several kilometres along a river.
+MATCH_RADIUS_M = float(os.getenv("FLOOD_MATCH_RADIUS_M", "10000"))
+FETCH_TIMEOUT = 30
+
+UPSERT_COLUMNS = [
+    "severity", "severity_level", "description", "message", "county", "ea_area_name", "river_or_sea",
+    "is_tidal", "latitude", "longitude", "time_raised", "time_severity_changed", "time_message_changed",
+]
+
+logger = logging.getLogger(__name__)
+
+_poll_lock = threading.Lock()
+# source -> ETag/Last-Modified for URLs, modification time for files; unchanged sources are not parsed.
+_validators: Dict[str, Any] = {}
+# Mine version the stored matches were computed against; newly ingested mines need matching too.
+_matched_version: Optional[int] = None
+# Bumped whenever warnings or matches change so cached mine layers and details rebuild.
+version = 0
+
+
+def fetch(source: str, force: bool = False) -> Optional[Tuple[Dict, Any]]:
+    # (feed, validator), or None when the source has not changed since the last successful poll.
+    seen = None if force else _validators.get(source)
+    if source.startswith(("http://", "https://")):
+        request = urllib.request.Request(source, headers={"Accept": "application/json"})
+        if seen:
+            if seen.get("etag"):
+                request.add_header("If-None-Match", seen["etag"])
+            if seen.get("last_modified"):
+                request.add_header("If-Modified-Since", seen["last_modified"])
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+                body = response.read()
+                validator = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        except urllib.error.HTTPError as error:
+            if error.code == 304:
+                return None
+            raise
+        return json.loads(body), validator
+
+    path = Path(source.removeprefix("file://"))
+    stamp = path.stat().st_mtime_ns
+    if seen == stamp:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f), stamp
+
+
+def parse_warnings(feed: Dict) -> List[Dict]:
+    rows = {}
+    for item in feed.get("items", []):
+        area = item.get("floodArea") or {}
+        area_id = item.get("floodAreaID") or area.get("notation")
+        if not area_id:
+            continue
+        # The /floods feed only links the area; its centre is present when the area resource is embedded.
+        lat, lon = area.get("lat", item.get("lat")), area.get("long", item.get("long"))
+        rows[area_id] = {
+            "flood_area_id": area_id,
+            "severity": item.get("severity"),
+            "severity_level": item.get("severityLevel"),
+            "description": item.get("description"),
+            "message": item.get("message"),
+            "county": area.get("county"),
+            "ea_area_name": item.get("eaAreaName"),
+            "river_or_sea": area.get("riverOrSea"),
+            "is_tidal": item.get("isTidal"),
+            "latitude": float(lat) if lat is not None else None,
+            "longitude": float(lon) if lon is not None else None,
+            "time_raised": item.get("timeRaised"),
+            "time_severity_changed": item.get("timeSeverityChanged"),
+            "time_message_changed": item.get("timeMessageChanged"),
+        }
+    return list(rows.values())
+
+
+def _centre(item: Dict) -> Optional[Tuple[float, float]]:
+    if item.get("lat") is None or item.get("long") is None:
+        return None
+    return float(item["lat"]), float(item["long"])
+
+
+def area_centres(area_ids: List[str], source: str) -> Dict[str, Tuple[float, float]]:
+    # (lat, lon) per flood area; areas that can't be resolved are left out.
+    if not area_ids:
+        return {}
+    if source.startswith(("http://", "https://")):
+        centres = {}
+        for area_id in area_ids:
+            url = f"{source.rstrip('/')}/{urllib.parse.quote(area_id)}"
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers={"Accept": "application/json"}), timeout=FETCH_TIMEOUT) as response:
+                    item = json.loads(response.read()).get("items") or {}
+            except (OSError, ValueError):
+                logger.warning("Could not resolve flood area %s from %s", area_id, source)
+                continue
+            # A single resource is an object; some endpoints wrap it in a list.
+            centre = _centre(item[0] if isinstance(item, list) and item else item)
+            if centre:
+                centres[area_id] = centre
+        return centres
+
+    with open(Path(source.removeprefix("file://")), "r", encoding="utf-8") as f:
+        items = json.load(f).get("items", [])
+    wanted = set(area_ids)
+    return {item["notation"]: _centre(item) for item in items if item.get("notation") in wanted and _centre(item)}
+
+
+def locate(rows: List[Dict], known: Dict[str, Tuple[float, float]], source: str) -> List[Dict]:
+    # Fills in each row's area centre in place: from the feed item, then the stored row, then the
+    # areas source, so an area is looked up once. Returns the rows that were looked up and found.
+    missing = []
+    for row in rows:
+        if row["latitude"] is None:
+            row["latitude"], row["longitude"] = known.get(row["flood_area_id"], (None, None))
+            if row["latitude"] is None:
+                missing.append(row)
+    try:
+        centres = area_centres([row["flood_area_id"] for row in missing], source)
+    except (OSError, ValueError):
+        logger.warning("Could not read flood areas from %s", source)
+        centres = {}
+    for row in missing:
+        row["latitude"], row["longitude"] = centres.get(row["flood_area_id"], (None, None))
+    return [row for row in missing if row["latitude"] is not None]
+
+
+def _area_name(name: Optional[str]) -> str:
+    return " ".join((name or "").lower().split())
+
+
+class MineMatcher:
+    # Mines indexed by position (BNG grid) and by local authority name, built once per poll.
+    def __init__(self, mines: List[Tuple[str, float, float, Optional[str]]]):
+        self.references = [mine[0] for mine in mines]
+        self.nearest = NearestIndex([mine[1] for mine in mines], [mine[2] for mine in mines])
+        self.by_area: Dict[str, List[str]] = defaultdict(list)
+        for reference, _, _, local_authority in mines:
+            self.by_area[_area_name(local_authority)].append(reference)
+
+    def match(self, warning: Dict) -> Set[str]:
+        if warning.get("latitude") is not None and warning.get("longitude") is not None:
+            eastings, northings = wgs84_to_bng([warning["latitude"]], [warning["longitude"]])
+            positions, _ = self.nearest.nearest(float(eastings[0]), float(northings[0]), radius=MATCH_RADIUS_M)
+            return {self.references[position] for position in positions.tolist()}
+        # Last resort for areas that couldn't be located: the counties named against the mines' local authorities.
+        return {reference for county in (warning.get("county") or "").split(",") for reference in self.by_area.get(_area_name(county), [])}
+
+
+def _warning_key(row: Dict) -> Tuple:
+    return row["severity_level"], row["time_severity_changed"], row["time_message_changed"]
+
+
+def poll(db: Session, source: Optional[str] = None, force: bool = False, areas: Optional[str] = None) -> Dict[str, int]:
+    global _matched_version, version
+    source = source or FEED_SOURCE
+    areas = areas or AREAS_SOURCE
+    with _poll_lock:
+        fetched = fetch(source, force)
+        conn = db.connection()
+        dialect = db.get_bind().dialect.name
+        changed: List[Dict] = []
+        removed: Set[str] = set()
+
+        if fetched is not None:
+            rows = parse_warnings(fetched[0])
+            existing, known = {}, {}
+            for area_id, level, severity_changed, message_changed, lat, lon in conn.execute(
+                select(
+                    FloodWarning.flood_area_id, FloodWarning.severity_level, FloodWarning.time_severity_changed,
+                    FloodWarning.time_message_changed, FloodWarning.latitude, FloodWarning.longitude,
+                )
+            ):
+                existing[area_id] = (level, severity_changed, message_changed)
+                if lat is not None:
+                    known[area_id] = (lat, lon)
+            # Items whose timestamps and level are unchanged are skipped entirely.
+            changed = [row for row in rows if existing.get(row["flood_area_id"]) != _warning_key(row)]
+            removed = set(existing) - {row["flood_area_id"] for row in rows}
+            locate(changed, known, areas)
+            if removed:
+                db.execute(delete(MineFloodWarning).where(MineFloodWarning.flood_area_id.in_(removed)))
+                db.execute(delete(FloodWarning).where(FloodWarning.flood_area_id.in_(removed)))
+            if changed:
+                db.execute(upsert_statement(dialect, FloodWarning.__table__, ("flood_area_id",), UPSERT_COLUMNS), changed)
+
+        # Changed warnings are matched again; every warning is when mines have been ingested since the last match.
+        rematch_all = _matched_version != mine_sites.version
+        if rematch_all:
+            targets = [dict(row._mapping) for row in conn.execute(select(FloodWarning.__table__))]
+            # Warnings stored before their area could be located get another try.
+            located = locate(targets, {}, areas)
+            if located:
+                db.execute(
+                    update(FloodWarning.__table__)
+                    .where(FloodWarning.flood_area_id == bindparam("area_id"))
+                    .values(latitude=bindparam("lat"), longitude=bindparam("lon")),
+                    [{"area_id": row["flood_area_id"], "lat": row["latitude"], "lon": row["longitude"]} for row in located],
+                )
+        else:
+            targets = changed
+        matched = 0
+        if targets:
+            mines = conn.execute(select(Mine.reference, Mine.easting, Mine.northing, Mine.local_authority)).all()
+            matcher = MineMatcher(mines)
+            ids = [target["flood_area_id"] for target in targets]
+            db.execute(delete(MineFloodWarning).where(MineFloodWarning.flood_area_id.in_(ids)))
+            matches = [
+                {"mine_reference": reference, "flood_area_id": target["flood_area_id"]}
+                for target in targets
+                for reference in sorted(matcher.match(target))
+            ]
+            if matches:
+                db.execute(insert_ignoring_conflicts(dialect, MineFloodWarning.__table__), matches)
+            matched = len(matches)
+        db.commit()
+
+        if fetched is not None:
+            _validators[source] = fetched[1]
+        _matched_version = mine_sites.version
+        if changed or removed or targets:
+            version += 1
+        return {"changed": len(changed), "removed": len(removed), "matched": matched}
+
+
+def poll_safely(db: Session) -> None:
+    # For the background poller: a failed poll is logged and retried on the next tick.
+    try:
+        result = poll(db)
+        if any(result.values()):
+            logger.info("Flood warnings: %s", result)
+    except Exception:
+        db.rollback()
+        logger.exception("Flood warning poll of %s failed", FEED_SOURCE)
@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.crud.forecast import upsert_authority_consumption
+from app.forecast_backends import BACKEND_VERSION, BACKENDS
+from app.ingest.consumption import ConsumptionTable, RegionIndex, code_map, data_dir, load_table
+from app.models.forecast import LocalAuthorityEnergyConsumption
+
+
+# The full local-authority releases use the same file names and columns as the
+# bundled regional extract, so point this at a directory holding those.
+LA_DATA_DIR = os.getenv("LA_CONSUMPTION_DIR", data_dir)
+LA_BACKEND = os.getenv("LA_FORECAST_BACKEND", "linear")
+LA_HORIZON = int(os.getenv("FORECAST_HORIZON", "2050"))
+MEASURE = "consumption_all_meters"
+# Fewer observed years than this gives no usable trend.
+MIN_OBSERVATIONS = 3
+
+# Scottish and Welsh authorities are listed under the nation, not an English region.
+CODE_PREFIX_REGIONS = {"S": "UKM", "W": "UKL"}
+
+logger = logging.getLogger(__name__)
+
+# (directory, backend, horizon) -> tag last written, so warm requests skip the database check.
+_written: Dict[Tuple[str, str, int], Tuple[str, str]] = {}
+_write_lock = threading.Lock()
+
+
+def _region_key(name: str) -> str:
+    return re.sub(r"\s*\(.*\)", "", name).strip().lower()
+
+
+def authorities(table: ConsumptionTable) -> List[Dict[str, str]]:
+    codes, names, local_authorities = (np.asarray(table[column]) for column in ("code", "name", "local_authority"))
+    region_names = {_region_key(name): code_map[code] for code, name in zip(codes, names) if code in code_map}
+
+    latest = {}
+    for code, name, local_authority in zip(codes, names, local_authorities):
+        if code in code_map or not local_authority or local_authority.startswith("All local authorities") or "unallocated" in local_authority.lower():
+            continue
+        region = region_names.get(_region_key(name)) or CODE_PREFIX_REGIONS.get(code[:1])
+        if region:
+            # Later releases come last, so renamed authorities keep their current name.
+            latest[code] = {"code": code, "name": local_authority, "region": region}
+    return list(latest.values())
+
+
+def model_version(backend: str) -> str:
+    return f"{backend}-v{BACKEND_VERSION}"
+
+
+def build_rows(table: ConsumptionTable, backend: str = LA_BACKEND, horizon: int = LA_HORIZON) -> List[Dict]:
+    if backend not in BACKENDS:
+        raise ValueError(f"Local authority forecasts need a batched backend, got {backend}")
+
+    listed = authorities(table)
+    if not listed:
+        return []
+    index = RegionIndex.from_table(table, MEASURE, regions=[authority["code"] for authority in listed])
+    years, values = index.years, index.values
+
+    observed = ~np.isnan(values)
+    # Authorities abolished before the latest release keep their history but get no forecast.
+    current = observed[:, -1] & (observed.sum(axis=1) >= MIN_OBSERVATIONS)
+    target_years = np.arange(int(years[-1]) + 1, horizon + 1)
+    predicted = np.full((len(listed), len(target_years)), np.nan)
+    if current.any() and len(target_years):
+        # Every authority is fitted in one vectorized call.
+        predicted[current] = BACKENDS[backend](years.astype(float), values[current], target_years.astype(float))
+
+    version, fingerprint = model_version(backend), table.fingerprint
+    rows = []
+    for row, authority in enumerate(listed):
+        for year, value, source in [
+            *zip(years.tolist(), values[row].tolist(), ["historical"] * len(years)),
+            *zip(target_years.tolist(), predicted[row].tolist(), ["forecast"] * len(target_years)),
+        ]:
+            if np.isfinite(value):
+                rows.append({
+                    **authority,
+                    "year": int(year),
+                    "consumption": round(value, 2),
+                    "source": source,
+                    "model_version": version,
+                    "data_fingerprint": fingerprint,
+                })
+    return rows
+
+
+def refresh(db: Session, directory: Optional[str] = None, backend: str = LA_BACKEND, horizon: int = LA_HORIZON, force: bool = False) -> int:
+    directory = directory or LA_DATA_DIR
+    table = load_table(directory)
+    key, tag = (directory, backend, horizon), (model_version(backend), table.fingerprint)
+    if not force and _written.get(key) == tag:
+        return 0
+
+    with _write_lock:
+        if not force and _written.get(key) == tag:
+            return 0
+        stored = db.query(LocalAuthorityEnergyConsumption.id).filter(
+            LocalAuthorityEnergyConsumption.model_version == tag[0],
+            LocalAuthorityEnergyConsumption.data_fingerprint == tag[1],
+            LocalAuthorityEnergyConsumption.year == horizon,
+        ).first()
+        written = 0
+        if force or stored is None:
+            written = upsert_authority_consumption(db, build_rows(table, backend, horizon))
+            # Rows from older data, another backend or a longer horizon are dropped.
+            db.query(LocalAuthorityEnergyConsumption).filter(or_(
+                LocalAuthorityEnergyConsumption.model_version != tag[0],
+                LocalAuthorityEnergyConsumption.data_fingerprint != tag[1],
+                LocalAuthorityEnergyConsumption.year > horizon,
+            )).delete(synchronize_session=False)
+            db.commit()
+        _written[key] = tag
+        return written
+
+
+def ensure_loaded(db: Session) -> int:
+    # Startup step: requests only read the table, so an empty one is reported here rather than served silently.
+    written = refresh(db)
+    if db.query(LocalAuthorityEnergyConsumption.id).first() is None:
+        logger.warning(
+            "No local authority rows in %s: /forecast/local-authorities will answer 503 until "
+            "LA_CONSUMPTION_DIR points at the full local-authority release", LA_DATA_DIR,
+        )
+    return written
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.crud.forecast import upsert_statement
+from app.database import insert_ignoring_conflicts
+from app.geo import bng_to_wgs84
+from app.models.mine_site import EnergyDemand, EnergyDemandType, FloodEvent, Mine, MineSummary
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+JSON_PATH = Path(os.getenv("MINES_JSON_PATH", str(PROJECT_ROOT / "app/src/main/assets/fake_mine_location_data.json")))
+
+DEMAND_FIELDS = {"EnergyDemandHistory": EnergyDemandType.HISTORICAL, "ForecastEnergyDemand": EnergyDemandType.FORECAST}
+SUMMARY_COLUMNS = ["trend", "latest_demand", "min_demand", "max_demand", "growth_rate", "total_flood_events"]
+# Mines per summary refresh query, well under the bound-parameter limits of SQLite and Postgres.
+SUMMARY_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+_loaded = False
+_load_lock = threading.Lock()
+# Bumped whenever mine rows change so cached layers, payloads and clusters rebuild.
+version = 0
+
+
+def parse_mines(path: Optional[Path] = None, target_ref: Optional[str] = None) -> Dict[str, List[Dict]]:
+    with open(path or JSON_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if target_ref:
+        data = [obj for obj in data if obj["Reference"] == target_ref]
+
+    mines, floods, demand = [], [], []
+    # Later duplicates in the file lose, as they did when each row was checked before insert.
+    seen_mines, seen_floods, seen_demand = set(), set(), set()
+    for obj in data:
+        reference = obj["Reference"]
+        if reference not in seen_mines:
+            seen_mines.add(reference)
+            mines.append({
+                "reference": reference,
+                "name": obj["Name"],
+                "status": obj["Status"],
+                "easting": float(obj["Easting"]),
+                "northing": float(obj["Northing"]),
+                "local_authority": obj.get("LocalAuthority"),
+                "note": obj.get("Note"),
+                "flood_risk_level": obj.get("FloodRiskLevel"),
+            })
+        for flood in obj.get("FloodHistory") or []:
+            key = (reference, flood.get("year"))
+            if None in key or flood.get("events") is None or key in seen_floods:
+                continue
+            seen_floods.add(key)
+            floods.append({"mine_reference": reference, "year": key[1], "events": flood["events"]})
+        for field, demand_type in DEMAND_FIELDS.items():
+            for entry in obj.get(field) or []:
+                key = (reference, entry.get("year"), demand_type)
+                if None in key or entry.get("value") is None or key in seen_demand:
+                    continue
+                seen_demand.add(key)
+                demand.append({"mine_reference": reference, "year": key[1], "value": entry["value"], "type": demand_type})
+
+    if mines:
+        lats, lons = bng_to_wgs84([mine["easting"] for mine in mines], [mine["northing"] for mine in mines])
+        for mine, lat, lon in zip(mines, lats.tolist(), lons.tolist()):
+            mine["latitude"], mine["longitude"] = lat, lon
+    return {"mines": mines, "flood_events": floods, "energy_demand": demand}
+
+
+def ingest(db: Session, path: Optional[Path] = None, target_ref: Optional[str] = None) -> Dict[str, int]:
+    global _loaded, version
+    parsed = parse_mines(path, target_ref)
+
+    # Existing keys in one query per table; only rows missing from the database are sent.
+    # The inserts still skip conflicts, so a concurrent ingest on another replica is harmless.
+    scope = [target_ref] if target_ref else None
+    existing = {
+        "mines": _keys(db, select(Mine.reference), Mine.reference, scope, lambda row: row[0]),
+        "flood_events": _keys(db, select(FloodEvent.mine_reference, FloodEvent.year), FloodEvent.mine_reference, scope, tuple),
+        "energy_demand": _keys(db, select(EnergyDemand.mine_reference, EnergyDemand.year, EnergyDemand.type), EnergyDemand.mine_reference, scope, tuple),
+    }
+    row_key = {
+        "mines": lambda row: row["reference"],
+        "flood_events": lambda row: (row["mine_reference"], row["year"]),
+        "energy_demand": lambda row: (row["mine_reference"], row["year"], row["type"]),
+    }
+    tables = {"mines": Mine.__table__, "flood_events": FloodEvent.__table__, "energy_demand": EnergyDemand.__table__}
+
+    dialect = db.get_bind().dialect.name
+    written, touched = {}, set()
+    for name in ("mines", "flood_events", "energy_demand"):
+        new_rows = [row for row in parsed[name] if row_key[name](row) not in existing[name]]
+        if new_rows:
+            db.execute(insert_ignoring_conflicts(dialect, tables[name]), new_rows)
+        written[name] = len(new_rows)
+        touched.update(row["reference"] if name == "mines" else row["mine_reference"] for row in new_rows)
+    if touched:
+        refresh_summaries(db, touched)
+    db.commit()
+    _loaded = True
+    if any(written.values()):
+        version += 1
+    return written
+
+
+def _keys(db: Session, query, reference_column, scope: Optional[List[str]], key) -> set:
+    if scope is not None:
+        query = query.where(reference_column.in_(scope))
+    # Core rows rather than ORM results: this can be hundreds of thousands of keys.
+    return {key(row) for row in db.connection().execute(query)}
+
+
+def summarize(history: Sequence[Tuple[int, float]], flood_events: int = 0) -> Dict:
+    # history is (year, value) for the historical demand, oldest first.
+    values = [value for _, value in history]
+    trend = growth_rate = None
+    if len(values) >= 2:
+        first, last = values[0], values[-1]
+        trend = "INCREASING" if last > first else "DECREASING" if last < first else "STABLE"
+        span = history[-1][0] - history[0][0]
+        if first > 0 and last > 0 and span > 0:
+            growth_rate = (last / first) ** (1 / span) - 1
+    return {
+        "trend": trend,
+        "latest_demand": values[-1] if values else None,
+        "min_demand": min(values, default=None),
+        "max_demand": max(values, default=None),
+        "growth_rate": growth_rate,
+        "total_flood_events": flood_events,
+    }
+
+
+def refresh_summaries(db: Session, references: Optional[Iterable[str]] = None) -> int:
+    # Recomputes the summaries of the given mines, or of every mine, a batch at a time. The caller commits.
+    conn = db.connection()
+    if references is None:
+        references = conn.execute(select(Mine.reference)).scalars()
+    references = sorted(set(references))
+    statement = upsert_statement(db.get_bind().dialect.name, MineSummary.__table__, ("mine_reference",), SUMMARY_COLUMNS)
+    for start in range(0, len(references), SUMMARY_BATCH):
+        batch = references[start:start + SUMMARY_BATCH]
+        history = defaultdict(list)
+        for reference, year, value in conn.execute(
+            select(EnergyDemand.mine_reference, EnergyDemand.year, EnergyDemand.value)
+            .where(EnergyDemand.type == EnergyDemandType.HISTORICAL, EnergyDemand.mine_reference.in_(batch))
+            .order_by(EnergyDemand.mine_reference, EnergyDemand.year)
+        ):
+            history[reference].append((year, value))
+        floods = dict(conn.execute(
+            select(FloodEvent.mine_reference, func.sum(FloodEvent.events))
+            .where(FloodEvent.mine_reference.in_(batch))
+            .group_by(FloodEvent.mine_reference)
+        ).all())
+        rows = [{"mine_reference": reference, **summarize(history[reference], int(floods.get(reference) or 0))} for reference in batch]
+        db.execute(statement, rows)
+    return len(references)
+
+
+def ensure_summaries(db: Session) -> int:
+    global version
+    # Mines stored before summaries existed get theirs here; later ingests keep them current.
+    missing = db.connection().execute(
+        select(Mine.reference)
+        .outerjoin(MineSummary, MineSummary.mine_reference == Mine.reference)
+        .where(MineSummary.mine_reference.is_(None))
+    ).scalars().all()
+    if not missing:
+        return 0
+    refresh_summaries(db, missing)
+    db.commit()
+    version += 1
+    return len(missing)
+
+
+def ensure_loaded(db: Session) -> None:
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        if db.query(Mine.reference).first() is None:
+            if not JSON_PATH.exists():
+                # Recorded as loaded so requests don't probe and warn again; `python -m app.ingest mines` loads it later.
+                logger.warning("Mine data not found at %s; serving no mines", JSON_PATH)
+                _loaded = True
+                return
+            written = ingest(db)
+            logger.info("Loaded %d mines from %s", written["mines"], JSON_PATH)
+        _loaded = True
+
+
+def fill_coordinates(db: Session) -> int:
+    global version
+    # Mines stored before latitude/longitude existed are converted in one batch.
+    mines = db.query(Mine).filter(Mine.latitude.is_(None)).all()
+    if not mines:
+        return 0
+    lats, lons = bng_to_wgs84([mine.easting for mine in mines], [mine.northing for mine in mines])
+    for mine, lat, lon in zip(mines, lats.tolist(), lons.tolist()):
+        mine.latitude, mine.longitude = lat, lon
+    db.commit()
+    version += 1
+    return len(mines)
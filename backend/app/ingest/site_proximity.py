@@ -0,0 +1,119 @@
+import hashlib
+import threading
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.crud.forecast import upsert_statement
+from app.geo import wgs84_to_bng
+from app.ingest.energy_sites import CATEGORIES
+from app.models.energy_site import EnergySite
+from app.models.mine_site import Mine, MineSiteProximity
+from app.spatial import GridIndex, NearestIndex
+
+
+# Column -> radius in metres; the largest radius is also the grid cell size.
+RADII = {"within_5km": 5000.0, "within_10km": 10000.0, "within_25km": 25000.0}
+UPSERT_COLUMNS = ["site_name", "site_latitude", "site_longitude", "distance_m", *RADII, "sites_fingerprint"]
+BATCH = 1000
+
+_refresh_lock = threading.Lock()
+# Bumped whenever proximity rows change so cached mine details rebuild.
+version = 0
+
+
+def proximity(mine_x: ArrayLike, mine_y: ArrayLike, site_x: ArrayLike, site_y: ArrayLike, radii: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # For every mine: position of the nearest site (-1 if none), its distance, and site counts within each radius.
+    mine_x, mine_y = np.asarray(mine_x, dtype=float), np.asarray(mine_y, dtype=float)
+    site_x, site_y = np.asarray(site_x, dtype=float), np.asarray(site_y, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    nearest = np.full(len(mine_x), -1, dtype=np.int64)
+    distances = np.full(len(mine_x), np.inf)
+    counts = np.zeros((len(mine_x), len(radii)), dtype=np.int64)
+    if len(mine_x) == 0 or len(site_x) == 0:
+        return nearest, distances, counts
+
+    # Mines are handled a grid cell at a time against the sites in that cell and its neighbours,
+    # which holds every site within one cell width of any of those mines.
+    cell = float(radii.max())
+    sites = GridIndex(site_y, site_x, cell_deg=cell)
+    for members in GridIndex(mine_y, mine_x, cell_deg=cell).cells.values():
+        col, row = np.floor(mine_x[members[0]] / cell), np.floor(mine_y[members[0]] / cell)
+        candidates = sites.query((col - 1) * cell, (row - 1) * cell, (col + 2) * cell, (row + 2) * cell)
+        if len(candidates) == 0:
+            continue
+        d = np.hypot(mine_x[members, None] - site_x[candidates], mine_y[members, None] - site_y[candidates])
+        closest = d.argmin(axis=1)
+        nearest[members] = candidates[closest]
+        distances[members] = d[np.arange(len(members)), closest]
+        counts[members] = (d[:, :, None] <= radii).sum(axis=1)
+
+    # Beyond one cell a closer site may sit outside the neighbourhood; those few mines ask the full index.
+    far = np.flatnonzero(distances > cell)
+    if len(far):
+        index = NearestIndex(site_x, site_y, cell=cell)
+        for mine in far.tolist():
+            positions, found = index.nearest(mine_x[mine], mine_y[mine], k=1)
+            nearest[mine], distances[mine] = positions[0], found[0]
+    return nearest, distances, counts
+
+
+def fingerprint(sites: Sequence[Tuple[str, float, float]]) -> str:
+    # Site ids change on every re-ingest, so identical data is recognised by content instead.
+    digest = hashlib.sha1()
+    for name, lat, lon in sorted(sites):
+        digest.update(f"{name}|{lat:.6f}|{lon:.6f}\n".encode())
+    return digest.hexdigest()
+
+
+def refresh(db: Session, force: bool = False) -> Dict[str, int]:
+    # Recomputes only mines without a row for a category, or whose row came from different site data.
+    global version
+    with _refresh_lock:
+        conn = db.connection()
+        mines = conn.execute(select(Mine.reference, Mine.easting, Mine.northing).order_by(Mine.reference)).all()
+        existing = {
+            (reference, category): stored
+            for reference, category, stored in conn.execute(
+                select(MineSiteProximity.mine_reference, MineSiteProximity.category, MineSiteProximity.sites_fingerprint)
+            )
+        }
+        statement = upsert_statement(db.get_bind().dialect.name, MineSiteProximity.__table__, ("mine_reference", "category"), UPSERT_COLUMNS)
+
+        written = {}
+        for category in CATEGORIES:
+            sites = conn.execute(
+                select(EnergySite.name, EnergySite.latitude, EnergySite.longitude).where(EnergySite.type == category)
+            ).all()
+            current = fingerprint([tuple(site) for site in sites])
+            todo = [mine for mine in mines if force or existing.get((mine[0], category)) != current]
+            written[category] = len(todo)
+            if not todo:
+                continue
+
+            site_x, site_y = wgs84_to_bng([site[1] for site in sites], [site[2] for site in sites]) if sites else ([], [])
+            nearest, distances, counts = proximity(
+                [mine[1] for mine in todo], [mine[2] for mine in todo], site_x, site_y, list(RADII.values())
+            )
+            rows = []
+            for mine, position, distance, within in zip(todo, nearest.tolist(), distances.tolist(), counts.tolist()):
+                site = sites[position] if position >= 0 else (None, None, None)
+                rows.append({
+                    "mine_reference": mine[0],
+                    "category": category,
+                    "site_name": site[0],
+                    "site_latitude": site[1],
+                    "site_longitude": site[2],
+                    "distance_m": round(distance, 1) if position >= 0 else None,
+                    **dict(zip(RADII, within)),
+                    "sites_fingerprint": current,
+                })
+            for start in range(0, len(rows), BATCH):
+                db.execute(statement, rows[start:start + BATCH])
+        db.commit()
+        if any(written.values()):
+            version += 1
+        return written
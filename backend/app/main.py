@@ -1,7 +1,47 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import forecast, user,  user_pin, energy_site, mine_site
-from app.database import Base, engine  
-app = FastAPI()
+from starlette.concurrency import run_in_threadpool
+from app import forecast_engine
+from app.ingest import energy_sites, flood_warnings, local_authority, mine_sites, site_proximity
+from app.routes import clusters, forecast, user,  user_pin, energy_site, mine_site
+from app.database import Base, add_missing_columns, add_missing_constraints, engine, run_with_session
+
+
+async def poll_flood_warnings(interval: float):
+    # Incremental: an unchanged feed costs one conditional request and no database writes.
+    while True:
+        await asyncio.sleep(interval)
+        await run_in_threadpool(run_with_session, flood_warnings.poll_safely)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema migrations that rewrite data run here rather than on import, ahead of any ingest.
+    if os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        await run_in_threadpool(add_missing_constraints, engine)
+    # Forecast data and Prophet are loaded on first use unless asked for at startup.
+    if os.getenv("FORECAST_PRELOAD", "false").lower() in ("1", "true", "yes"):
+        await run_in_threadpool(forecast_engine.engine.preload)
+    if os.getenv("INGEST_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        await run_in_threadpool(run_with_session, energy_sites.ensure_loaded)
+        await run_in_threadpool(run_with_session, mine_sites.ensure_loaded)
+        await run_in_threadpool(run_with_session, mine_sites.fill_coordinates)
+        await run_in_threadpool(run_with_session, mine_sites.ensure_summaries)
+        await run_in_threadpool(run_with_session, site_proximity.refresh)
+        await run_in_threadpool(run_with_session, clusters.pyramid.refresh)
+        await run_in_threadpool(run_with_session, local_authority.ensure_loaded)
+        await run_in_threadpool(run_with_session, flood_warnings.poll_safely)
+    poller = None
+    if flood_warnings.POLL_SECONDS > 0:
+        poller = asyncio.create_task(poll_flood_warnings(flood_warnings.POLL_SECONDS))
+    yield
+    if poller is not None:
+        poller.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(forecast.router)
 app.include_router(user.router, prefix="/users", tags=["users"])
@@ -9,6 +49,8 @@ app.include_router(user.router, prefix="/users", tags=["users"])
 app.include_router(user_pin.router, prefix="/api", tags=["pins"])
 app.include_router(energy_site.router)
 app.include_router(mine_site.router)
+app.include_router(clusters.router)
 
 
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
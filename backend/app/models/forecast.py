@@ -1,7 +1,7 @@
 from app.database import Base
 from sqlalchemy import Column, Integer, String, Float
 from app.database import Base
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 
 
 
@@ -12,5 +12,25 @@ class RegionEnergyConsumption(Base):
     year = Column(Integer, index=True, nullable=False)
     consumption = Column(Float, nullable=False)
     source = Column(String(20), nullable=False)  
+    model_version = Column(String(40))
+    data_fingerprint = Column(String(64))
 
-    __table_args__ = (UniqueConstraint("region", "year", name="u_region_year"),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint("region", "year", "model_version", name="u_region_year_model"),)
+
+
+class LocalAuthorityEnergyConsumption(Base):
+    __tablename__ = "local_authority_energy_consumption"
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(10), nullable=False)
+    name = Column(String(100), nullable=False)
+    region = Column(String(10), nullable=False)
+    year = Column(Integer, index=True, nullable=False)
+    consumption = Column(Float, nullable=False)
+    source = Column(String(20), nullable=False)
+    model_version = Column(String(40))
+    data_fingerprint = Column(String(64))
+
+    __table_args__ = (
+        UniqueConstraint("code", "year", name="u_authority_year"),
+        Index("ix_local_authority_region_year", "region", "year"),
+    )
@@ -1,9 +1,9 @@
-from sqlalchemy import Column, String, Float, Integer, ForeignKey, Enum
+from sqlalchemy import Boolean, Column, String, Float, Integer, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
 import enum
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class EnergyDemandType(enum.Enum):
     HISTORICAL = "historical"
@@ -19,12 +19,22 @@ class MineResponse(BaseModel):
     status: Optional[str] = None
     easting: float
     northing: float
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     localAuthority: Optional[str] = None
     floodRiskLevel: Optional[str] = None
     floodHistory: Optional[List] = []
     energyDemandHistory: Optional[List[EnergyDemand]] = []
     forecastEnergyDemand: Optional[List[EnergyDemand]] = []
     trend: Optional[str] = None
+    latestDemand: Optional[float] = None
+    minDemand: Optional[float] = None
+    maxDemand: Optional[float] = None
+    growthRate: Optional[float] = None
+    totalFloodEvents: Optional[int] = None
+    # Most severe live Environment Agency warning for the mine: 1 severe, 2 warning, 3 alert, 4 no longer in force.
+    floodWarningLevel: Optional[int] = None
+    floodWarning: Optional[str] = None
 
     model_config = ConfigDict(
         alias_generator=lambda string: ''.join(
@@ -35,6 +45,32 @@ class MineResponse(BaseModel):
     )
 
 
+class NearestSite(BaseModel):
+    name: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    distance: Optional[float] = None  # metres; None when there are no sites of this category
+    within5km: int = 0
+    within10km: int = 0
+    within25km: int = 0
+
+
+class MineDetailResponse(MineResponse):
+    # The caller's own pin note; mines listed in bulk carry no note.
+    note: Optional[str] = None
+    # Renewable energy category -> nearest operational site and counts around the mine.
+    nearbySites: Dict[str, NearestSite] = {}
+
+
+class SiteProximityResponse(NearestSite):
+    reference: str
+    category: str
+
+
+class NearbyMineResponse(MineResponse):
+    distance: float  # metres from the query point
+
+
 class Mine(Base):
     __tablename__ = "mines"
 
@@ -43,12 +79,17 @@ class Mine(Base):
     status = Column(String, nullable=False)  # "C" = closed, "I" = closing
     easting = Column(Float, nullable=False)
     northing = Column(Float, nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     local_authority = Column(String, nullable=True)
     note = Column(String, nullable=True)
     flood_risk_level = Column(String, nullable=True)
 
     flood_history = relationship("FloodEvent", back_populates="mine", cascade="all, delete")
     energy_demand = relationship("EnergyDemand", back_populates="mine", cascade="all, delete")
+    summary = relationship("MineSummary", uselist=False, viewonly=True)
+    site_proximity = relationship("MineSiteProximity", viewonly=True)
+    flood_warnings = relationship("FloodWarning", secondary="mine_flood_warnings", viewonly=True)
     
 
 
@@ -61,6 +102,8 @@ class FloodEvent(Base):
     mine_reference = Column(String, ForeignKey("mines.reference"), nullable=False)
     mine = relationship("Mine", back_populates="flood_history")
 
+    __table_args__ = (UniqueConstraint("mine_reference", "year", name="u_flood_mine_year"),)
+
 
 class EnergyDemand(Base):
     __tablename__ = "energy_demand"
@@ -70,4 +113,66 @@ class EnergyDemand(Base):
     value = Column(Float, nullable=False)
     type = Column(Enum(EnergyDemandType), nullable=False)  # historical / forecast
     mine_reference = Column(String, ForeignKey("mines.reference"), nullable=False)
-    mine = relationship("Mine", back_populates="energy_demand")
\ No newline at end of file
+    mine = relationship("Mine", back_populates="energy_demand")
+
+    __table_args__ = (UniqueConstraint("mine_reference", "year", "type", name="u_demand_mine_year_type"),)
+
+
+class MineSummary(Base):
+    # Derived from the histories at ingest time so /mines can filter and sort in SQL.
+    __tablename__ = "mine_summaries"
+
+    mine_reference = Column(String, ForeignKey("mines.reference"), primary_key=True)
+    trend = Column(String(12), nullable=True, index=True)
+    latest_demand = Column(Float, nullable=True, index=True)
+    min_demand = Column(Float, nullable=True)
+    max_demand = Column(Float, nullable=True, index=True)
+    growth_rate = Column(Float, nullable=True, index=True)  # compound annual, over the historical years
+    total_flood_events = Column(Integer, nullable=False, default=0, index=True)
+
+
+class MineSiteProximity(Base):
+    # Nearest operational energy site of each category, precomputed by app.ingest.site_proximity.
+    __tablename__ = "mine_site_proximity"
+
+    mine_reference = Column(String, ForeignKey("mines.reference"), primary_key=True)
+    category = Column(String(20), primary_key=True)
+    site_name = Column(String, nullable=True)
+    site_latitude = Column(Float, nullable=True)
+    site_longitude = Column(Float, nullable=True)
+    distance_m = Column(Float, nullable=True)
+    within_5km = Column(Integer, nullable=False, default=0)
+    within_10km = Column(Integer, nullable=False, default=0)
+    within_25km = Column(Integer, nullable=False, default=0)
+    # Fingerprint of the category's sites this row was computed from; a mismatch means recompute.
+    sites_fingerprint = Column(String(40), nullable=False)
+
+    __table_args__ = (Index("ix_mine_site_proximity_category_distance", "category", "distance_m"),)
+
+
+class FloodWarning(Base):
+    # Live Environment Agency flood warnings, one per flood area, kept in step with the feed by app.ingest.flood_warnings.
+    __tablename__ = "flood_warnings"
+
+    flood_area_id = Column(String, primary_key=True)
+    severity = Column(String, nullable=True)
+    severity_level = Column(Integer, nullable=True, index=True)
+    description = Column(String, nullable=True)
+    message = Column(String, nullable=True)
+    county = Column(String, nullable=True)
+    ea_area_name = Column(String, nullable=True)
+    river_or_sea = Column(String, nullable=True)
+    is_tidal = Column(Boolean, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    time_raised = Column(String, nullable=True)
+    time_severity_changed = Column(String, nullable=True)
+    time_message_changed = Column(String, nullable=True)
+
+
+class MineFloodWarning(Base):
+    # Which mines each live warning affects, matched once when the warning arrives or changes.
+    __tablename__ = "mine_flood_warnings"
+
+    mine_reference = Column(String, ForeignKey("mines.reference"), primary_key=True)
+    flood_area_id = Column(String, ForeignKey("flood_warnings.flood_area_id"), primary_key=True, index=True)
@@ -0,0 +1,45 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy.orm import Session
+from app.clusters import MAX_ZOOM, ClusterPyramid
+from app.database import get_db
+from app.ingest import energy_sites, mine_sites
+from app.models.energy_site import EnergySite
+from app.models.mine_site import Mine
+
+router = APIRouter()
+
+
+def load_sites(db: Session):
+    rows = db.query(EnergySite.type, EnergySite.latitude, EnergySite.longitude).all()
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+
+def load_mines(db: Session):
+    rows = db.query(Mine.latitude, Mine.longitude).filter(Mine.latitude.isnot(None)).all()
+    return ["mine"] * len(rows), [row[0] for row in rows], [row[1] for row in rows]
+
+
+# Sites and mines rebuild separately, so a site ingest leaves the mine levels alone.
+pyramid = ClusterPyramid({
+    "sites": (load_sites, lambda: energy_sites.version),
+    "mines": (load_mines, lambda: mine_sites.version),
+})
+
+
+@router.get("/clusters/{z}/{x}/{y}")
+def get_clusters(
+    z: int = Path(ge=0, le=MAX_ZOOM),
+    x: int = Path(ge=0),
+    y: int = Path(ge=0),
+    layers: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=422, detail=f"Tile {x}/{y} is outside zoom {z}")
+
+    energy_sites.ensure_loaded(db)
+    pyramid.refresh(db)
+
+    kinds = [kind.strip().lower() for kind in layers.split(",")] if layers else None
+    return {"zoom": z, "x": x, "y": y, "clusters": pyramid.tile(z, x, y, kinds)}
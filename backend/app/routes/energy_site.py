@@ -1,58 +1,35 @@
-from fastapi import APIRouter, Depends
+from typing import Dict
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.encoding import layer_response
+from app.ingest import energy_sites
 from app.models.energy_site import EnergySite  
-import csv
-from pyproj import Transformer
-from pathlib import Path
-from pathlib import Path
+from app.spatial import SpatialLayer, Viewport, viewport
 
 router = APIRouter()
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-CSV_PATH = (BASE_DIR / "../app/src/main/assets/renewable_energy_planning_database.csv").resolve()
+# category -> sites with a grid index over their coordinates
+_layers: Dict[str, SpatialLayer] = {}
 
-@router.get("/sites/{category}")
-def get_sites(category: str, db: Session = Depends(get_db)):
-    existing = db.query(EnergySite).filter(EnergySite.type == category).all()
-    if existing:
-        return [{"name": s.name, "lat": s.latitude, "lon": s.longitude} for s in existing]
-
-    category_map = {
-        "solar": {"Solar Photovoltaics"},
-        "wind": {"Wind Offshore", "Wind Onshore"},
-        "hydroelectric": {"Large Hydro", "Small Hydro", "Pumped Storage Hydroelectricity"}
-    }
-    target_types = category_map.get(category.lower(), set())
-    if not target_types:
-        return []
+SITE_COLUMNS = {"name": "str", "lat": "f32", "lon": "f32"}
 
-    transformer = Transformer.from_crs("EPSG:27700", "EPSG:4326", always_xy=True)
-    results = []
+def site_layer(db: Session, category: str) -> SpatialLayer:
+    layer = _layers.get(category)
+    if layer is None or not layer.is_current(energy_sites.version):
+        sites = db.query(EnergySite).filter(EnergySite.type == category).all()
+        items = [{"name": s.name, "lat": s.latitude, "lon": s.longitude} for s in sites]
+        layer = SpatialLayer(items, [s.latitude for s in sites], [s.longitude for s in sites], energy_sites.version)
+        _layers[category] = layer
+    return layer
 
-    with CSV_PATH.open("r", encoding="latin1") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            tech_type = row.get("Technology Type", "").strip()
-            status = row.get("Development Status (short)", "").strip()
-            site_name = row.get("Site Name", "").strip()
-            try:
-                x = float(row["X-coordinate"])
-                y = float(row["Y-coordinate"])
-            except (ValueError, TypeError):
-                continue
-
-            if tech_type in target_types and status == "Operational":
-                lon, lat = transformer.transform(x, y)
-                results.append({"name": site_name, "lat": lat, "lon": lon})
+@router.get("/sites/{category}")
+def get_sites(category: str, request: Request, view: Viewport = Depends(viewport), db: Session = Depends(get_db)):
+    category = category.lower()
+    if category not in energy_sites.CATEGORIES:
+        return []
 
-                site = EnergySite(
-                    name=site_name,
-                    type=category,
-                    latitude=lat,
-                    longitude=lon
-                )
-                db.add(site)
+    # Normally loaded at startup or by `python -m app.ingest sites`; this only covers an empty table.
+    energy_sites.ensure_loaded(db)
 
-    db.commit()
-    return results
\ No newline at end of file
+    return layer_response(site_layer(db, category), view, request.headers.get("accept"), SITE_COLUMNS)
@@ -1,14 +1,13 @@
 from fastapi import FastAPI
 from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Dict
-import pandas as pd
-from prophet import Prophet
-import os
-from fastapi import Depends
-from sqlalchemy.future import select
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Dict, List, Literal, Optional
+from fastapi import Depends, Query
+from app.crud.forecast import Grid, query_authority_consumption, read_through as crud_read_through
 from app.database import get_db
-from app.models.forecast import RegionEnergyConsumption 
+from app.forecast_engine import MAX_FORECAST_YEAR, engine, target_regions
+from app.forecast_jobs import JobQueueFull, jobs
+from app.models.forecast import LocalAuthorityEnergyConsumption
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
@@ -16,101 +15,103 @@ from fastapi import HTTPException
 app = FastAPI()
 router = APIRouter()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  
-data_dir = os.path.normpath(os.path.join(BASE_DIR, "..", "..", "..", "app", "src", "main", "assets", "Subnational_electricity_consumption_statistics"))
-
-all_years = range(2005, 2024)
-code_map = {
-    "E12000001": "UKC",
-    "E12000002": "UKD",
-    "E12000003": "UKE",
-    "E12000004": "UKF",
-    "E12000005": "UKG",
-    "E12000006": "UKH",
-    "E12000007": "UKI",
-    "E12000008": "UKJ",
-    "E12000009": "UKK",
-    "W92000004": "UKL",
-    "S92000003": "UKM"
-}
-target_regions = list(code_map.values())
+MAX_BATCH_YEARS = 200
 
-class ForecastRequest(BaseModel):
-    year: int
-
-all_data = []
-for year in all_years:
-    file_path = os.path.join(data_dir, f"Subnational_electricity_consumption_statistics_{year}.csv")
-    df = pd.read_csv(file_path)
-    df["year"] = year
-    df["consumption"] = df["Total consumption\n(GWh):\nAll meters"]
-    df["region"] = df["Code"].replace(code_map)
-    df = df[df["region"].isin(target_regions)]
-    all_data.append(df[["region", "year", "consumption"]])
-df_all = pd.concat(all_data, ignore_index=True)
+ForecastBackend = Literal["prophet", "linear", "holt", "theil-sen"]
+# Prophet's dates stop at 2262 and the batched backends allocate one column per year, so years are bounded.
+ForecastYear = Annotated[int, Field(le=MAX_FORECAST_YEAR)]
 
 class ForecastRequest(BaseModel):
-    year: int
+    year: ForecastYear
+    backend: ForecastBackend = "prophet"
+
+class BatchForecastRequest(BaseModel):
+    years: Optional[List[ForecastYear]] = None
+    start_year: Optional[ForecastYear] = None
+    end_year: Optional[ForecastYear] = None
+    backend: ForecastBackend = "prophet"
+
+    @model_validator(mode="after")
+    def resolve_years(self):
+        if self.years is None:
+            if self.start_year is None or self.end_year is None:
+                raise ValueError("Provide either years or start_year and end_year")
+            if self.end_year < self.start_year:
+                raise ValueError("end_year must not be before start_year")
+            if self.end_year - self.start_year >= MAX_BATCH_YEARS:
+                raise ValueError(f"At most {MAX_BATCH_YEARS} years per batch")
+            self.years = list(range(self.start_year, self.end_year + 1))
+        self.years = sorted(set(self.years))
+        if not self.years:
+            raise ValueError("years must not be empty")
+        if len(self.years) > MAX_BATCH_YEARS:
+            raise ValueError(f"At most {MAX_BATCH_YEARS} years per batch")
+        return self
+
+def read_through(db: Session, years: List[int], backend: str) -> Grid:
+    return crud_read_through(db, engine, years, backend, target_regions)
 
 @router.post("/forecast")
 def forecast_energy(
     req: ForecastRequest,
     db: Session = Depends(get_db)  
-) -> Dict[str, Dict[str, float | str]]:
-
-    result = {}
-
-    for region in target_regions:
-        region_df = df_all[df_all["region"] == region][["year", "consumption"]].copy()
-
-        if req.year in region_df["year"].values:
-            actual_val = region_df[region_df["year"] == req.year]["consumption"].mean()
-            result[region] = {
-                "value": round(actual_val, 2),
-                "source": "historical"
-            }
-            existing = db.query(RegionEnergyConsumption).filter_by(region=region, year=req.year).first()
-            if not existing:
-                db_record = RegionEnergyConsumption(
-                    region=region,
-                    year=req.year,
-                     consumption=float(actual_val),
-                    source="historical"
-                )
-                db.add(db_record)
-            continue
-
-        region_df["ds"] = pd.to_datetime(region_df["year"], format="%Y")
-        region_df["y"] = region_df["consumption"]
-
-        model = Prophet(yearly_seasonality=False)
-        model.fit(region_df[["ds", "y"]])
-
-        years_to_predict = req.year - region_df["ds"].dt.year.max()
-        if years_to_predict <= 0:
-            result[region] = None
-            continue
-
-        future = model.make_future_dataframe(periods=years_to_predict, freq="YS")
-        forecast = model.predict(future)
-        year_pred = forecast[forecast["ds"].dt.year == req.year]
-        avg = year_pred["yhat"].mean()
-
-        result[region] = {
-            "value": round(avg, 2),
-            "source": "forecast"
-        }
-
-        existing = db.query(RegionEnergyConsumption).filter_by(region=region, year=req.year).first()
-        if not existing:
-            db_record = RegionEnergyConsumption(
-            region=region,
-            year=req.year,
-            consumption=float(avg),
-            source="forecast"
-        )
-            db.add(db_record)
-
-    db.commit()  
-
-    return result
+) -> Dict[str, Optional[Dict[str, float | str]]]:
+
+    grid = read_through(db, [req.year], req.backend)
+
+    return {region: by_year[req.year] for region, by_year in grid.items()}
+
+
+@router.post("/forecast/batch")
+def forecast_energy_batch(
+    req: BatchForecastRequest,
+    db: Session = Depends(get_db)
+) -> Dict[str, Dict[int, Optional[Dict[str, float | str]]]]:
+
+    return read_through(db, req.years, req.backend)
+
+
+@router.post("/forecast/jobs", status_code=202)
+def create_forecast_job(req: ForecastRequest):
+    try:
+        job = jobs.submit(req.year, req.backend)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/forecast/jobs/{job_id}")
+def get_forecast_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Forecast job not found")
+    return job.to_dict()
+
+
+@router.get("/forecast/local-authorities")
+def get_local_authority_forecasts(
+    region: Optional[str] = None,
+    authority: Optional[str] = None,
+    year: Optional[int] = None,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+) -> List[Dict[str, float | int | str]]:
+
+    # Precomputed at startup or by `python -m app.ingest local-authorities`; requests only read.
+    if year is not None:
+        start_year = end_year = year
+    rows = query_authority_consumption(db, region, authority, start_year, end_year, limit, offset)
+    if not rows and db.query(LocalAuthorityEnergyConsumption.id).first() is None:
+        raise HTTPException(status_code=503, detail="Local authority forecasts have not been loaded")
+    return [
+        {"code": row.code, "name": row.name, "region": row.region, "year": row.year, "value": row.consumption, "source": row.source}
+        for row in rows
+    ]
+
+
+@router.get("/forecast/backends")
+def compare_forecast_backends() -> List[Dict[str, float | str]]:
+    return engine.compare_backends()
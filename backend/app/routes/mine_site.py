@@ -1,167 +1,266 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import time
+from dataclasses import dataclass, replace
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.crud import user_pin as crud_user_pin
 from app.database import get_db
-from app.models.mine_site import Mine, EnergyDemand, EnergyDemandType,MineResponse, FloodEvent
-import json
-from pathlib import Path
-from app.utils import get_current_user_optional
-from app.models.user import User
-from app.models.user_pin import UserPin
-from typing import Optional
+from app.encoding import encode_json, encoded_response, layer_response
+from app.ingest import energy_sites, flood_warnings, mine_sites, site_proximity
+from app.geo import BNG_BOUNDS, wgs84_to_bng
+from app.spatial import LAYER_TTL, MAX_LIMIT, NearestIndex, SpatialLayer, Viewport, viewport
+from app.models.mine_site import Mine, EnergyDemand, EnergyDemandType,MineResponse, MineDetailResponse, MineSiteProximity, MineSummary, NearbyMineResponse, SiteProximityResponse, FloodEvent
+from app.utils import get_current_user_id_optional
+from typing import Dict, Optional, Tuple
 
 
 router = APIRouter()
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent  
-ASSETS_DIR = PROJECT_ROOT / "app/src/main/assets"
-JSON_PATH = ASSETS_DIR / "fake_mine_location_data.json"
-
-def load_mines_from_json(db: Session, json_file: Path, target_ref: str = None):
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    mines_loaded = []
-    for obj in data:
-        if target_ref and obj["Reference"] != target_ref:
-            continue
-
-        mine_ref = obj["Reference"]
-        mine = db.query(Mine).filter_by(reference=mine_ref).first()
-        if not mine:
-            mine = Mine(
-                reference=mine_ref,
-                name=obj["Name"],
-                status=obj["Status"],
-                easting=float(obj["Easting"]),
-                northing=float(obj["Northing"]),
-                local_authority=obj.get("LocalAuthority"),
-                note=obj.get("Note"),
-                flood_risk_level=obj.get("FloodRiskLevel"),
+class MineLayer(SpatialLayer):
+    # The lookups built with a mine layer live on it, so a request reads them from one consistent build.
+    def __init__(self, items, lats, lons, version, eastings, northings):
+        super().__init__(items, lats, lons, version)
+        self.by_reference = {item["reference"]: item for item in self.items}
+        # Positions in nearest are positions in items.
+        self.nearest = NearestIndex(eastings, northings)
+
+
+# Serialized mines with a grid index over them, rebuilt whenever mines are (re)loaded.
+_mine_layer: Optional[MineLayer] = None
+# reference -> serialized MineResponse, without the per-user note; cleared with the mine version or the layer TTL.
+_mine_details: Dict[str, dict] = {}
+_details_key: Optional[Tuple[int, ...]] = None
+
+# Flat fields for map markers in the columnar encodings; JSON keeps the full MineResponse.
+MINE_COLUMNS = {
+    "reference": "str",
+    "name": "str",
+    "status": "str",
+    "latitude": "f32",
+    "longitude": "f32",
+    "localAuthority": "str",
+    "floodRiskLevel": "str",
+    "floodWarning": "str",
+    "trend": "str",
+}
+
+SUMMARY_SORTS = {
+    "latest_demand": MineSummary.latest_demand,
+    "min_demand": MineSummary.min_demand,
+    "max_demand": MineSummary.max_demand,
+    "growth_rate": MineSummary.growth_rate,
+    "total_flood_events": MineSummary.total_flood_events,
+}
+TRENDS = ("INCREASING", "DECREASING", "STABLE")
+NEAR_COLUMNS = {**MINE_COLUMNS, "distance": "f32"}
+DEFAULT_NEAR_K = 10
+MAX_NEAR_RADIUS_M = 100_000
+
+
+@dataclass
+class SummaryFilter:
+    trend: Optional[str] = None
+    min_growth_rate: Optional[float] = None
+    max_growth_rate: Optional[float] = None
+    min_latest_demand: Optional[float] = None
+    max_latest_demand: Optional[float] = None
+    min_flood_events: Optional[int] = None
+    sort: Optional[str] = None
+
+
+def summary_filter(
+    trend: Optional[str] = Query(None, description="INCREASING, DECREASING or STABLE"),
+    min_growth_rate: Optional[float] = Query(None, description="compound annual growth, 0.05 = 5%"),
+    max_growth_rate: Optional[float] = None,
+    min_latest_demand: Optional[float] = None,
+    max_latest_demand: Optional[float] = None,
+    min_flood_events: Optional[int] = Query(None, ge=0),
+    sort: Optional[str] = Query(None, description=f"one of {', '.join(SUMMARY_SORTS)}; prefix '-' for descending"),
+) -> SummaryFilter:
+    if trend is not None and trend.upper() not in TRENDS:
+        raise HTTPException(status_code=422, detail=f"trend must be one of {', '.join(TRENDS)}")
+    if sort is not None and sort.lstrip("-") not in SUMMARY_SORTS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(SUMMARY_SORTS)}")
+    return SummaryFilter(trend and trend.upper(), min_growth_rate, max_growth_rate, min_latest_demand, max_latest_demand, min_flood_events, sort)
+
+
+def filtered_references(db: Session, summary: SummaryFilter) -> list[str]:
+    # Answered from the indexed summary table, without touching the histories.
+    query = db.query(MineSummary.mine_reference)
+    bounds = [
+        (MineSummary.trend, summary.trend, "=="),
+        (MineSummary.growth_rate, summary.min_growth_rate, ">="),
+        (MineSummary.growth_rate, summary.max_growth_rate, "<="),
+        (MineSummary.latest_demand, summary.min_latest_demand, ">="),
+        (MineSummary.latest_demand, summary.max_latest_demand, "<="),
+        (MineSummary.total_flood_events, summary.min_flood_events, ">="),
+    ]
+    for column, value, op in bounds:
+        if value is not None:
+            query = query.filter(column == value if op == "==" else column >= value if op == ">=" else column <= value)
+    if summary.sort:
+        column = SUMMARY_SORTS[summary.sort.lstrip("-")]
+        # Mines without the value go last either way.
+        query = query.order_by(column.is_(None), column.desc() if summary.sort.startswith("-") else column.asc(), MineSummary.mine_reference)
+    return [row[0] for row in query.all()]
+
+
+def nearest_site(row: MineSiteProximity) -> dict:
+    return {
+        "name": row.site_name,
+        "latitude": row.site_latitude,
+        "longitude": row.site_longitude,
+        "distance": row.distance_m,
+        "within5km": row.within_5km,
+        "within10km": row.within_10km,
+        "within25km": row.within_25km,
+    }
+
+def mine_detail(db: Session, reference: str) -> Optional[dict]:
+    global _details_key
+    key = (mine_sites.version, site_proximity.version, flood_warnings.version, int(time.monotonic() // LAYER_TTL))
+    if key != _details_key:
+        _mine_details.clear()
+        _details_key = key
+    detail = _mine_details.get(reference)
+    if detail is None:
+        # The mine with its summary joined in, then one IN (...) query per collection; joining the
+        # collections too would return the product of their rows.
+        mine = (
+            db.query(Mine)
+            .options(
+                joinedload(Mine.summary),
+                selectinload(Mine.energy_demand),
+                selectinload(Mine.flood_history),
+                selectinload(Mine.site_proximity),
+                selectinload(Mine.flood_warnings),
             )
-            db.add(mine)
-            db.flush()
-
-        energy_history = []  
-
-        if obj.get("FloodHistory"):
-            for fh in obj["FloodHistory"]:
-                year = fh.get("year")
-                events = fh.get("events")
-                if year is not None and events is not None:
-                    exists = db.query(FloodEvent).filter_by(
-                        mine_reference=mine_ref,
-                        year=year
-                    ).first()
-                    if not exists:
-                        flood = FloodEvent(
-                            year=year,
-                            events=events,
-                            mine_reference=mine_ref
-                        )
-                        db.add(flood)
-
-        if obj.get("EnergyDemandHistory"):
-            for ed in obj["EnergyDemandHistory"]:
-                year = ed.get("year")
-                value = ed.get("value")
-                if year is not None and value is not None:
-                    exists = db.query(EnergyDemand).filter_by(
-                        mine_reference=mine_ref,
-                        year=year,
-                        type=EnergyDemandType.HISTORICAL
-                    ).first()
-                    if not exists:
-                        demand = EnergyDemand(
-                            year=year,
-                            value=value,
-                            type=EnergyDemandType.HISTORICAL,
-                            mine_reference=mine_ref
-                        )
-                        db.add(demand)
-                    energy_history.append(EnergyDemand(year=year, value=value, type=EnergyDemandType.HISTORICAL))
-
-        if obj.get("ForecastEnergyDemand"):
-            for ed in obj["ForecastEnergyDemand"]:
-                year = ed.get("year")
-                value = ed.get("value")
-                if year is not None and value is not None:
-                    exists = db.query(EnergyDemand).filter_by(
-                        mine_reference=mine_ref,
-                        year=year,
-                        type=EnergyDemandType.FORECAST
-                    ).first()
-                    if not exists:
-                        demand = EnergyDemand(
-                            year=year,
-                            value=value,
-                            type=EnergyDemandType.FORECAST,
-                            mine_reference=mine_ref
-                        )
-                        db.add(demand)
-
-        mines_loaded.append(mine)
-
-    db.commit()
-    return mines_loaded
-
-
-def calculate_trend(energy_history: list[EnergyDemand]) -> str | None:
-    if len(energy_history) < 2:
-        return None
-    first = energy_history[0].value
-    last = energy_history[-1].value
-    if last > first:
-        return "INCREASING"
-    elif last < first:
-        return "DECREASING"
-    else:
-        return "STABLE"
+            .filter(Mine.reference == reference)
+            .first()
+        )
+        if mine is None:
+            return None
+        nearby = {row.category: nearest_site(row) for row in mine.site_proximity}
+        detail = MineDetailResponse.model_validate({**orm_to_dict(mine), "nearbySites": nearby}).model_dump(mode="json", by_alias=True)
+        _mine_details[reference] = detail
+    return detail
 
-@router.get("/mines/{reference}", response_model=MineResponse)
+@router.get("/mines/site-proximity", response_model=list[SiteProximityResponse])
+def list_site_proximity(
+    category: Optional[str] = Query(None, description="solar, wind or hydroelectric"),
+    max_distance: Optional[float] = Query(None, gt=0, description="metres to the nearest site"),
+    limit: int = Query(1000, ge=1, le=MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    query = db.query(MineSiteProximity)
+    if category is not None:
+        if category.lower() not in energy_sites.CATEGORIES:
+            raise HTTPException(status_code=422, detail=f"category must be one of {', '.join(energy_sites.CATEGORIES)}")
+        query = query.filter(MineSiteProximity.category == category.lower())
+    if max_distance is not None:
+        query = query.filter(MineSiteProximity.distance_m <= max_distance)
+    rows = (
+        query.order_by(MineSiteProximity.category, MineSiteProximity.distance_m.is_(None), MineSiteProximity.distance_m, MineSiteProximity.mine_reference)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [{"reference": row.mine_reference, "category": row.category, **nearest_site(row)} for row in rows]
+
+@router.get("/mines/near", response_model=list[NearbyMineResponse])
+def mines_near(
+    request: Request,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    easting: Optional[float] = Query(None, ge=BNG_BOUNDS[0], le=BNG_BOUNDS[2]),
+    northing: Optional[float] = Query(None, ge=BNG_BOUNDS[1], le=BNG_BOUNDS[3]),
+    k: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    radius: Optional[float] = Query(None, gt=0, le=MAX_NEAR_RADIUS_M, description="metres"),
+    db: Session = Depends(get_db),
+):
+    if (lat is None) != (lon is None) or (easting is None) != (northing is None) or (lat is None) == (easting is None):
+        raise HTTPException(status_code=422, detail="Give either lat and lon, or easting and northing")
+    if lat is not None:
+        eastings, northings = wgs84_to_bng([lat], [lon])
+        easting, northing = float(eastings[0]), float(northings[0])
+        # Far from Britain the projection runs away, and a kNN search would widen until it held every mine.
+        if not (BNG_BOUNDS[0] <= easting <= BNG_BOUNDS[2] and BNG_BOUNDS[1] <= northing <= BNG_BOUNDS[3]):
+            raise HTTPException(status_code=422, detail="Point is outside the British National Grid")
+    if k is None and radius is None:
+        k = DEFAULT_NEAR_K
+
+    layer = mine_layer(db)
+    positions, distances = layer.nearest.nearest(easting, northing, k, radius)
+    items = [{**layer.items[position], "distance": round(distance, 1)} for position, distance in zip(positions.tolist(), distances.tolist())]
+    return encoded_response(items, request.headers.get("accept"), NEAR_COLUMNS)
+
+@router.get("/mines/{reference}", response_model=MineDetailResponse)
 def get_mine(
     reference: str, 
     db: Session = Depends(get_db), 
-    current_user: Optional[User] = Depends(get_current_user_optional)
+    user_id: Optional[int] = Depends(get_current_user_id_optional)
 ):
-    mine = db.query(Mine).filter(Mine.reference == reference).first()
-    if not mine:
+    detail = mine_detail(db, reference)
+    if detail is None:
         raise HTTPException(status_code=404, detail="Mine not found")
 
+    # Pins store the mine reference as an integer.
     user_note = None
-    if current_user:
-        user_pin = db.query(UserPin).filter_by(user_id=current_user.id, mine_id=mine.id).first()
-        user_note = user_pin.note if user_pin else None
+    if user_id is not None and reference.isdigit():
+        user_note = crud_user_pin.get_pin_notes(db, user_id).get(int(reference))
 
-    historical = [e for e in mine.energy_demand if e.type == EnergyDemandType.HISTORICAL]
-    trend = calculate_trend(historical)
+    return Response(content=encode_json({**detail, "note": user_note}), media_type="application/json")
 
-    return {
-        "reference": mine.reference,
-        "name": mine.name,
-        "status": mine.status,
-        "easting": mine.easting,
-        "northing": mine.northing,
-        "localAuthority": mine.local_authority,
-        "note": user_note,  
-        "floodRiskLevel": mine.flood_risk_level,
-        "floodHistory": [{"year": f.year, "events": f.events} for f in mine.flood_history],
-        "energyDemandHistory": [
-            {"year": e.year, "value": e.value}
-            for e in historical
-        ],
-        "forecastEnergyDemand": [
-            {"year": e.year, "value": e.value}
-            for e in mine.energy_demand if e.type == EnergyDemandType.FORECAST
-        ],
-        "trend": trend
-    }
+def mines_with_history(db: Session) -> list[Mine]:
+    # A fixed number of queries however many mines there are: mines, then histories, summaries and warnings by IN (...).
+    return (
+        db.query(Mine)
+        .options(selectinload(Mine.energy_demand), selectinload(Mine.flood_history), selectinload(Mine.summary), selectinload(Mine.flood_warnings))
+        .all()
+    )
+
+def mine_layer(db: Session) -> MineLayer:
+    global _mine_layer
+    # Live flood warnings are part of every item, so a poll that changed them rebuilds the layer too.
+    current = (mine_sites.version, flood_warnings.version)
+    layer = _mine_layer
+    if layer is None or not layer.is_current(current):
+        mines = mines_with_history(db)
+        if not mines:
+            # Normally loaded at startup or by `python -m app.ingest mines`; this only covers an empty table.
+            mine_sites.ensure_loaded(db)
+            mines = mines_with_history(db)
+        # Validated once per load, so requests only select and serialize.
+        items = [MineResponse.model_validate(orm_to_dict(mine)).model_dump(mode="json", by_alias=True) for mine in mines]
+        layer = MineLayer(
+            items,
+            [mine.latitude for mine in mines],
+            [mine.longitude for mine in mines],
+            current,
+            [mine.easting for mine in mines],
+            [mine.northing for mine in mines],
+        )
+        _mine_layer = layer
+    # The local, not the global, which a concurrent rebuild may already have replaced.
+    return layer
 
 @router.get("/mines", response_model=list[MineResponse])
-def list_mines(db: Session = Depends(get_db)):
-    mines = db.query(Mine).all()
-    if not mines:
-        mines = load_mines_from_json(db, JSON_PATH)
-    return [orm_to_dict(mine) for mine in mines]
+def list_mines(
+    request: Request,
+    view: Viewport = Depends(viewport),
+    summary: SummaryFilter = Depends(summary_filter),
+    db: Session = Depends(get_db),
+):
+    layer = mine_layer(db)
+    if summary == SummaryFilter():
+        return layer_response(layer, view, request.headers.get("accept"), MINE_COLUMNS)
+
+    references = filtered_references(db, summary)
+    in_view = None
+    if view.bounded or view.zoom is not None:
+        in_view = {item["reference"] for item in layer.select(replace(view, limit=None))}
+    items = [layer.by_reference[reference] for reference in references if reference in layer.by_reference and (in_view is None or reference in in_view)]
+    return encoded_response(items[:view.limit], request.headers.get("accept"), MINE_COLUMNS)
 
 
 def to_camel(snake_str: str) -> str:
@@ -170,7 +269,13 @@ def to_camel(snake_str: str) -> str:
 
 def orm_to_dict(mine: Mine) -> dict:
     historical = [e for e in mine.energy_demand if e.type == EnergyDemandType.HISTORICAL]
-    trend = calculate_trend(sorted(historical, key=lambda x: x.year))
+    if mine.summary is not None:
+        summary = {column: getattr(mine.summary, column) for column in mine_sites.SUMMARY_COLUMNS}
+    else:
+        # Not summarized yet (or not from the database): derive it the same way the ingest does.
+        summary = mine_sites.summarize(sorted((e.year, e.value) for e in historical), sum(f.events for f in mine.flood_history))
+    # Lower severity levels are more severe.
+    warning = min(mine.flood_warnings, key=lambda w: (w.severity_level or 5, w.flood_area_id), default=None)
 
     data = {
         "reference": mine.reference,
@@ -178,6 +283,8 @@ def orm_to_dict(mine: Mine) -> dict:
         "status": mine.status,
         "easting": mine.easting,
         "northing": mine.northing,
+        "latitude": mine.latitude,
+        "longitude": mine.longitude,
         "localAuthority": mine.local_authority,
         "note": mine.note,
         "floodRiskLevel": mine.flood_risk_level,
@@ -190,13 +297,20 @@ def orm_to_dict(mine: Mine) -> dict:
             {"year": e.year, "value": e.value}
             for e in mine.energy_demand if e.type == EnergyDemandType.FORECAST
         ],
-        "trend": trend,
+        "trend": summary["trend"],
+        "latestDemand": summary["latest_demand"],
+        "minDemand": summary["min_demand"],
+        "maxDemand": summary["max_demand"],
+        "growthRate": summary["growth_rate"],
+        "totalFloodEvents": summary["total_flood_events"],
+        "floodWarningLevel": warning.severity_level if warning else None,
+        "floodWarning": warning.severity if warning else None,
     }
     return data
 
 @router.get("/debug/floods")
 def debug_floods(db: Session = Depends(get_db)):
-    mines = db.query(Mine).all()
+    mines = db.query(Mine).options(selectinload(Mine.flood_history)).all()
     results = []
     for mine in mines:
         results.append({
@@ -34,5 +34,6 @@ def login(user_login: UserLogin, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    access_token = create_access_token(data={"sub": user.id})
+    # JWT subjects must be strings; python-jose rejects integer ones on decode.
+    access_token = create_access_token(data={"sub": str(user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -18,12 +18,14 @@ def create_or_update_pin(user_id: int, pin_data: UserPinCreate, db: Session = De
         existing_pin.note = pin_data.note
         db.commit()
         db.refresh(existing_pin)
+        crud_user_pin.forget_pin_notes(user_id)
         return existing_pin
     else:
         new_pin = UserPin(user_id=user_id, mine_id=pin_data.mine_id, note=pin_data.note)
         db.add(new_pin)
         db.commit()
         db.refresh(new_pin)
+        crud_user_pin.forget_pin_notes(user_id)
         return new_pin
 
 @router.get("/users/{user_id}/pins", response_model=list[UserPinResponse])
@@ -48,4 +50,5 @@ def delete_pin(user_id: int, mine_id: int, db: Session = Depends(get_db)):
     
     db.delete(pin)
     db.commit()
+    crud_user_pin.forget_pin_notes(user_id)
     return pin
\ No newline at end of file
@@ -0,0 +1,164 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException, Query
+from numpy.typing import ArrayLike
+
+
+# Grid cell size in degrees; about 28 km north-south, a few hundred points per cell for the REPD.
+CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.25"))
+# Layers built from the database are rebuilt after this long, so other replicas' writes show up.
+LAYER_TTL = float(os.getenv("SPATIAL_LAYER_TTL", "300"))
+# With a zoom level, keep at most one point per 1/THIN_CELLS_PER_TILE of a 256px web-mercator tile (~32px).
+THIN_CELLS_PER_TILE = 8
+MAX_LIMIT = 50000
+# Cell size in metres for nearest-neighbour grids on British National Grid coordinates.
+NEAR_CELL_M = float(os.getenv("SPATIAL_NEAR_CELL_M", "5000"))
+
+
+@dataclass
+class Viewport:
+    min_lon: Optional[float] = None
+    min_lat: Optional[float] = None
+    max_lon: Optional[float] = None
+    max_lat: Optional[float] = None
+    limit: Optional[int] = None
+    zoom: Optional[int] = None
+
+    @property
+    def bounded(self) -> bool:
+        return self.min_lon is not None
+
+
+def viewport(
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat in WGS84"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+) -> Viewport:
+    if bbox is None:
+        return Viewport(limit=limit, zoom=zoom)
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=422, detail="bbox minimum must not exceed maximum")
+    if not (-180 <= min_lon and max_lon <= 180 and -90 <= min_lat and max_lat <= 90):
+        raise HTTPException(status_code=422, detail="bbox must lie within -180..180 longitude and -90..90 latitude")
+    return Viewport(min_lon, min_lat, max_lon, max_lat, limit, zoom)
+
+
+def _cell_keys(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    # Pack (row, col) into one int64 so cells can be sorted and looked up together.
+    return (rows.astype(np.int64) << 32) + (cols.astype(np.int64) & 0xFFFFFFFF)
+
+
+class GridIndex:
+    def __init__(self, lats: ArrayLike, lons: ArrayLike, cell_deg: float = CELL_DEG):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.cell_deg = cell_deg
+        rows, cols = np.floor(self.lats / cell_deg), np.floor(self.lons / cell_deg)
+        keys = _cell_keys(rows, cols)
+        order = np.argsort(keys, kind="stable")
+        cell_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        self.cells = {int(key): order[start:end] for key, start, end in zip(cell_keys, starts, ends)}
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def query(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> np.ndarray:
+        first_row, last_row = np.floor(min_lat / self.cell_deg), np.floor(max_lat / self.cell_deg)
+        first_col, last_col = np.floor(min_lon / self.cell_deg), np.floor(max_lon / self.cell_deg)
+        # Counted before any range is built, so a huge box costs nothing extra.
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > len(self.cells):
+            # A viewport wider than the data: scanning every point is cheaper than walking empty cells.
+            candidates = np.arange(len(self))
+        else:
+            row_range, col_range = np.arange(first_row, last_row + 1), np.arange(first_col, last_col + 1)
+            keys = _cell_keys(*np.meshgrid(row_range, col_range, indexing="ij")).ravel()
+            hits = [self.cells[key] for key in keys.tolist() if key in self.cells]
+            candidates = np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+        lats, lons = self.lats[candidates], self.lons[candidates]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return np.sort(candidates[inside])
+
+    def thin(self, indices: np.ndarray, zoom: int) -> np.ndarray:
+        # Keep the first point in each on-screen cell, so dense areas don't overdraw when zoomed out.
+        cell_deg = 360.0 / (2 ** zoom) / THIN_CELLS_PER_TILE
+        keys = _cell_keys(np.floor(self.lats[indices] / cell_deg), np.floor(self.lons[indices] / cell_deg))
+        _, first = np.unique(keys, return_index=True)
+        return indices[np.sort(first)]
+
+
+class NearestIndex:
+    # k-nearest and radius search on planar coordinates (BNG metres), on top of a GridIndex.
+    def __init__(self, xs: ArrayLike, ys: ArrayLike, cell: float = NEAR_CELL_M):
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        self.grid = GridIndex(self.ys, self.xs, cell_deg=cell)
+        self.cell = cell
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def _within(self, x: float, y: float, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = self.grid.query(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self.xs[candidates] - x, self.ys[candidates] - y)
+        inside = distances <= radius
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.lexsort((candidates, distances))
+        return candidates[order], distances[order]
+
+    def nearest(self, x: float, y: float, k: Optional[int] = None, radius: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Returns (positions, distances) nearest first; k, radius or both bound the result.
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        if k is None:
+            return self._within(x, y, radius)
+        # Grow the search square until it holds k points that are provably the nearest.
+        search = self.cell if radius is None else min(self.cell, radius)
+        while True:
+            positions, distances = self._within(x, y, search)
+            if len(positions) >= k or (radius is not None and search >= radius) or len(positions) == len(self):
+                return positions[:k], distances[:k]
+            search = search * 2 if radius is None else min(search * 2, radius)
+
+
+class SpatialLayer:
+    # Items plus a grid over their coordinates; items without coordinates are only returned unfiltered.
+    def __init__(self, items: Sequence[Any], lats: Sequence[Optional[float]], lons: Sequence[Optional[float]], version: Any = None):
+        self.items = list(items)
+        self.version = version
+        self.built_at = time.monotonic()
+        lats = np.array([np.nan if lat is None else lat for lat in lats], dtype=float)
+        lons = np.array([np.nan if lon is None else lon for lon in lons], dtype=float)
+        self.located = np.flatnonzero(~np.isnan(lats) & ~np.isnan(lons))
+        self.grid = GridIndex(lats[self.located], lons[self.located])
+        self._payloads: Dict[str, bytes] = {}
+
+    def payload(self, key: str, build: Callable[[], bytes]) -> bytes:
+        # Serialized forms of the whole layer, built on first request and dropped with the layer.
+        if key not in self._payloads:
+            self._payloads[key] = build()
+        return self._payloads[key]
+
+    def is_current(self, version: Any = None, ttl: float = LAYER_TTL) -> bool:
+        return self.version == version and time.monotonic() - self.built_at < ttl
+
+    def select(self, view: Viewport) -> List[Any]:
+        if not view.bounded and view.zoom is None:
+            return self.items[:view.limit]
+        if view.bounded:
+            positions = self.grid.query(view.min_lon, view.min_lat, view.max_lon, view.max_lat)
+        else:
+            positions = np.arange(len(self.grid))
+        if view.zoom is not None:
+            positions = self.grid.thin(positions, view.zoom)
+        if view.limit is not None:
+            positions = positions[:view.limit]
+        return [self.items[index] for index in self.located[positions].tolist()]
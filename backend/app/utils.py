@@ -52,3 +52,14 @@ def get_current_user_optional(
 
     user = db.query(User).filter(User.id == user_id).first()
     return user
+
+def get_current_user_id_optional(token: Optional[str] = Security(oauth2_scheme)) -> Optional[int]:
+    # Token check only, without the User lookup, for endpoints that just need the caller's id.
+    if token is None:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    user_id = payload.get("sub")
+    return int(user_id) if user_id is not None and str(user_id).isdigit() else None
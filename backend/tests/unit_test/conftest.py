@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.database import Base, get_db
+
+
+@pytest.fixture
+def memory_db():
+    # Opens a session on a fresh in-memory SQLite database holding the given tables (all of them by
+    # default). One shared connection, so the TestClient's worker thread sees the same data.
+    sessions = []
+
+    def open_session(*tables):
+        engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        Base.metadata.create_all(engine, tables=list(tables) or None)
+        session = sessionmaker(bind=engine)()
+        sessions.append(session)
+        return session
+
+    yield open_session
+    for session in sessions:
+        session.close()
+
+
+@pytest.fixture
+def override_db():
+    # Serves get_db from the given session, putting back whatever override was installed before.
+    previous = app.dependency_overrides.get(get_db)
+
+    def install(session):
+        app.dependency_overrides[get_db] = lambda: session
+        return session
+
+    yield install
+    if previous is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.clusters import ClusterPyramid, build_levels, to_mercator
+from app.ingest import energy_sites
+from app.models.energy_site import EnergySite
+from app.models.mine_site import Mine
+from app.routes import clusters as cluster_routes
+from app.routes import mine_site
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(50, 58, 2000), rng.uniform(-6, 1.5, 2000)
+
+
+def test_every_level_keeps_every_point(points):
+    lats, lons = points
+    levels = build_levels(lats, lons, max_zoom=10)
+
+    assert [int(level.counts.sum()) for level in levels] == [2000] * 11
+    assert len(levels[0].counts) < len(levels[10].counts)
+    assert np.allclose(levels[0].lat_sums.sum(), lats.sum())
+
+
+def test_mercator_tile_of_london():
+    x, y = to_mercator([51.5074], [-0.1278])
+
+    # Zoom 10 tile 511/340 is central London.
+    assert (int(x[0] * 1024), int(y[0] * 1024)) == (511, 340)
+
+
+def test_tile_merges_sources_with_type_breakdown():
+    sources = {
+        "sites": (lambda db: (["solar", "wind", "solar"], [51.50, 51.51, 55.9], [-0.12, -0.11, -3.2]), lambda: 1),
+        "mines": (lambda db: (["mine"], [51.505], [-0.115]), lambda: 1),
+    }
+    pyramid = ClusterPyramid(sources, max_zoom=6)
+    pyramid.refresh(None)
+
+    world = pyramid.tile(0, 0, 0)
+    assert sum(cluster["count"] for cluster in world) == 4
+    great_britain = pyramid.tile(4, 7, 5)
+    london = next(cluster for cluster in great_britain if cluster["types"].get("mine"))
+    assert london["types"] == {"solar": 1, "wind": 1, "mine": 1}
+    assert london["lat"] == pytest.approx(51.505)
+
+    assert sum(cluster["count"] for cluster in pyramid.tile(0, 0, 0, ["mine"])) == 1
+    assert pyramid.tile(0, 0, 0, ["hydroelectric"]) == []
+
+
+def test_only_changed_source_is_rebuilt():
+    versions = {"sites": 1, "mines": 1}
+    loads = []
+
+    def loader(name):
+        def load(db):
+            loads.append(name)
+            return [name], [52.0], [-1.0]
+        return load
+
+    pyramid = ClusterPyramid({name: (loader(name), lambda name=name: versions[name]) for name in versions}, max_zoom=3)
+
+    assert pyramid.refresh(None) == ["sites", "mines"]
+    assert pyramid.refresh(None) == []
+    versions["sites"] = 2
+    assert pyramid.refresh(None) == ["sites"]
+    assert loads == ["sites", "mines", "sites"]
+
+
+@pytest.fixture
+def db(memory_db, override_db, monkeypatch):
+    session = memory_db(EnergySite.__table__, Mine.__table__)
+    session.add_all([
+        EnergySite(name="Solar", type="solar", latitude=51.50, longitude=-0.12),
+        EnergySite(name="Wind", type="wind", latitude=57.0, longitude=-3.0),
+        Mine(reference="1", name="Mine", status="C", easting=530000, northing=180000, latitude=51.51, longitude=-0.13),
+    ])
+    session.commit()
+    monkeypatch.setattr(energy_sites, "_loaded", True)
+    monkeypatch.setattr(cluster_routes, "pyramid", ClusterPyramid(cluster_routes.pyramid.sources))
+    return override_db(session)
+
+
+def test_clusters_endpoint(db):
+    world = client.get("/clusters/0/0/0").json()
+    london = client.get("/clusters/10/511/340", params={"layers": "solar,mine"}).json()
+
+    assert sum(cluster["count"] for cluster in world["clusters"]) == 3
+    assert sum(cluster["count"] for cluster in london["clusters"]) == 2
+    assert client.get("/clusters/1/2/0").status_code == 422
+    assert client.get("/clusters/30/0/0").status_code == 422
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.crud.forecast import cached_consumption, consumption_rows, upsert_consumption, upsert_statement
+from app.models.forecast import RegionEnergyConsumption
+
+
+@pytest.fixture
+def db(memory_db):
+    return memory_db(RegionEnergyConsumption.__table__)
+
+
+def test_upsert_inserts_then_updates_in_place(db):
+    upsert_consumption(db, [
+        {"region": "UKC", "year": 2030, "consumption": 1.0, "source": "forecast"},
+        {"region": "UKD", "year": 2030, "consumption": 2.0, "source": "forecast"},
+    ])
+    upsert_consumption(db, [{"region": "UKC", "year": 2030, "consumption": 3.0, "source": "historical"}])
+    db.commit()
+
+    rows = {(row.region, row.year): (row.consumption, row.source) for row in db.query(RegionEnergyConsumption)}
+    assert rows == {("UKC", 2030): (3.0, "historical"), ("UKD", 2030): (2.0, "forecast")}
+
+
+def test_upsert_backfills_year_range(db):
+    grid = {"UKC": {year: {"value": float(year), "source": "forecast"} for year in range(2024, 2051)}}
+    grid["UKD"] = {2024: None}
+
+    assert upsert_consumption(db, consumption_rows(grid)) == 27
+    assert upsert_consumption(db, []) == 0
+    db.commit()
+
+    assert db.query(RegionEnergyConsumption).count() == 27
+
+
+def test_cached_rows_must_match_model_and_data(db):
+    grid = {"UKC": {2030: {"value": 1.0, "source": "forecast"}}, "UKD": {2030: {"value": 2.0, "source": "forecast"}}}
+    upsert_consumption(db, consumption_rows(grid, "holt-v1", "data-v1"))
+    upsert_consumption(db, consumption_rows({"UKD": grid["UKD"]}, "holt-v1", "data-v0"))
+    db.commit()
+
+    assert cached_consumption(db, [2030], "holt-v1", "data-v1") == {("UKC", 2030): {"value": 1.0, "source": "forecast"}}
+    assert cached_consumption(db, [2030], "prophet-v1", "data-v1") == {}
+
+
+def test_postgres_statement_uses_on_conflict():
+    sql = str(upsert_statement("postgresql").compile(dialect=postgresql.dialect()))
+
+    assert "ON CONFLICT (region, year, model_version) DO UPDATE SET consumption = excluded.consumption" in sql
@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from app.crud.forecast import upsert_consumption
+from app.database import Base, add_missing_columns, add_missing_constraints, insert_ignoring_conflicts
+from app.models.forecast import RegionEnergyConsumption
+from app.models.mine_site import FloodEvent
+
+
+def test_missing_columns_added_to_existing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE region_energy_consumption (id INTEGER PRIMARY KEY, region VARCHAR(10) NOT NULL, "
+            "year INTEGER NOT NULL, consumption FLOAT NOT NULL, source VARCHAR(20) NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO region_energy_consumption (region, year, consumption, source) VALUES ('UKC', 2030, 1.0, 'forecast')"))
+
+    add_missing_columns(engine, Base.metadata)
+    add_missing_columns(engine, Base.metadata)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("region_energy_consumption")}
+    assert {"model_version", "data_fingerprint"} <= columns
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT model_version FROM region_energy_consumption")).scalar() is None
+    assert RegionEnergyConsumption.__table__.c.model_version.nullable
+
+
+def test_region_key_migrated_to_include_model(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE region_energy_consumption (id INTEGER PRIMARY KEY, region VARCHAR(10) NOT NULL, "
+            "year INTEGER NOT NULL, consumption FLOAT NOT NULL, source VARCHAR(20) NOT NULL, model_version VARCHAR(40), "
+            "data_fingerprint VARCHAR(64), CONSTRAINT u_region_year UNIQUE (region, year))"
+        ))
+        conn.execute(text("INSERT INTO region_energy_consumption (region, year, consumption, source, model_version) VALUES ('UKC', 2030, 1.0, 'forecast', 'holt-v1')"))
+
+    add_missing_constraints(engine, Base.metadata)
+    add_missing_constraints(engine, Base.metadata)
+
+    assert [constraint["name"] for constraint in inspect(engine).get_unique_constraints("region_energy_consumption")] == ["u_region_year_model"]
+    session = sessionmaker(bind=engine)()
+    upsert_consumption(session, [{"region": "UKC", "year": 2030, "consumption": 2.0, "source": "forecast", "model_version": "linear-v1", "data_fingerprint": "d"}])
+    upsert_consumption(session, [{"region": "UKC", "year": 2030, "consumption": 3.0, "source": "forecast", "model_version": "linear-v1", "data_fingerprint": "d"}])
+    session.commit()
+    rows = session.execute(text("SELECT model_version, consumption FROM region_energy_consumption ORDER BY model_version")).all()
+    assert rows == [("holt-v1", 1.0), ("linear-v1", 3.0)]
+
+
+def test_history_keys_added_after_removing_duplicates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE flood_events (id INTEGER PRIMARY KEY, year INTEGER NOT NULL, events INTEGER NOT NULL, mine_reference VARCHAR NOT NULL)"))
+        conn.execute(text("INSERT INTO flood_events (year, events, mine_reference) VALUES (2010, 1, '1'), (2010, 1, '1'), (2011, 2, '1')"))
+
+    assert add_missing_constraints(engine, Base.metadata) == {"flood_events": 1}
+    assert add_missing_constraints(engine, Base.metadata) == {}
+
+    with engine.begin() as conn:
+        conn.execute(insert_ignoring_conflicts("sqlite", FloodEvent.__table__), [{"year": 2010, "events": 1, "mine_reference": "1"}])
+        assert conn.execute(text("SELECT id, year FROM flood_events ORDER BY id")).all() == [(1, 2010), (3, 2011)]
+    assert "u_flood_mine_year" in {index["name"] for index in inspect(engine).get_indexes("flood_events") if index["unique"]}
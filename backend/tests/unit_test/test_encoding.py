@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import encoding
+from app.ingest import energy_sites
+from app.main import app
+from app.routes import energy_site
+from app.spatial import SpatialLayer
+
+client = TestClient(app)
+
+SITES = [
+    {"name": "Solar Farm", "lat": 51.5, "lon": -0.13},
+    {"name": "Wind Farm", "lat": 56.1, "lon": -3.2},
+    {"name": "Solar Farm", "lat": None, "lon": None},
+]
+
+
+@pytest.fixture
+def solar_layer(override_db, monkeypatch):
+    layer = SpatialLayer(SITES, [s["lat"] for s in SITES], [s["lon"] for s in SITES], energy_sites.version)
+    monkeypatch.setattr(energy_sites, "_loaded", True)
+    monkeypatch.setattr(energy_site, "_layers", {"solar": layer})
+    override_db(None)
+    return layer
+
+
+def test_negotiate_prefers_highest_quality():
+    assert encoding.negotiate(None) == encoding.JSON
+    assert encoding.negotiate("*/*") == encoding.JSON
+    assert encoding.negotiate(f"{encoding.COLUMNAR}") == encoding.COLUMNAR
+    assert encoding.negotiate(f"application/json;q=0.9, {encoding.COLUMNAR}") == encoding.COLUMNAR
+    assert encoding.negotiate(f"{encoding.COLUMNAR};q=0.5, application/json") == encoding.JSON
+    assert encoding.negotiate(f"{encoding.COLUMNAR};q=0") == encoding.JSON
+
+
+def test_columnar_round_trip():
+    payload = encoding.encode_columnar(SITES, {"name": "str", "lat": "f32", "lon": "f32"})
+    decoded = encoding.decode_columnar(payload)
+
+    assert decoded["name"] == ["Solar Farm", "Wind Farm", "Solar Farm"]
+    assert decoded["lat"][:2] == pytest.approx([51.5, 56.1], abs=1e-5)
+    assert decoded["lon"][2] is None
+    # Repeated names are stored once in the string table.
+    assert payload.count(b"Solar Farm") == 1
+
+
+def test_json_matches_default_serialization():
+    assert json.loads(encoding.encode_json(SITES)) == SITES
+
+
+def test_sites_content_negotiation(solar_layer):
+    as_json = client.get("/sites/solar")
+    columnar = client.get("/sites/solar", headers={"Accept": encoding.COLUMNAR})
+    in_view = client.get("/sites/solar", params={"bbox": "-1,51,1,52"}, headers={"Accept": encoding.COLUMNAR})
+
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_json.json() == SITES
+    assert columnar.headers["content-type"] == encoding.COLUMNAR
+    assert columnar.headers["vary"] == "Accept"
+    assert encoding.decode_columnar(columnar.content)["name"] == ["Solar Farm", "Wind Farm", "Solar Farm"]
+    assert encoding.decode_columnar(in_view.content)["name"] == ["Solar Farm"]
+
+
+def test_full_payload_is_serialized_once(solar_layer, monkeypatch):
+    calls = []
+    encode = encoding.encode
+    monkeypatch.setattr(encoding, "encode", lambda *args: calls.append(args[2]) or encode(*args))
+
+    first = client.get("/sites/solar").content
+    second = client.get("/sites/solar").content
+
+    assert first == second
+    assert calls == [encoding.JSON]
+
+
+@pytest.mark.skipif(encoding.msgpack is None, reason="msgpack not installed")
+def test_msgpack_columns():
+    payload = encoding.encode_msgpack(SITES, {"name": "str", "lat": "f32"})
+    decoded = encoding.msgpack.unpackb(payload)
+
+    assert decoded["count"] == 3
+    assert decoded["columns"]["name"]["table"] == ["Solar Farm", "Wind Farm"]
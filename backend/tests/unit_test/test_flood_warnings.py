@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.geo import bng_to_wgs84
+from app.ingest import flood_warnings, mine_sites
+from app.models.mine_site import FloodWarning, Mine, MineFloodWarning
+from app.routes import mine_site
+
+
+def item(area_id, county="North Yorkshire", level=3, changed="2024-01-01T10:00:00", **extra):
+    return {
+        "floodAreaID": area_id,
+        "severity": {1: "Severe Flood Warning", 2: "Flood Warning", 3: "Flood Alert"}[level],
+        "severityLevel": level,
+        "description": f"Area {area_id}",
+        "message": "River levels are rising.",
+        "eaAreaName": "Yorkshire",
+        "isTidal": False,
+        "timeRaised": "2024-01-01T09:00:00",
+        "timeSeverityChanged": changed,
+        "timeMessageChanged": changed,
+        "floodArea": {"county": county, "notation": area_id, "riverOrSea": "River Ouse", **extra},
+    }
+
+
+@pytest.fixture
+def db(memory_db, monkeypatch, write_areas):
+    session = memory_db()
+    monkeypatch.setattr(flood_warnings, "_validators", {})
+    monkeypatch.setattr(flood_warnings, "_matched_version", None)
+    monkeypatch.setattr(flood_warnings, "AREAS_SOURCE", str(write_areas({})))
+    session.add_all([
+        Mine(reference="1", name="York", status="C", easting=460000, northing=452000, local_authority="North Yorkshire"),
+        Mine(reference="2", name="Selby", status="C", easting=462000, northing=432000, local_authority="North  yorkshire"),
+        Mine(reference="3", name="Barnsley", status="C", easting=434000, northing=406000, local_authority="Barnsley"),
+    ])
+    session.commit()
+    return session
+
+
+@pytest.fixture
+def write_areas(tmp_path):
+    def write(centres):
+        path = tmp_path / "areas.json"
+        path.write_text(json.dumps({"items": [{"notation": area_id, "lat": lat, "long": lon} for area_id, (lat, lon) in centres.items()]}))
+        return path
+    return write
+
+
+def centre_of(easting, northing):
+    lats, lons = bng_to_wgs84([easting], [northing])
+    return float(lats[0]), float(lons[0])
+
+
+@pytest.fixture
+def write_feed(tmp_path):
+    path = tmp_path / "floods.json"
+    stamp = [1_000_000_000]
+
+    def write(items):
+        path.write_text(json.dumps({"items": items}), encoding="utf-8")
+        # A fresh modification time per write, however quickly the test runs.
+        stamp[0] += 1
+        os.utime(path, ns=(stamp[0], stamp[0]))
+        return str(path)
+    return write
+
+
+def matches(db):
+    return sorted((row.flood_area_id, row.mine_reference) for row in db.query(MineFloodWarning))
+
+
+def test_parse_bundled_feed():
+    with open(flood_warnings.FEED_SOURCE, encoding="utf-8") as f:
+        rows = flood_warnings.parse_warnings(json.load(f))
+
+    assert rows
+    assert all(row["flood_area_id"] and row["severity_level"] in (1, 2, 3, 4) for row in rows)
+
+
+def test_poll_matches_counties_to_local_authorities(db, write_feed):
+    source = write_feed([item("A1", county="Barnsley, North Yorkshire"), item("A2", county="Cumbria")])
+
+    assert flood_warnings.poll(db, source) == {"changed": 2, "removed": 0, "matched": 3}
+    assert matches(db) == [("A1", "1"), ("A1", "2"), ("A1", "3")]
+    assert db.get(FloodWarning, "A2").severity == "Flood Alert"
+
+
+def test_poll_skips_unchanged_source_and_items(db, write_feed):
+    source = write_feed([item("A1"), item("A2", county="Barnsley")])
+    flood_warnings.poll(db, source)
+    version = flood_warnings.version
+
+    assert flood_warnings.poll(db, source) == {"changed": 0, "removed": 0, "matched": 0}
+    assert flood_warnings.version == version
+
+    # Same items rewritten: the file is read again but nothing is stored or matched.
+    write_feed([item("A1"), item("A2", county="Barnsley")])
+    assert flood_warnings.poll(db, source) == {"changed": 0, "removed": 0, "matched": 0}
+
+    write_feed([item("A1", level=1, changed="2024-01-02T08:00:00"), item("A2", county="Barnsley")])
+    assert flood_warnings.poll(db, source) == {"changed": 1, "removed": 0, "matched": 2}
+    assert flood_warnings.version == version + 1
+    assert db.get(FloodWarning, "A1").severity_level == 1
+
+
+def test_poll_removes_warnings_that_leave_the_feed(db, write_feed):
+    flood_warnings.poll(db, write_feed([item("A1"), item("A2", county="Barnsley")]))
+
+    assert flood_warnings.poll(db, write_feed([item("A2", county="Barnsley")])) == {"changed": 0, "removed": 1, "matched": 0}
+    assert db.get(FloodWarning, "A1") is None
+    assert matches(db) == [("A2", "3")]
+
+
+def test_poll_matches_area_centre_within_radius(db, write_feed, monkeypatch):
+    monkeypatch.setattr(flood_warnings, "MATCH_RADIUS_M", 5000)
+    lats, lons = bng_to_wgs84([461000], [455000])
+
+    flood_warnings.poll(db, write_feed([item("A1", county="Nowhere", lat=float(lats[0]), long=float(lons[0]))]))
+
+    assert matches(db) == [("A1", "1")]
+
+
+def test_new_mines_are_matched_on_next_poll(db, write_feed, monkeypatch):
+    source = write_feed([item("A1", county="Barnsley")])
+    flood_warnings.poll(db, source)
+    db.add(Mine(reference="4", name="Wombwell", status="C", easting=440000, northing=403000, local_authority="Barnsley"))
+    db.commit()
+    monkeypatch.setattr(mine_sites, "version", mine_sites.version + 1)
+
+    flood_warnings.poll(db, source)
+
+    assert matches(db) == [("A1", "3"), ("A1", "4")]
+
+
+def test_orm_to_dict_reports_most_severe_warning(db, write_feed):
+    flood_warnings.poll(db, write_feed([item("A1"), item("A2", level=2, county="Barnsley, North Yorkshire")]))
+    db.expire_all()
+
+    mines = {mine["reference"]: mine for mine in map(mine_site.orm_to_dict, mine_site.mines_with_history(db))}
+
+    assert (mines["1"]["floodWarningLevel"], mines["1"]["floodWarning"]) == (2, "Flood Warning")
+    assert mines["3"]["floodWarningLevel"] == 2
+    db.query(MineFloodWarning).delete()
+    db.commit()
+    db.expire_all()
+    assert mine_site.orm_to_dict(db.get(Mine, "1"))["floodWarningLevel"] is None
+
+
+def test_poll_locates_areas_and_matches_by_radius(db, write_feed, write_areas, monkeypatch):
+    monkeypatch.setattr(flood_warnings, "MATCH_RADIUS_M", 5000)
+    areas = str(write_areas({"A1": centre_of(461000, 455000)}))
+
+    flood_warnings.poll(db, write_feed([item("A1"), item("A2", county="Barnsley")]), areas=areas)
+
+    # A1 is located, so only the York mine near its centre matches, not every North Yorkshire mine;
+    # A2 isn't in the areas source and falls back to its county.
+    assert matches(db) == [("A1", "1"), ("A2", "3")]
+    assert db.get(FloodWarning, "A1").latitude == pytest.approx(centre_of(461000, 455000)[0])
+
+
+def test_stored_area_centre_is_not_looked_up_again(db, write_feed, write_areas, monkeypatch):
+    source = write_feed([item("A1")])
+    flood_warnings.poll(db, source, areas=str(write_areas({"A1": centre_of(461000, 455000)})))
+    lookups = []
+    monkeypatch.setattr(flood_warnings, "area_centres", lambda area_ids, source: lookups.append(area_ids) or {})
+
+    write_feed([item("A1", level=2, changed="2024-01-02T08:00:00")])
+    flood_warnings.poll(db, source)
+
+    assert lookups == [[]]
+    assert matches(db) == [("A1", "1")]
+
+
+def test_area_centres_from_area_resources_over_http():
+    centre = centre_of(461000, 455000)
+
+    class Areas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/floodAreas/A1":
+                self.send_error(404)
+                return
+            body = json.dumps({"items": {"notation": "A1", "lat": centre[0], "long": centre[1]}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Areas)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        found = flood_warnings.area_centres(["A1", "A2"], f"http://127.0.0.1:{server.server_port}/floodAreas")
+    finally:
+        server.shutdown()
+
+    assert found == {"A1": centre}
+
+
+def test_bundled_feed_matches_mines_by_location(memory_db, monkeypatch):
+    session = memory_db()
+    monkeypatch.setattr(flood_warnings, "_validators", {})
+    mine_sites.ingest(session)
+
+    flood_warnings.poll(session, flood_warnings.FEED_SOURCE, areas=flood_warnings.AREAS_SOURCE)
+
+    located = session.query(FloodWarning).filter(FloodWarning.latitude.isnot(None)).count()
+    assert located == session.query(FloodWarning).count() == 5
+    # The Lincoln warning reaches the Whisby pits in North Kesteven, which a county comparison never could.
+    assert {"106590", "227802"} <= {reference for area_id, reference in matches(session) if area_id == "053FWFPUWI06"}
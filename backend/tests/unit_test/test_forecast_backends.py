@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from app.forecast_backends import BACKENDS, holt_forecast, linear_forecast, theil_sen_forecast
+
+years = np.arange(2005, 2024, dtype=float)
+target_years = np.array([2025.0, 2030.0])
+
+
+def linear_matrix():
+    # Three regions with different intercepts and slopes, fitted together.
+    slopes = np.array([10.0, -5.0, 0.0])
+    return 1000.0 + slopes[:, None] * (years - 2005)[None, :], slopes
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_backends_recover_linear_trend(backend):
+    values, slopes = linear_matrix()
+    predicted = BACKENDS[backend](years, values, target_years)
+
+    expected = 1000.0 + slopes[:, None] * (target_years - 2005)[None, :]
+    assert predicted.shape == (3, 2)
+    np.testing.assert_allclose(predicted, expected, rtol=1e-9)
+
+
+def test_linear_ignores_missing_years():
+    values, slopes = linear_matrix()
+    values[0, 3] = np.nan
+
+    predicted = linear_forecast(years, values, target_years)
+
+    np.testing.assert_allclose(predicted[0], 1000.0 + slopes[0] * (target_years - 2005))
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_backends_start_from_first_observed_year(backend):
+    values, slopes = linear_matrix()
+    values[0, 0] = np.nan
+    values[1, :4] = np.nan
+
+    predicted = BACKENDS[backend](years, values, target_years)
+
+    np.testing.assert_allclose(predicted, 1000.0 + slopes[:, None] * (target_years - 2005)[None, :], rtol=1e-9)
+
+
+def test_holt_handles_short_and_empty_rows():
+    values = np.array([[100.0], [np.nan]])
+
+    predicted = holt_forecast(np.array([2023.0]), values, target_years)
+
+    np.testing.assert_allclose(predicted[0], [100.0, 100.0])
+    assert np.isnan(predicted[1]).all()
+
+
+def test_theil_sen_robust_to_outlier():
+    values, slopes = linear_matrix()
+    values[:, 10] += 5000.0
+
+    robust = theil_sen_forecast(years, values, target_years)
+    least_squares = linear_forecast(years, values, target_years)
+    expected = 1000.0 + slopes[:, None] * (target_years - 2005)[None, :]
+
+    assert np.abs(robust - expected).max() < 1e-6
+    assert np.abs(least_squares - expected).max() > 100
+
+
+def test_holt_follows_recent_level_shift():
+    values = np.full((1, len(years)), 100.0)
+    values[0, -5:] = 200.0
+
+    predicted = holt_forecast(years, values, target_years)
+
+    assert predicted[0, 0] > 190.0
@@ -0,0 +1,41 @@
+import json
+import numpy as np
+from app import forecast_benchmark
+from app.forecast_benchmark import backtest, compare, cutoffs
+
+
+def test_rolling_origin_cutoffs_end_at_last_full_horizon():
+    years = np.arange(2005, 2024)
+
+    assert cutoffs(years, folds=3, horizon=3) == [2018, 2019, 2020]
+    assert cutoffs(years, folds=1, horizon=1) == [2022]
+
+
+def test_backtest_reports_accuracy_timing_and_memory():
+    report = backtest(["linear", "holt"], folds=2, horizon=2)
+
+    assert report["measure"] == "consumption_all_meters"
+    assert report["cutoffs"] == [2020, 2021]
+    for result in report["backends"].values():
+        assert {"mae", "mape", "rmse", "fit_ms", "predict_ms", "peak_kib"} <= set(result)
+        assert len(result["regions"]) == 11
+    json.dumps(report)
+
+
+def test_batched_backends_match_stored_baseline_accuracy():
+    with open(forecast_benchmark.BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    report = backtest(["linear", "holt", "theil-sen"])
+
+    assert not [regression for regression in compare(report, baseline) if "MAPE" in regression]
+
+
+def test_compare_flags_accuracy_and_speed_regressions():
+    baseline = {"backends": {"holt": {"mape": 2.0, "fit_ms": 10.0, "predict_ms": None}, "linear": {"mape": 2.0, "fit_ms": 0.5}}}
+    report = {"backends": {
+        "holt": {"mape": 3.0, "fit_ms": 25.0, "predict_ms": None},
+        "linear": {"mape": 2.2, "fit_ms": 1.5},
+        "theil-sen": {"mape": 9.0, "fit_ms": 1.0},
+    }}
+
+    assert compare(report, baseline) == ["holt: MAPE 3.0% vs baseline 2.0%", "holt: fit_ms 25.0 vs baseline 10.0"]
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pytest
+from app import forecast_cache, forecast_engine
+from app.forecast_cache import cache_key, clear, evict, load_model, save_model
+
+params = {"yearly_seasonality": False}
+
+
+def series(offset=0.0):
+    years = np.arange(2005, 2024)
+    return years, 1000.0 + 10 * (years - 2005) + offset
+
+
+def test_key_depends_on_series_and_params():
+    years, values = series()
+    assert cache_key(years, values, params) == cache_key(years[::-1], values[::-1], params)
+    assert cache_key(years, values, params) != cache_key(*series(offset=1.0), params)
+    assert cache_key(years, values, params) != cache_key(years, values, {"yearly_seasonality": True})
+
+
+def test_fit_region_reuses_cached_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast_cache, "CACHE_DIR", str(tmp_path))
+
+    first = forecast_engine.fit_region(series(), 2030)
+    assert len(os.listdir(tmp_path)) == 1
+
+    def fail_fit(self, df):
+        raise AssertionError("model should come from the cache")
+
+    from prophet import Prophet
+
+    monkeypatch.setattr(Prophet, "fit", fail_fit)
+    second = forecast_engine.fit_region(series(), 2030)
+
+    assert second == pytest.approx(first)
+
+
+def test_missing_or_corrupt_entry_is_a_miss(tmp_path):
+    assert load_model("absent", str(tmp_path)) is None
+    (tmp_path / "broken.json").write_text("{not json")
+    assert load_model("broken", str(tmp_path)) is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    for i, name in enumerate(["old", "mid", "new"]):
+        path = tmp_path / f"{name}.json"
+        path.write_text("x" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+
+    removed = evict(str(tmp_path), max_bytes=250)
+
+    assert removed == 1
+    assert sorted(os.listdir(tmp_path)) == ["mid.json", "new.json"]
+    assert clear(str(tmp_path)) == 2
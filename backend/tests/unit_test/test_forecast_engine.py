@@ -0,0 +1,311 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pytest
+from app import forecast_engine
+from app.forecast_engine import ForecastEngine, fit_regions, target_regions
+from app.ingest import consumption
+
+
+def stub_fit(series, horizon):
+    years, values = series
+    if values[0] < 0:
+        # A series of -(test process pid) stalls; the worker leaves its own pid where the test can check it was killed.
+        with open(pid_file(int(-values[0])), "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(30)
+    return {horizon: float(values.sum())}
+
+
+def pid_file(test_pid):
+    return os.path.join(tempfile.gettempdir(), f"stalled-fit-{test_pid}")
+
+
+def exits(pid, within=5.0):
+    # Workers are the forkserver's children, so they are reaped by it rather than joined here.
+    deadline = time.monotonic() + within
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def forecast(engine, year, backend="prophet", regions=None):
+    # One year through forecast_years, the path the routes and jobs use.
+    return {region: by_year[year] for region, by_year in engine.forecast_years([year], backend, regions).items()}
+
+
+@pytest.fixture(autouse=True)
+def consumption_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(consumption, "CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def data_copy(tmp_path):
+    directory = tmp_path / "data"
+    shutil.copytree(consumption.data_dir, directory)
+    return directory
+
+
+@pytest.fixture
+def fake_fit(monkeypatch):
+    calls = []
+
+    def fit_region(series, horizon):
+        calls.append(horizon)
+        last_year = int(series[0][-1])
+        return {year: 1000.0 + year for year in range(last_year + 1, horizon + 1)}
+
+    monkeypatch.setattr(forecast_engine, "fit_region", fit_region)
+    return calls
+
+
+def test_historical_year_served_from_data(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    result = forecast(engine, 2010)
+
+    assert set(result) == set(target_regions)
+    assert all(item["source"] == "historical" for item in result.values())
+
+
+def test_models_fitted_once_per_dataset_version(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    forecast(engine, 2025)
+    forecast(engine, 2030)
+    result = forecast(engine, 2027)
+
+    assert len(fake_fit) == len(target_regions)
+    assert result["UKC"] == {"value": 3027.0, "source": "forecast"}
+
+
+def test_refit_when_data_changes(fake_fit, data_copy):
+    engine = ForecastEngine(directory=str(data_copy), horizon=2030, workers=1)
+    forecast(engine, 2025)
+
+    path = data_copy / "Subnational_electricity_consumption_statistics_2023.csv"
+    path.write_text(path.read_text().replace("9905.53", "9999.99"))
+    forecast(engine, 2025)
+
+    assert len(fake_fit) == 2 * len(target_regions)
+
+
+def test_touched_but_unchanged_data_keeps_models(fake_fit, data_copy):
+    engine = ForecastEngine(directory=str(data_copy), horizon=2030, workers=1)
+    forecast(engine, 2025)
+
+    path = data_copy / "Subnational_electricity_consumption_statistics_2023.csv"
+    os.utime(path, (1, 1))
+    forecast(engine, 2025)
+
+    assert len(fake_fit) == len(target_regions)
+
+
+def test_year_past_horizon_is_fitted_for_that_call_only(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    forecast(engine, 2030)
+    result = forecast(engine, 2040)
+
+    assert engine.horizon == 2030
+    assert result["UKM"]["source"] == "forecast"
+    assert fake_fit == [2030] * len(target_regions) + [2040] * len(target_regions)
+    # The shared predictions up to the horizon are kept.
+    assert forecast(engine, 2030)["UKM"]["source"] == "forecast"
+    assert len(fake_fit) == 2 * len(target_regions)
+
+
+def test_year_past_maximum_is_rejected(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+
+    with pytest.raises(ValueError):
+        forecast(engine, forecast_engine.MAX_FORECAST_YEAR + 1)
+    assert fake_fit == []
+
+
+def test_year_before_data_has_no_value(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    result = forecast(engine, 2000)
+
+    assert all(item is None for item in result.values())
+
+
+def test_fit_regions_in_process_pool(monkeypatch):
+    monkeypatch.setattr(forecast_engine, "fit_region", stub_fit)
+    series = {region: (np.array([2022, 2023]), np.array([1.0, 2.0])) for region in target_regions}
+
+    results = fit_regions(series, 2030, workers=4, timeout=30)
+
+    assert results == {region: {2030: 3.0} for region in target_regions}
+
+
+def test_slow_region_times_out_without_stalling_others(monkeypatch):
+    monkeypatch.setattr(forecast_engine, "fit_region", stub_fit)
+    series = {
+        "SLOW": (np.array([2023]), np.array([-float(os.getpid())])),
+        "UKC": (np.array([2023]), np.array([1.0])),
+        "UKD": (np.array([2023]), np.array([1.0])),
+    }
+
+    started = time.monotonic()
+    # Long enough for fresh workers to start up, well short of the stalled fit's sleep.
+    results = fit_regions(series, 2030, workers=3, timeout=3)
+
+    assert time.monotonic() - started < 10
+    assert results["SLOW"] is None
+    assert results["UKC"] == {2030: 1.0}
+    # The stuck worker was terminated and the pool is rebuilt for the next fit.
+    with open(pid_file(os.getpid())) as f:
+        assert exits(int(f.read()))
+    assert forecast_engine._pool is None
+    assert fit_regions({"UKC": series["UKC"], "UKD": series["UKD"]}, 2030, workers=3, timeout=30) == {"UKC": {2030: 1.0}, "UKD": {2030: 1.0}}
+
+
+def test_timeout_keeps_pool_until_other_calls_finish(monkeypatch):
+    monkeypatch.setattr(forecast_engine, "fit_region", stub_fit)
+    if os.path.exists(pid_file(os.getpid())):
+        os.remove(pid_file(os.getpid()))
+    other = forecast_engine.acquire_pool(2)
+    series = {"SLOW": (np.array([2023]), np.array([-float(os.getpid())])), "UKC": (np.array([2023]), np.array([1.0]))}
+
+    assert fit_regions(series, 2030, workers=2, timeout=3) == {"SLOW": None, "UKC": {2030: 1.0}}
+
+    # New calls get a fresh pool, but the call still holding the old one can finish its fits.
+    assert forecast_engine._pool is None
+    assert other.submit(stub_fit, series["UKC"], 2030).result(timeout=10) == {2030: 1.0}
+    forecast_engine.release_pool(other)
+    with open(pid_file(os.getpid())) as f:
+        assert exits(int(f.read()))
+
+
+def test_timed_out_region_backs_off_before_retry(fake_fit, monkeypatch):
+    fitted = []
+
+    def timing_out(region_series, horizon, workers, timeout, on_result=None, timed_out=None):
+        fitted.append(sorted(region_series))
+        timed_out.add("UKC")
+        return {region: None if region == "UKC" else {2030: 1.0} for region in region_series}
+
+    monkeypatch.setattr(forecast_engine, "fit_regions", timing_out)
+    engine = ForecastEngine(horizon=2030, workers=4)
+
+    assert forecast(engine, 2030, regions=["UKC", "UKD"])["UKC"] is None
+    assert forecast(engine, 2030, regions=["UKC", "UKD"])["UKC"] is None
+    assert fitted == [["UKC", "UKD"]]
+
+    monkeypatch.setattr(forecast_engine, "FIT_RETRY_BACKOFF", 0)
+    engine._retry_after["UKC"] = 0.0
+    forecast(engine, 2030, regions=["UKC", "UKD"])
+    assert fitted == [["UKC", "UKD"], ["UKC"]]
+
+
+def test_failed_regions_are_retried(monkeypatch):
+    attempts = []
+
+    def flaky_fit(series, horizon):
+        attempts.append(horizon)
+        if len(attempts) == 1:
+            raise RuntimeError("stan failed")
+        return {2030: 1.0}
+
+    monkeypatch.setattr(forecast_engine, "fit_region", flaky_fit)
+    engine = ForecastEngine(horizon=2030, workers=1)
+
+    assert forecast(engine, 2030)["UKC"] is None
+    assert forecast(engine, 2030)["UKC"] == {"value": 1.0, "source": "forecast"}
+    assert len(attempts) == len(target_regions) + 1
+
+
+@pytest.mark.parametrize("backend", ["linear", "holt", "theil-sen"])
+def test_batched_backends_skip_prophet(fake_fit, backend):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    result = forecast(engine, 2030, backend)
+
+    assert fake_fit == []
+    assert all(item["source"] == "forecast" for item in result.values())
+
+
+def test_backend_comparison_reports_accuracy_and_latency(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    report = engine.compare_backends()
+
+    assert [row["backend"] for row in report] == ["prophet", "linear", "holt", "theil-sen"]
+    assert all({"mae", "mape", "rmse", "fit_ms"} <= set(row) for row in report)
+
+
+def test_forecast_years_fits_once_for_whole_grid(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    grid = engine.forecast_years([2020, 2035, 2045])
+
+    assert fake_fit == [2045] * len(target_regions)
+    assert grid["UKC"][2020]["source"] == "historical"
+    assert grid["UKC"][2045] == {"value": 3045.0, "source": "forecast"}
+
+
+def test_historical_years_need_no_fit(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    seen = []
+
+    grid = engine.forecast_years([2010, 2015], on_region=lambda region, by_year: seen.append(region))
+
+    assert fake_fit == []
+    assert all(item["source"] == "historical" for by_year in grid.values() for item in by_year.values())
+    assert sorted(seen) == sorted(target_regions)
+
+
+def test_concurrent_first_use_loads_data_once(fake_fit, monkeypatch):
+    loads = []
+    load_table = forecast_engine.load_table
+
+    def counting_load(directory):
+        loads.append(directory)
+        time.sleep(0.05)
+        return load_table(directory)
+
+    monkeypatch.setattr(forecast_engine, "load_table", counting_load)
+    engine = ForecastEngine(horizon=2030, workers=1)
+    threads = [threading.Thread(target=forecast, args=(engine, 2030)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert len(fake_fit) == len(target_regions)
+
+
+def test_importing_forecast_routes_skips_heavy_imports():
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = "import sys, app.routes.forecast; print(sorted({'pandas', 'prophet'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip() == "[]"
+
+
+def test_forecast_for_subset_of_regions_fits_only_those(fake_fit):
+    engine = ForecastEngine(horizon=2030, workers=1)
+    result = forecast(engine, 2030, regions=["UKC", "UKD"])
+
+    assert set(result) == {"UKC", "UKD"}
+    assert len(fake_fit) == 2
+
+    forecast(engine, 2030)
+    assert len(fake_fit) == len(target_regions)
+
+
+def test_cache_tag_changes_with_backend_and_data(fake_fit, data_copy):
+    engine = ForecastEngine(directory=str(data_copy), horizon=2030, workers=1)
+    prophet_tag, holt_tag = engine.cache_tag("prophet"), engine.cache_tag("holt")
+
+    path = data_copy / "Subnational_electricity_consumption_statistics_2023.csv"
+    path.write_text(path.read_text().replace("9905.53", "9999.99"))
+
+    assert prophet_tag[0] != holt_tag[0]
+    assert prophet_tag[1] == holt_tag[1]
+    assert engine.cache_tag("holt")[1] != holt_tag[1]
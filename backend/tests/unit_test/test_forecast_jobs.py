@@ -0,0 +1,131 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app import forecast_jobs
+from app.forecast_jobs import ForecastJobManager, JobQueueFull
+from app.models.forecast import RegionEnergyConsumption
+from app.routes import forecast as forecast_routes
+
+client = TestClient(app)
+
+
+class BlockingEngine:
+    def __init__(self):
+        self.release = threading.Event()
+        self.first_region_done = threading.Event()
+        self.calls = []
+
+    def cache_tag(self, backend="prophet"):
+        return f"{backend}-v1", "data-v1"
+
+    def forecast_years(self, years, backend="prophet", regions=None, on_region=None):
+        year = years[0]
+        self.calls.append((year, backend))
+        if year < 0:
+            raise RuntimeError("bad year")
+        on_region("UKC", {year: {"value": 1.0, "source": "forecast"}})
+        self.first_region_done.set()
+        self.release.wait(5)
+        return {"UKC": {year: {"value": 1.0, "source": "forecast"}}, "UKD": {year: {"value": 2.0, "source": "forecast"}}}
+
+
+def wait_until_finished(manager, job_id):
+    for _ in range(200):
+        job = manager.get(job_id)
+        if job.finished:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(forecast_jobs, "target_regions", ["UKC", "UKD"])
+    engine = BlockingEngine()
+    yield engine
+    engine.release.set()
+
+
+@pytest.fixture
+def sessions(memory_db):
+    # Jobs open their own sessions, all on the one in-memory database.
+    return sessionmaker(bind=memory_db(RegionEnergyConsumption.__table__).get_bind())
+
+
+def test_job_reports_partial_then_final_results(engine, sessions):
+    manager = ForecastJobManager(engine, session_factory=sessions, workers=1)
+    job = manager.submit(2030)
+
+    assert engine.first_region_done.wait(5)
+    running = manager.get(job.id).to_dict()
+    assert running["status"] == "running"
+    assert running["results"] == {"UKC": {"value": 1.0, "source": "forecast"}}
+    assert running["timing"]["running_ms"] is not None
+
+    engine.release.set()
+    done = wait_until_finished(manager, job.id).to_dict()
+    assert done["status"] == "done"
+    assert done["completed_regions"] == 2
+
+
+def test_jobs_for_same_year_are_deduplicated(engine, sessions):
+    manager = ForecastJobManager(engine, session_factory=sessions, workers=1)
+    first = manager.submit(2030)
+    second = manager.submit(2030)
+    other_backend = manager.submit(2030, "holt")
+
+    assert first is second
+    assert other_backend is not first
+
+    engine.release.set()
+    wait_until_finished(manager, first.id)
+    wait_until_finished(manager, other_backend.id)
+    assert engine.calls == [(2030, "prophet"), (2030, "holt")]
+
+
+def test_failed_job_records_error(engine, sessions):
+    manager = ForecastJobManager(engine, session_factory=sessions, workers=1)
+    job = wait_until_finished(manager, manager.submit(-1).id)
+
+    assert job.status == "failed"
+    assert job.error == "bad year"
+
+
+def test_pending_jobs_are_bounded(engine, sessions):
+    manager = ForecastJobManager(engine, session_factory=sessions, workers=1, max_pending=2)
+    manager.submit(2030)
+    manager.submit(2031)
+
+    with pytest.raises(JobQueueFull):
+        manager.submit(2032)
+
+
+def test_job_routes(engine, sessions, monkeypatch):
+    monkeypatch.setattr(forecast_routes, "jobs", ForecastJobManager(engine, session_factory=sessions, workers=1))
+    engine.release.set()
+
+    response = client.post("/forecast/jobs", json={"year": 2030})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    wait_until_finished(forecast_routes.jobs, job_id)
+    response = client.get(f"/forecast/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["results"]["UKD"] == {"value": 2.0, "source": "forecast"}
+
+    assert client.get("/forecast/jobs/unknown").status_code == 404
+
+
+def test_jobs_share_stored_forecasts(engine, sessions):
+    manager = ForecastJobManager(engine, session_factory=sessions, workers=1)
+    engine.release.set()
+    wait_until_finished(manager, manager.submit(2030).id)
+
+    second = wait_until_finished(manager, manager.submit(2030).id)
+
+    assert second.results == {"UKC": {"value": 1.0, "source": "forecast"}, "UKD": {"value": 2.0, "source": "forecast"}}
+    assert engine.calls == [(2030, "prophet")]
+    assert sessions().query(RegionEnergyConsumption).count() == 2
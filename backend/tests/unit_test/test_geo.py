@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from app.geo import bng_to_wgs84, transformer, wgs84_to_bng
+from app.models.mine_site import Mine
+from app.ingest import mine_sites
+
+
+def test_bng_to_wgs84_converts_arrays_in_one_call():
+    lats, lons = bng_to_wgs84([530000, 425000], [180000, 565000])
+
+    assert lats.shape == (2,)
+    assert lats[0] == pytest.approx(51.5, abs=0.01)
+    assert lons[0] == pytest.approx(-0.13, abs=0.01)
+    assert lats[1] == pytest.approx(54.98, abs=0.01)
+
+
+def test_round_trip_and_cached_transformer():
+    eastings, northings = np.array([530000.0, 425000.0]), np.array([180000.0, 565000.0])
+
+    assert np.allclose(wgs84_to_bng(*bng_to_wgs84(eastings, northings)), (eastings, northings), atol=0.01)
+    assert transformer("EPSG:27700", "EPSG:4326") is transformer("EPSG:27700", "EPSG:4326")
+
+
+@pytest.fixture
+def db(memory_db):
+    return memory_db(Mine.__table__, *[table for rel in Mine.__mapper__.relationships for table in (rel.mapper.local_table, rel.secondary) if table is not None])
+
+
+def test_loaded_mines_have_coordinates(db):
+    mine_sites.ingest(db)
+    mines = db.query(Mine).all()
+
+    assert mines and all(mine.latitude is not None and 49 < mine.latitude < 61 for mine in mines)
+    assert all(-9 < mine.longitude < 2 for mine in mines)
+
+
+def test_fill_mine_coordinates_backfills_missing(db):
+    db.add(Mine(reference="1", name="Old", status="C", easting=425000, northing=565000))
+    db.commit()
+
+    assert mine_sites.fill_coordinates(db) == 1
+    assert mine_sites.fill_coordinates(db) == 0
+    assert db.query(Mine).one().latitude == pytest.approx(54.98, abs=0.01)
+
@@ -0,0 +1,73 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from app.ingest import consumption
+from app.ingest.consumption import RegionIndex, load_table, normalize_header
+
+
+@pytest.fixture
+def data_copy(tmp_path):
+    directory = tmp_path / "data"
+    shutil.copytree(consumption.data_dir, directory)
+    return directory
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("Total consumption\n(GWh):\nAll meters", "consumption_all_meters"),
+    ("Total consumption\n(GWh):\nDomestic\n", "consumption_all_domestic"),
+    ("Total consumption\n(GWh):\nAll Domestic", "consumption_all_domestic"),
+    ("Number of meters\n(thousands):\nDomestic E7", "meters_domestic_e7"),
+    ("Median consumption\n(kWh per meter):\nAll Non-Domestic", "median_all_non_domestic"),
+    ("Mean domestic\nconsumption\n(kWh per household)", "mean_per_household"),
+    ("Local authority", None),
+])
+def test_normalize_header(header, expected):
+    assert normalize_header(header) == expected
+
+
+def test_all_years_normalized_into_typed_columns(data_copy, tmp_path):
+    table = load_table(str(data_copy), str(tmp_path / "cache"))
+
+    assert isinstance(table["year"], np.memmap)
+    assert table["year"].dtype == np.int16
+    assert table["consumption_all_meters"].dtype == np.float64
+
+    ukc = table["region"] == "UKC"
+    assert sorted(table["year"][ukc].tolist()) == list(consumption.all_years)
+    assert not np.isnan(table["consumption_all_domestic"][ukc]).any()
+    e7 = table["consumption_domestic_e7"][ukc & (table["year"] < 2012)]
+    assert np.isnan(e7).all()
+
+
+def test_rebuilds_only_when_content_changes(data_copy, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = load_table(str(data_copy), cache_dir)
+
+    path = data_copy / "Subnational_electricity_consumption_statistics_2010.csv"
+    os.utime(path, (1, 1))
+    touched = load_table(str(data_copy), cache_dir)
+    assert touched.fingerprint == first.fingerprint
+
+    path.write_text(path.read_text().replace("UKC,North East", "UKC,North-East"))
+    changed = load_table(str(data_copy), cache_dir)
+    assert changed.fingerprint != first.fingerprint
+    assert "North-East" in changed["name"].tolist()
+
+
+def test_region_index_lookups_and_views(data_copy, tmp_path):
+    table = load_table(str(data_copy), str(tmp_path / "cache"))
+    index = RegionIndex.from_table(table)
+
+    assert index.values.shape == (len(consumption.target_regions), len(consumption.all_years))
+    assert index.value("UKC", 2023) == pytest.approx(9905.530417994085)
+    assert index.value("UKC", 1999) is None
+    assert index.value("XXX", 2023) is None
+
+    years, values = index.series("UKM")
+    assert np.shares_memory(values, index.values)
+    assert years[-1] == 2023
+
+    years, values = index.series("UKM", until=2020)
+    assert years[-1] == 2020
+    assert len(values) == 16
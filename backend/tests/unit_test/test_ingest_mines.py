@@ -0,0 +1,139 @@
+import json
+
+import pytest
+from sqlalchemy import event
+from app.ingest import mine_sites
+from app.models.mine_site import EnergyDemand, FloodEvent, Mine, MineSummary
+
+
+def record(reference, floods=(), history=(), forecast=()):
+    return {
+        "Reference": reference, "Name": f"Mine {reference}", "Status": "C",
+        "Easting": 436879, "Northing": 365669, "LocalAuthority": "North East Derbyshire",
+        "FloodHistory": [{"year": year, "events": 1} for year in floods],
+        "EnergyDemandHistory": [{"year": year, "value": 100.0} for year in history],
+        "ForecastEnergyDemand": [{"year": year, "value": 110.0} for year in forecast],
+    }
+
+
+@pytest.fixture
+def db(memory_db):
+    session = memory_db(Mine.__table__, *[table for rel in Mine.__mapper__.relationships for table in (rel.mapper.local_table, rel.secondary) if table is not None])
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    session.statements = statements
+    return session
+
+
+@pytest.fixture
+def write_mines(tmp_path):
+    def write(records):
+        path = tmp_path / "mines.json"
+        path.write_text(json.dumps(records), encoding="utf-8")
+        return path
+    return write
+
+
+def test_ingest_is_idempotent(db, write_mines):
+    path = write_mines([record("1", floods=[2010, 2014], history=[2020, 2021], forecast=[2024]), record("2", history=[2020])])
+
+    first = mine_sites.ingest(db, path)
+    version = mine_sites.version
+    second = mine_sites.ingest(db, path)
+
+    assert first == {"mines": 2, "flood_events": 2, "energy_demand": 4}
+    assert second == {"mines": 0, "flood_events": 0, "energy_demand": 0}
+    assert mine_sites.version == version
+    assert db.query(EnergyDemand).count() == 4
+    assert db.query(Mine).filter_by(reference="1").one().latitude == pytest.approx(53.18, abs=0.01)
+
+
+def test_ingest_only_inserts_new_rows(db, write_mines):
+    mine_sites.ingest(db, write_mines([record("1", floods=[2010], history=[2020])]))
+
+    written = mine_sites.ingest(db, write_mines([record("1", floods=[2010, 2014], history=[2020, 2021]), record("2")]))
+
+    assert written == {"mines": 1, "flood_events": 1, "energy_demand": 1}
+    assert sorted(flood.year for flood in db.query(FloodEvent)) == [2010, 2014]
+
+
+def test_ingest_query_count_does_not_grow_with_records(db, write_mines):
+    path = write_mines([record(str(reference), floods=[2010, 2014], history=range(2000, 2020)) for reference in range(500)])
+    db.statements.clear()
+
+    written = mine_sites.ingest(db, path)
+
+    assert written == {"mines": 500, "flood_events": 1000, "energy_demand": 10000}
+    # Three key lookups and three bulk inserts, then two reads and one upsert per batch of summaries;
+    # SQLite's executemany is one statement per insert.
+    assert len([statement for statement in db.statements if statement.lstrip().upper().startswith(("SELECT", "INSERT"))]) == 6 + 3
+
+
+def test_ensure_loaded_only_ingests_empty_table(db, write_mines, monkeypatch):
+    monkeypatch.setattr(mine_sites, "JSON_PATH", write_mines([record("1")]))
+    monkeypatch.setattr(mine_sites, "_loaded", False)
+
+    mine_sites.ensure_loaded(db)
+    monkeypatch.setattr(mine_sites, "_loaded", False)
+    monkeypatch.setattr(mine_sites, "JSON_PATH", write_mines([record("2")]))
+    mine_sites.ensure_loaded(db)
+
+    assert [mine.reference for mine in db.query(Mine)] == ["1"]
+
+
+def test_missing_file_is_reported_once(db, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(mine_sites, "JSON_PATH", tmp_path / "missing.json")
+    monkeypatch.setattr(mine_sites, "_loaded", False)
+
+    with caplog.at_level("WARNING", logger="app.ingest.mine_sites"):
+        mine_sites.ensure_loaded(db)
+        db.statements.clear()
+        mine_sites.ensure_loaded(db)
+
+    assert len(caplog.records) == 1
+    assert db.statements == []
+
+
+def test_summaries_materialized_and_refreshed_incrementally(db, write_mines):
+    mine_sites.ingest(db, write_mines([record("1", floods=[2010, 2014], history=[2019, 2021]), record("2")]))
+    flat = db.get(MineSummary, "2")
+    rising = db.get(MineSummary, "1")
+
+    assert flat.trend is None and flat.latest_demand is None and flat.total_flood_events == 0
+    assert rising.trend == "STABLE" and rising.growth_rate == 0 and rising.total_flood_events == 2
+
+    db.execute(EnergyDemand.__table__.update().where(EnergyDemand.year == 2021).values(value=121.0))
+    db.commit()
+    db.statements.clear()
+    mine_sites.ingest(db, write_mines([record("1", floods=[2010, 2014, 2018], history=[2019, 2021])]))
+    db.expire_all()
+
+    rising = db.get(MineSummary, "1")
+    assert rising.trend == "INCREASING"
+    assert rising.growth_rate == pytest.approx(0.1)
+    assert rising.total_flood_events == 3
+    # Only the mine with new rows was summarized again.
+    assert any("IN (?)" in statement for statement in db.statements if "energy_demand" in statement)
+
+
+def test_summarize_matches_listing_fields():
+    summary = mine_sites.summarize([(2015, 100.0), (2016, 90.0), (2017, 81.0)], 4)
+
+    assert summary == {
+        "trend": "DECREASING",
+        "latest_demand": 81.0,
+        "min_demand": 81.0,
+        "max_demand": 100.0,
+        "growth_rate": pytest.approx(-0.1),
+        "total_flood_events": 4,
+    }
+
+
+def test_ensure_summaries_backfills_unsummarized_mines(db):
+    db.add(Mine(reference="1", name="Old", status="C", easting=425000, northing=565000))
+    db.add(FloodEvent(mine_reference="1", year=2010, events=2))
+    db.commit()
+
+    assert mine_sites.ensure_summaries(db) == 1
+    assert mine_sites.ensure_summaries(db) == 0
+    assert db.get(MineSummary, "1").total_flood_events == 2
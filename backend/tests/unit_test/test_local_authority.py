@@ -0,0 +1,116 @@
+import csv
+import shutil
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.ingest import consumption, local_authority
+from app.models.forecast import LocalAuthorityEnergyConsumption
+
+client = TestClient(app)
+
+# code, region name, authority name, share of the region row, last year published
+AUTHORITIES = [
+    ("E06000001", "North East", "Hartlepool", 0.05, 2023),
+    ("E06000002", "North East", "Middlesbrough", 0.07, 2023),
+    ("E07000001", "North West", "Old District", 0.02, 2019),
+    ("W06000001", "Wales", "Isle of Anglesey", 0.03, 2023),
+    ("S12000033", "Scotland", "Aberdeen City", 0.04, 2023),
+    ("S99999999", "Scotland", "Unallocated", 0.01, 2023),
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(consumption, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(local_authority, "_written", {})
+
+
+@pytest.fixture
+def la_dir(tmp_path):
+    directory = tmp_path / "la"
+    shutil.copytree(consumption.data_dir, directory)
+    for year in consumption.all_years:
+        path = consumption.csv_path(str(directory), year)
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+        regional = {row[1].split(" (")[0]: row for row in rows[1:] if row and row[0]}
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            for code, region, name, share, last_year in AUTHORITIES:
+                if year <= last_year:
+                    values = [f"{float(value) * share:.3f}" if value.strip() else "" for value in regional[region][3:]]
+                    writer.writerow([code, region, name, *values])
+    return str(directory)
+
+
+@pytest.fixture
+def db(memory_db):
+    return memory_db(LocalAuthorityEnergyConsumption.__table__)
+
+
+def test_authorities_are_mapped_to_regions(la_dir):
+    listed = local_authority.authorities(consumption.load_table(la_dir))
+
+    assert {item["code"]: item["region"] for item in listed} == {
+        "E06000001": "UKC", "E06000002": "UKC", "E07000001": "UKD", "W06000001": "UKL", "S12000033": "UKM",
+    }
+
+
+def test_rows_cover_history_and_forecast(la_dir):
+    rows = local_authority.build_rows(consumption.load_table(la_dir), "linear", 2030)
+    by_code = {}
+    for row in rows:
+        by_code.setdefault(row["code"], {})[row["year"]] = row
+
+    assert set(by_code["E06000001"]) == set(range(2005, 2031))
+    assert by_code["E06000001"][2030]["source"] == "forecast"
+    assert by_code["E06000001"][2023]["source"] == "historical"
+    assert max(by_code["E07000001"]) == 2019
+    assert {row["model_version"] for row in rows} == {"linear-v1"}
+
+
+def test_regional_extract_has_no_authorities():
+    assert local_authority.build_rows(consumption.load_table(consumption.data_dir)) == []
+
+
+def test_refresh_writes_once_per_data_version(la_dir, db):
+    assert local_authority.refresh(db, la_dir, "linear", 2030) > 0
+    assert local_authority.refresh(db, la_dir, "linear", 2030) == 0
+
+    local_authority._written.clear()
+    assert local_authority.refresh(db, la_dir, "linear", 2030) == 0
+
+    count = db.query(LocalAuthorityEnergyConsumption).count()
+    assert local_authority.refresh(db, la_dir, "theil-sen", 2030) == count
+    assert db.query(LocalAuthorityEnergyConsumption).count() == count
+    assert {row.model_version for row in db.query(LocalAuthorityEnergyConsumption)} == {"theil-sen-v1"}
+
+
+def test_endpoint_filters_by_region_authority_and_year(la_dir, db, override_db, monkeypatch):
+    monkeypatch.setattr(local_authority, "LA_DATA_DIR", la_dir)
+    local_authority.ensure_loaded(db)
+    override_db(db)
+
+    by_region = client.get("/forecast/local-authorities", params={"region": "UKC", "year": 2040}).json()
+    by_name = client.get("/forecast/local-authorities", params={"authority": "isle of anglesey", "start_year": 2022, "end_year": 2024}).json()
+    paged = client.get("/forecast/local-authorities", params={"limit": 5, "offset": 5}).json()
+
+    assert [(row["code"], row["source"]) for row in by_region] == [("E06000001", "forecast"), ("E06000002", "forecast")]
+    assert [(row["year"], row["source"]) for row in by_name] == [(2022, "historical"), (2023, "historical"), (2024, "forecast")]
+    assert len(paged) == 5 and paged[0]["year"] == 2010
+
+
+def test_endpoint_only_reads_and_reports_an_unloaded_table(db, override_db, monkeypatch):
+    monkeypatch.setattr(local_authority, "refresh", lambda *args, **kwargs: pytest.fail("refresh ran in a request"))
+    override_db(db)
+
+    response = client.get("/forecast/local-authorities")
+
+    assert response.status_code == 503
+
+
+def test_startup_warns_when_no_authorities_found(db, caplog):
+    with caplog.at_level("WARNING", logger="app.ingest.local_authority"):
+        assert local_authority.ensure_loaded(db) == 0
+
+    assert "LA_CONSUMPTION_DIR" in caplog.text
@@ -0,0 +1,203 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app.main import app
+from app.crud import user_pin as crud_user_pin
+from app.models.mine_site import Mine
+from app.models.user_pin import UserPin
+from app.ingest import flood_warnings, mine_sites, site_proximity
+from app.models.energy_site import EnergySite
+from app.routes import mine_site
+from app.routes.user import create_access_token
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def counted_db(memory_db, override_db, monkeypatch):
+    session = memory_db()
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    mine_sites.ingest(session)
+    session.expire_all()
+    statements.clear()
+    monkeypatch.setattr(mine_site, "_mine_layer", None)
+    monkeypatch.setattr(mine_site, "_mine_details", {})
+    monkeypatch.setattr(crud_user_pin, "_pin_notes", {})
+    return override_db(session), statements
+
+
+def test_list_mines_uses_constant_queries(counted_db):
+    session, statements = counted_db
+    total = session.query(Mine).count()
+    statements.clear()
+
+    response = client.get("/mines")
+
+    assert response.status_code == 200
+    assert len(response.json()) == total > 1
+    assert any(mine["energyDemandHistory"] for mine in response.json())
+    # Mines, energy demand, flood history, summaries and live warnings; not one query per mine.
+    assert len(statements) == 5
+
+
+def test_list_mines_snapshot_invalidated_by_ingest(counted_db):
+    session, statements = counted_db
+    first = client.get("/mines").content
+    statements.clear()
+
+    cached = client.get("/mines").content
+    assert cached == first
+    assert statements == []
+
+    session.query(Mine).filter(Mine.reference == "247737").delete()
+    session.commit()
+    mine_sites.ingest(session)
+    statements.clear()
+    client.get("/mines")
+    assert len(statements) == 5
+
+
+def test_list_mines_snapshot_invalidated_by_flood_poll(counted_db, tmp_path, monkeypatch):
+    session, statements = counted_db
+    monkeypatch.setattr(flood_warnings, "_validators", {})
+    county = session.query(Mine.local_authority).filter(Mine.local_authority.isnot(None)).first()[0]
+    feed = tmp_path / "floods.json"
+    feed.write_text(json.dumps({"items": [{"floodAreaID": "A1", "severity": "Flood Warning", "severityLevel": 2, "floodArea": {"county": county}}]}))
+    client.get("/mines")
+
+    flood_warnings.poll(session, str(feed))
+    statements.clear()
+    warned = [mine for mine in client.get("/mines").json() if mine["floodWarningLevel"] == 2]
+
+    assert warned and all(mine["localAuthority"] == county and mine["floodWarning"] == "Flood Warning" for mine in warned)
+    statements.clear()
+    client.get("/mines")
+    assert statements == []
+
+
+def test_mine_detail_is_fixed_queries_then_cached(counted_db):
+    session, statements = counted_db
+
+    first = client.get("/mines/247737")
+    cold = list(statements)
+    second = client.get("/mines/247737")
+
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    assert first.json()["energyDemandHistory"] and first.json()["floodHistory"]
+    assert first.json()["note"] is None
+    # The mine with its summary, then one IN (...) query per collection rather than a join of all of them.
+    assert len(cold) == 5
+    assert all("IN (" in statement for statement in cold[1:])
+    assert len(statements) == 5
+    assert client.get("/mines/missing").status_code == 404
+
+
+def test_mine_detail_overlays_the_callers_note(counted_db):
+    session, statements = counted_db
+    session.add(UserPin(user_id=1, mine_id=247737, note="Check the shaft"))
+    session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+
+    mine = client.get("/mines/247737", headers=headers).json()
+    other_user = client.get("/mines/247737", headers={"Authorization": f"Bearer {create_access_token({'sub': '2'})}"}).json()
+    client.post("/api/users/1/pins", json={"mine_id": 247737, "note": "Shaft sealed"})
+    updated = client.get("/mines/247737", headers=headers).json()
+
+    assert mine["note"] == "Check the shaft"
+    assert other_user["note"] is None
+    assert client.get("/mines/247737").json()["note"] is None
+    assert updated["note"] == "Shaft sealed"
+
+
+def test_mine_detail_invalidated_by_mine_version(counted_db, monkeypatch):
+    session, statements = counted_db
+    client.get("/mines/247737")
+    session.query(Mine).filter(Mine.reference == "247737").update({"name": "Renamed"})
+    session.commit()
+
+    assert client.get("/mines/247737").json()["name"] != "Renamed"
+    monkeypatch.setattr(mine_sites, "version", mine_sites.version + 1)
+    assert client.get("/mines/247737").json()["name"] == "Renamed"
+
+
+def test_filter_and_sort_on_summaries(counted_db):
+    session, statements = counted_db
+    everything = client.get("/mines").json()
+    statements.clear()
+
+    increasing = client.get("/mines", params={"trend": "increasing", "sort": "-latest_demand"}).json()
+    flooded = client.get("/mines", params={"min_flood_events": 3, "sort": "total_flood_events", "limit": 2}).json()
+
+    assert increasing == sorted([mine for mine in everything if mine["trend"] == "INCREASING"], key=lambda mine: -mine["latestDemand"])
+    assert [mine["reference"] for mine in flooded] == [
+        mine["reference"] for mine in sorted((mine for mine in everything if mine["totalFloodEvents"] >= 3), key=lambda mine: (mine["totalFloodEvents"], mine["reference"]))
+    ][:2]
+    # One indexed query on the summary table per request; the mines come from the cached layer.
+    assert len(statements) == 2 and all("FROM mine_summaries" in statement for statement in statements)
+    assert client.get("/mines", params={"sort": "name"}).status_code == 422
+    assert client.get("/mines", params={"trend": "UP"}).status_code == 422
+
+
+def test_mines_near_point(counted_db):
+    session, statements = counted_db
+    target = session.get(Mine, "247737")
+
+    by_lat_lon = client.get("/mines/near", params={"lat": target.latitude, "lon": target.longitude, "k": 3}).json()
+    by_bng = client.get("/mines/near", params={"easting": target.easting, "northing": target.northing, "radius": 20000}).json()
+
+    assert [mine["reference"] for mine in by_lat_lon][:1] == ["247737"]
+    assert len(by_lat_lon) == 3
+    assert by_lat_lon[0]["distance"] < 1
+    assert [mine["distance"] for mine in by_lat_lon] == sorted(mine["distance"] for mine in by_lat_lon)
+    assert by_bng and all(mine["distance"] <= 20000 for mine in by_bng)
+    assert by_bng[0]["reference"] == "247737"
+
+
+def test_mines_near_needs_one_point(counted_db):
+    assert client.get("/mines/near").status_code == 422
+    assert client.get("/mines/near", params={"lat": 53.2}).status_code == 422
+    assert client.get("/mines/near", params={"lat": 53.2, "lon": -1.4, "easting": 1, "northing": 2}).status_code == 422
+
+
+@pytest.mark.parametrize("params", [
+    {"easting": 1e12, "northing": 400000},
+    {"easting": 400000, "northing": -5},
+    {"lat": -33.9, "lon": 151.2},
+])
+def test_mines_near_rejects_points_off_the_grid(counted_db, params):
+    assert client.get("/mines/near", params=params).status_code == 422
+
+
+def test_mines_near_reads_index_from_the_layer_it_got(counted_db, monkeypatch):
+    layer = mine_site.mine_layer(counted_db[0])
+    # A rebuild by another request swaps the global; this request keeps using its own layer.
+    monkeypatch.setattr(mine_site, "mine_layer", lambda db: layer)
+    monkeypatch.setattr(mine_site, "_mine_layer", None)
+    target = layer.items[0]
+
+    nearest = client.get("/mines/near", params={"lat": target["latitude"], "lon": target["longitude"], "k": 1}).json()
+
+    assert nearest[0]["reference"] == target["reference"]
+
+
+def test_nearby_sites_in_detail_and_bulk(counted_db):
+    session, statements = counted_db
+    target = session.get(Mine, "247737")
+    session.add(EnergySite(name="Next Door Solar", type="solar", latitude=target.latitude + 0.01, longitude=target.longitude))
+    session.commit()
+    site_proximity.refresh(session)
+
+    detail = client.get("/mines/247737").json()
+    bulk = client.get("/mines/site-proximity", params={"category": "solar", "max_distance": 5000}).json()
+
+    assert detail["nearbySites"]["solar"]["name"] == "Next Door Solar"
+    assert detail["nearbySites"]["solar"]["distance"] == pytest.approx(1112, abs=20)
+    assert detail["nearbySites"]["solar"]["within5km"] == 1
+    assert detail["nearbySites"]["wind"]["distance"] is None
+    assert bulk[0] == {"reference": "247737", "category": "solar", **detail["nearbySites"]["solar"]}
+    assert all(row["distance"] <= 5000 for row in bulk)
+    assert client.get("/mines/site-proximity", params={"category": "coal"}).status_code == 422
@@ -1,11 +1,15 @@
+import csv
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import get_db
+from app.ingest import energy_sites
+from app.routes import energy_site
 from app.models.energy_site import EnergySite
 
 client = TestClient(app)
 
+HEADERS = ["Site Name", "Technology Type", "Development Status (short)", "X-coordinate", "Y-coordinate"]
+
 # -------------------------------
 # Dummy DB session for testing
 # -------------------------------
@@ -34,13 +38,33 @@ class DummySession:
 def mock_db():
     return DummySession()
 
+@pytest.fixture
+def sqlite_db(memory_db):
+    return memory_db(EnergySite.__table__)
+
+@pytest.fixture
+def repd_csv(tmp_path, monkeypatch):
+    path = tmp_path / "repd.csv"
+    with open(path, "w", encoding="latin1", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerow(["Test Solar Site", "Solar Photovoltaics", "Operational", "530000", "180000"])
+        writer.writerow(["Test Wind Site", "Wind Offshore", "Operational", "150000", "250000"])
+        writer.writerow(["Test Onshore Site", "Wind Onshore", "Operational", "300000", "700000"])
+        writer.writerow(["Planned Hydro", "Small Hydro", "Awaiting Construction", "250000", "800000"])
+        writer.writerow(["Bad Coordinates", "Large Hydro", "Operational", "", "800000"])
+        writer.writerow(["Battery", "Battery", "Operational", "400000", "300000"])
+    monkeypatch.setattr(energy_sites, "CSV_PATH", path)
+    monkeypatch.setattr(energy_sites, "_loaded", False)
+    monkeypatch.setattr(energy_site, "_layers", {})
+    return path
+
 # -------------------------------
 # Test for invalid category
 # -------------------------------
-def test_get_sites_invalid_category(mock_db):
-    app.dependency_overrides[get_db] = lambda: mock_db
+def test_get_sites_invalid_category(mock_db, override_db):
+    override_db(mock_db)
     response = client.get("/sites/unknown")
-    app.dependency_overrides.clear()
 
     assert response.status_code == 200
     assert response.json() == []
@@ -48,44 +72,57 @@ def test_get_sites_invalid_category(mock_db):
 # -------------------------------
 # Test for CSV import / solar sites
 # -------------------------------
-def test_get_sites_csv(mock_db, monkeypatch):
-    mock_csv_data = [
-        {
-            "Technology Type": "Solar Photovoltaics",
-            "Development Status (short)": "Operational",
-            "Site Name": "Test Solar Site",
-            "X-coordinate": "100000",
-            "Y-coordinate": "200000"
-        },
-        {
-            "Technology Type": "Wind Offshore",
-            "Development Status (short)": "Operational",
-            "Site Name": "Test Wind Site",
-            "X-coordinate": "150000",
-            "Y-coordinate": "250000"
-        },
-    ]
-
-    class DummyDictReader:
-        def __init__(self, f, *args, **kwargs):
-            self.rows = mock_csv_data
-        def __iter__(self):
-            return iter(self.rows)
-
-    # Override built-in open & csv.DictReader
-    import builtins, csv
-    monkeypatch.setattr(builtins, "open", lambda *args, **kwargs: None)
-    monkeypatch.setattr(csv, "DictReader", DummyDictReader)
-
-    # Override DB dependency
-    app.dependency_overrides[get_db] = lambda: mock_db
-
-    response = client.get("/sites/solar")
-    app.dependency_overrides.clear()
-
-    assert response.status_code == 200
-    data = response.json()
+def test_get_sites_csv(sqlite_db, repd_csv, override_db, monkeypatch):
+    parses = []
+    parse_sites = energy_sites.parse_sites
+    monkeypatch.setattr(energy_sites, "parse_sites", lambda path=None: parses.append(path) or parse_sites(path))
+    override_db(sqlite_db)
+
+    solar = client.get("/sites/solar")
+    wind = client.get("/sites/Wind")
+    hydro = client.get("/sites/hydroelectric")
+
+    assert solar.status_code == 200
+    data = solar.json()
     assert len(data) == 1
     assert data[0]["name"] == "Test Solar Site"
-    assert mock_db.committed is True
-    assert isinstance(mock_db.added[0], EnergySite)
\ No newline at end of file
+    assert data[0]["lat"] == pytest.approx(51.5, abs=0.1)
+    assert data[0]["lon"] == pytest.approx(-0.13, abs=0.1)
+    assert {site["name"] for site in wind.json()} == {"Test Wind Site", "Test Onshore Site"}
+    assert hydro.json() == []
+    assert len(parses) == 1
+
+def test_ingest_classifies_all_categories_in_one_pass(sqlite_db, repd_csv):
+    assert energy_sites.ingest(sqlite_db) == 3
+    assert energy_sites.ingest(sqlite_db) == 3
+
+    types = sorted(site.type for site in sqlite_db.query(EnergySite))
+    assert types == ["solar", "wind", "wind"]
+
+def test_missing_csv_leaves_table_empty(sqlite_db, tmp_path, override_db, monkeypatch, caplog):
+    monkeypatch.setattr(energy_sites, "CSV_PATH", tmp_path / "missing.csv")
+    monkeypatch.setattr(energy_sites, "_loaded", False)
+    monkeypatch.setattr(energy_site, "_layers", {})
+    override_db(sqlite_db)
+
+    with caplog.at_level("WARNING", logger="app.ingest.energy_sites"):
+        response = client.get("/sites/solar")
+        client.get("/sites/wind")
+
+    assert response.status_code == 200
+    assert response.json() == []
+    # The miss is recorded once, not probed and logged again on every request.
+    assert len(caplog.records) == 1
+
+def test_get_sites_in_bounding_box(sqlite_db, repd_csv, override_db):
+    override_db(sqlite_db)
+
+    london = client.get("/sites/wind", params={"bbox": "-1,51,1,52"})
+    scotland = client.get("/sites/wind", params={"bbox": "-8,54,0,60"})
+    limited = client.get("/sites/wind", params={"limit": 1})
+    invalid = client.get("/sites/wind", params={"bbox": "1,2,3"})
+
+    assert london.json() == []
+    assert [site["name"] for site in scotland.json()] == ["Test Onshore Site"]
+    assert len(limited.json()) == 1
+    assert invalid.status_code == 422
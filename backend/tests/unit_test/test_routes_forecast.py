@@ -0,0 +1,198 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import sqlite
+from app.main import app
+from app.forecast_engine import MAX_FORECAST_YEAR
+from app.models.forecast import RegionEnergyConsumption
+from app.routes import forecast as forecast_routes
+
+client = TestClient(app)
+
+
+class DummyBind:
+    class dialect:
+        name = "sqlite"
+
+
+class DummySession:
+    def __init__(self, cached=None):
+        self.cached = cached or []
+        self.executed = []
+        self.committed = False
+
+    def get_bind(self):
+        return DummyBind()
+
+    def query(self, *columns):
+        return self
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def all(self):
+        return self.cached
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+
+    def commit(self):
+        self.committed = True
+
+
+class FakeEngine:
+    def __init__(self):
+        self.calls = []
+        self.fingerprint = "data-v1"
+
+    def cache_tag(self, backend="prophet"):
+        return f"{backend}-v1", self.fingerprint
+
+    def forecast_years(self, years, backend="prophet", regions=None, on_region=None):
+        self.calls.append((years, backend, regions))
+        return {
+            region: {year: {"value": float(year), "source": "forecast"} for year in years}
+            for region in regions
+        }
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(forecast_routes, "engine", engine)
+    monkeypatch.setattr(forecast_routes, "target_regions", ["UKC", "UKD"])
+    return engine
+
+
+@pytest.fixture
+def sqlite_session(memory_db):
+    return memory_db(RegionEnergyConsumption.__table__)
+
+
+def test_forecast_writes_one_upsert(fake_engine, override_db):
+    db = override_db(DummySession())
+
+    response = client.post("/forecast", json={"year": 2030})
+
+    assert response.status_code == 200
+    assert response.json()["UKC"] == {"value": 2030.0, "source": "forecast"}
+    assert len(db.executed) == 1
+    statement, rows = db.executed[0]
+    assert "ON CONFLICT (region, year, model_version) DO UPDATE" in str(statement.compile(dialect=sqlite.dialect()))
+    assert rows[0] == {
+        "region": "UKC", "year": 2030, "consumption": 2030.0, "source": "forecast",
+        "model_version": "prophet-v1", "data_fingerprint": "data-v1",
+    }
+    assert db.committed is True
+
+
+def test_forecast_served_from_database_when_cached(fake_engine, override_db):
+    db = override_db(DummySession(cached=[("UKC", 2030, 1.0, "forecast"), ("UKD", 2030, 2.0, "forecast")]))
+
+    response = client.post("/forecast", json={"year": 2030})
+
+    assert response.json() == {"UKC": {"value": 1.0, "source": "forecast"}, "UKD": {"value": 2.0, "source": "forecast"}}
+    assert fake_engine.calls == []
+    assert db.executed == []
+
+
+def test_forecast_recomputes_only_missing_regions(fake_engine, override_db):
+    db = override_db(DummySession(cached=[("UKC", 2030, 1.0, "forecast")]))
+
+    response = client.post("/forecast", json={"year": 2030})
+
+    assert response.json()["UKC"] == {"value": 1.0, "source": "forecast"}
+    assert response.json()["UKD"] == {"value": 2030.0, "source": "forecast"}
+    assert fake_engine.calls == [([2030], "prophet", ["UKD"])]
+    assert [row["region"] for row in db.executed[0][1]] == ["UKD"]
+
+
+def test_stale_rows_are_recomputed(fake_engine, override_db, sqlite_session):
+    override_db(sqlite_session)
+
+    client.post("/forecast", json={"year": 2030})
+    client.post("/forecast", json={"year": 2030})
+    assert len(fake_engine.calls) == 1
+
+    fake_engine.fingerprint = "data-v2"
+    client.post("/forecast", json={"year": 2030})
+    client.post("/forecast", json={"year": 2030, "backend": "holt"})
+    assert [call[1:] for call in fake_engine.calls[1:]] == [("prophet", ["UKC", "UKD"]), ("holt", ["UKC", "UKD"])]
+
+    rows = sqlite_session.query(RegionEnergyConsumption).all()
+    assert len(rows) == 4
+    assert {(row.model_version, row.data_fingerprint) for row in rows} == {("prophet-v1", "data-v2"), ("holt-v1", "data-v2")}
+
+
+def test_backends_keep_their_own_rows(fake_engine, override_db, sqlite_session):
+    override_db(sqlite_session)
+
+    for backend in ["prophet", "holt", "prophet", "holt"]:
+        client.post("/forecast", json={"year": 2030, "backend": backend})
+
+    # Alternating backends no longer overwrite each other, so each is fitted once.
+    assert [call[1] for call in fake_engine.calls] == ["prophet", "holt"]
+
+
+def test_batch_forecast_range_single_bulk_upsert(fake_engine, override_db):
+    db = override_db(DummySession(cached=[("UKC", 2030, 1.0, "forecast")]))
+
+    response = client.post("/forecast/batch", json={"start_year": 2030, "end_year": 2032, "backend": "holt"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"UKC", "UKD"}
+    assert data["UKD"]["2031"] == {"value": 2031.0, "source": "forecast"}
+    assert fake_engine.calls == [([2030, 2031, 2032], "holt", ["UKC", "UKD"])]
+
+    assert len(db.executed) == 1
+    rows = db.executed[0][1]
+    assert len(rows) == 6
+    assert db.committed is True
+
+
+def test_batch_forecast_year_list_is_deduplicated(fake_engine, override_db):
+    override_db(DummySession())
+
+    response = client.post("/forecast/batch", json={"years": [2040, 2035, 2040]})
+
+    assert response.status_code == 200
+    assert fake_engine.calls == [([2035, 2040], "prophet", ["UKC", "UKD"])]
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"start_year": 2030},
+    {"start_year": 2030, "end_year": 2020},
+    {"years": []},
+    {"years": [2030, 100000]},
+    {"start_year": -10**12, "end_year": 2030},
+    {"start_year": 2030, "end_year": 100000},
+])
+def test_batch_forecast_rejects_invalid_years(fake_engine, override_db, body):
+    override_db(DummySession())
+
+    response = client.post("/forecast/batch", json=body)
+
+    assert response.status_code == 422
+    assert fake_engine.calls == []
+
+
+@pytest.mark.parametrize("path", ["/forecast", "/forecast/jobs"])
+def test_forecast_rejects_year_past_maximum(fake_engine, override_db, path):
+    override_db(DummySession())
+
+    response = client.post(path, json={"year": MAX_FORECAST_YEAR + 1})
+
+    assert response.status_code == 422
+    assert fake_engine.calls == []
+
+
+def test_forecast_reports_failed_region_as_null(fake_engine, override_db, monkeypatch):
+    session = override_db(DummySession())
+    monkeypatch.setattr(fake_engine, "forecast_years", lambda years, backend, regions, on_region: {"UKC": {2030: {"value": 1.0, "source": "forecast"}}, "UKD": {2030: None}})
+
+    response = client.post("/forecast", json={"year": 2030})
+
+    assert response.status_code == 200
+    assert response.json() == {"UKC": {"value": 1.0, "source": "forecast"}, "UKD": None}
+    assert session.committed
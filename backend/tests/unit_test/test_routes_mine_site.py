@@ -26,6 +26,9 @@ class DummyQuery:
                         filtered.append(item)
         return DummyQuery(filtered)
 
+    def options(self, *args):
+        return self
+
     def first(self):
         return self.results[0] if self.results else None
 
@@ -59,12 +62,15 @@ class DummySession:
 client = TestClient(app)
 
 dummy_db = DummySession()
-app.dependency_overrides[mine_site.get_db] = lambda: dummy_db
 
 @pytest.fixture
-def setup_mines():
+def setup_mines(override_db):
+    override_db(dummy_db)
     dummy_db.mines.clear()
     dummy_db.user_pins.clear()
+    # /mines and /mines/{reference} serve cached mines; drop them so they are rebuilt from this session.
+    mine_site._mine_layer = None
+    mine_site._mine_details.clear()
 
     mine1 = Mine(
         reference="MINE1",
@@ -74,12 +74,12 @@ class DummySession:
 
 
 dummy_db = DummySession()
-app.dependency_overrides[user_pin_routes.get_db] = lambda: dummy_db
 client = TestClient(app)
 
 
 @pytest.fixture
-def setup_user_pins():
+def setup_user_pins(override_db):
+    override_db(dummy_db)
     dummy_db.mines.clear()
     dummy_db.user_pins.clear()
     dummy_db._next_id = 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from app.geo import bng_to_wgs84
+from app.ingest import site_proximity
+from app.models.energy_site import EnergySite
+from app.models.mine_site import Mine, MineSiteProximity
+
+
+RADII = [5000.0, 10000.0, 25000.0]
+
+
+def test_proximity_matches_brute_force():
+    rng = np.random.default_rng(2)
+    mine_x, mine_y = rng.uniform(300000, 500000, 400), rng.uniform(200000, 600000, 400)
+    # Sparse sites, so some mines have nothing within one grid cell.
+    site_x, site_y = rng.uniform(300000, 500000, 60), rng.uniform(200000, 600000, 60)
+
+    nearest, distances, counts = site_proximity.proximity(mine_x, mine_y, site_x, site_y, RADII)
+
+    d = np.hypot(mine_x[:, None] - site_x, mine_y[:, None] - site_y)
+    assert (distances > max(RADII)).any()
+    assert np.array_equal(nearest, d.argmin(axis=1))
+    assert np.allclose(distances, d.min(axis=1))
+    assert np.array_equal(counts, (d[:, :, None] <= np.array(RADII)).sum(axis=1))
+
+
+def test_proximity_without_sites():
+    nearest, distances, counts = site_proximity.proximity([1.0], [2.0], [], [], RADII)
+
+    assert nearest.tolist() == [-1]
+    assert np.isinf(distances[0])
+    assert counts.tolist() == [[0, 0, 0]]
+
+
+@pytest.fixture
+def db(memory_db):
+    return memory_db(Mine.__table__, EnergySite.__table__, MineSiteProximity.__table__)
+
+
+def add_site(db, name, category, easting, northing):
+    lats, lons = bng_to_wgs84([easting], [northing])
+    db.add(EnergySite(name=name, type=category, latitude=float(lats[0]), longitude=float(lons[0])))
+
+
+def add_mine(db, reference, easting, northing):
+    db.add(Mine(reference=reference, name=f"Mine {reference}", status="C", easting=easting, northing=northing))
+
+
+def test_refresh_is_incremental(db):
+    add_mine(db, "1", 430000, 360000)
+    add_mine(db, "2", 530000, 180000)
+    add_site(db, "Near Solar", "solar", 432400, 363200)
+    add_site(db, "Far Solar", "solar", 530000, 190000)
+    add_site(db, "Wind", "wind", 300000, 700000)
+    db.commit()
+
+    assert site_proximity.refresh(db) == {"solar": 2, "wind": 2, "hydroelectric": 2}
+    assert site_proximity.refresh(db) == {"solar": 0, "wind": 0, "hydroelectric": 0}
+
+    solar = db.get(MineSiteProximity, ("1", "solar"))
+    assert solar.site_name == "Near Solar"
+    assert solar.distance_m == pytest.approx(4000, abs=1)
+    assert (solar.within_5km, solar.within_10km, solar.within_25km) == (1, 1, 1)
+    assert db.get(MineSiteProximity, ("2", "solar")).within_5km == 0
+    assert db.get(MineSiteProximity, ("1", "hydroelectric")).distance_m is None
+
+    add_mine(db, "3", 431000, 361000)
+    db.commit()
+    assert site_proximity.refresh(db) == {"solar": 1, "wind": 1, "hydroelectric": 1}
+
+    # A re-ingest replaces every site row; only the category whose data changed is recomputed.
+    db.query(EnergySite).filter(EnergySite.type == "wind").delete()
+    add_site(db, "New Wind", "wind", 430000, 362000)
+    db.commit()
+    version = site_proximity.version
+    assert site_proximity.refresh(db) == {"solar": 0, "wind": 3, "hydroelectric": 0}
+    assert site_proximity.version == version + 1
+    db.expire_all()
+    assert db.get(MineSiteProximity, ("1", "wind")).site_name == "New Wind"
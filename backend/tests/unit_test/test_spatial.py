@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.mine_site import Mine
+from app.ingest import mine_sites
+from app.routes import mine_site
+from app.spatial import GridIndex, NearestIndex, SpatialLayer, Viewport
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(49.9, 60.9, 5000), rng.uniform(-8.2, 1.8, 5000)
+
+
+@pytest.mark.parametrize("bbox", [(-1.0, 51.0, 0.5, 52.0), (-8.2, 49.9, 1.8, 60.9), (-0.1, 51.5, -0.1, 51.5), (-30, 0, 30, 80)])
+def test_grid_query_matches_brute_force(points, bbox):
+    lats, lons = points
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    found = GridIndex(lats, lons, cell_deg=0.25).query(*bbox)
+
+    expected = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon))
+    assert np.array_equal(found, expected)
+
+
+def test_grid_query_huge_box_scans_without_building_cells(points):
+    lats, lons = points
+
+    found = GridIndex(lats, lons, cell_deg=0.25).query(-1e13, -1e13, 1e13, 1e13)
+
+    assert np.array_equal(found, np.arange(len(lats)))
+
+
+@pytest.mark.parametrize("k, radius", [(1, None), (25, None), (None, 20000.0), (10, 5000.0), (6000, None)])
+def test_nearest_matches_brute_force(k, radius):
+    rng = np.random.default_rng(1)
+    xs, ys = rng.uniform(100000, 650000, 5000), rng.uniform(10000, 1200000, 5000)
+    index = NearestIndex(xs, ys, cell=5000)
+
+    positions, distances = index.nearest(400000, 300000, k, radius)
+
+    expected = np.hypot(xs - 400000, ys - 300000)
+    order = np.argsort(expected, kind="stable")
+    if radius is not None:
+        order = order[expected[order] <= radius]
+    order = order[:k]
+    assert np.array_equal(positions, order)
+    assert np.allclose(distances, expected[order])
+
+
+def test_zoomed_out_view_is_thinned(points):
+    lats, lons = points
+    layer = SpatialLayer(list(range(len(lats))), lats, lons)
+
+    country = layer.select(Viewport(-8.2, 49.9, 1.8, 60.9, zoom=5))
+    street = layer.select(Viewport(-8.2, 49.9, 1.8, 60.9, zoom=18))
+
+    assert 0 < len(country) < 200
+    assert len(street) == len(lats)
+
+
+def test_items_without_coordinates_only_returned_unbounded():
+    layer = SpatialLayer(["a", "b", "c"], [51.5, None, 55.0], [-0.1, None, -3.0])
+
+    assert layer.select(Viewport()) == ["a", "b", "c"]
+    assert layer.select(Viewport(limit=2)) == ["a", "b"]
+    assert layer.select(Viewport(-1, 51, 0, 52)) == ["a"]
+    assert layer.select(Viewport(-5, 50, 0, 56, limit=1)) == ["a"]
+
+
+def test_layer_expires_on_new_version_or_ttl():
+    layer = SpatialLayer([], [], [], version=1)
+
+    assert layer.is_current(1)
+    assert not layer.is_current(2)
+    assert not layer.is_current(1, ttl=0)
+
+
+@pytest.fixture
+def mine_db(memory_db, override_db, monkeypatch):
+    session = memory_db(Mine.__table__, *[table for rel in Mine.__mapper__.relationships for table in (rel.mapper.local_table, rel.secondary) if table is not None])
+    monkeypatch.setattr(mine_site, "_mine_layer", None)
+    monkeypatch.setattr(mine_sites, "_loaded", False)
+    return override_db(session)
+
+
+def test_mines_in_bounding_box(mine_db):
+    everything = client.get("/mines").json()
+    in_view = client.get("/mines", params={"bbox": "-1.6,53.0,-1.3,53.3"}).json()
+
+    assert in_view
+    assert len(in_view) < len(everything)
+    assert all(-1.6 <= mine["longitude"] <= -1.3 and 53.0 <= mine["latitude"] <= 53.3 for mine in in_view)
+
+
+@pytest.mark.parametrize("bbox", ["-1e7,-1e7,1e7,1e7", "-181,50,0,51", "0,-91,1,0", "0,50,1,90.5"])
+def test_bbox_outside_the_globe_is_rejected(mine_db, bbox):
+    response = client.get("/mines", params={"bbox": bbox})
+
+    assert response.status_code == 422